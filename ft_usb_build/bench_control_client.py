@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Control client benchmark - Coach Interface
+Starts a local stub of the field trainer API (port 5000 endpoints) and
+compares bare requests.post calls - a new TCP connection each time - with
+the pooled keep-alive FieldTrainerControl client.
+
+    python3 bench_control_client.py [--calls 500] [--latency-ms 0]
+
+The stub can also be left running for manual testing of the coach
+interface without devices:
+
+    python3 bench_control_client.py --serve --port 5050
+    FIELD_TRAINER_API=http://127.0.0.1:5050 python3 coach_interface.py
+
+The benchmark imports the coach interface against an empty database and
+journal in a temporary directory - the device's data is never opened.
+"""
+
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, '/opt')
+
+# setdefault: replay_touches.py imports this for start_stub() with its own directory set up
+WORKDIR = tempfile.mkdtemp(prefix='coach_control_bench_')
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+os.environ.setdefault('COACH_DB', os.path.join(WORKDIR, 'field_trainer.db'))
+os.environ.setdefault('COACH_JOURNAL', os.path.join(WORKDIR, 'coach_journal.jsonl'))
+os.environ.setdefault('COACH_TRACE_DIR', os.path.join(WORKDIR, 'traces'))
+os.environ.setdefault('COACH_HANDLER_LOCK', os.path.join(WORKDIR, 'touch_handler.lock'))
+
+try:
+    import coach_interface as ci  # Deployed as /opt/coach_interface.py
+except ImportError:
+    import coach_interface_working as ci  # Running from ft_usb_build/
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every field trainer control endpoint with a small JSON body"""
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    latency = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps({'success': True, 'path': self.path}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port: int, latency_ms: float) -> ThreadingHTTPServer:
+    StubHandler.latency = latency_ms / 1000.0
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_bare(base_url: str, calls: int) -> float:
+    import requests
+    start = time.perf_counter()
+    for _ in range(calls):
+        requests.post(f'{base_url}/api/audio/play', json={'node_id': '192.168.99.100', 'clip': 'go'}, timeout=2)
+    return time.perf_counter() - start
+
+
+def bench_pooled(base_url: str, calls: int) -> float:
+    client = ci.FieldTrainerControl(base_url)
+    client.play_audio('192.168.99.100', 'go')  # open the connection
+    start = time.perf_counter()
+    for _ in range(calls):
+        client.play_audio('192.168.99.100', 'go')
+    return time.perf_counter() - start
+
+
+def bench_deploy_activate(base_url: str, rounds: int):
+    """Sequential deploy+activate vs overlapping it with other work (simulated 20 ms DB write)"""
+    client = ci.FieldTrainerControl(base_url)
+    client.deploy_and_activate('Bench Course')
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        client.deploy_and_activate('Bench Course')
+        time.sleep(0.02)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        future = client.deploy_and_activate_async('Bench Course')
+        time.sleep(0.02)
+        future.result()
+    pipelined = time.perf_counter() - start
+    return sequential / rounds, pipelined / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Field trainer control client benchmark")
+    parser.add_argument("--calls", type=int, default=500, help="Requests per measurement")
+    parser.add_argument("--port", type=int, default=0, help="Stub server port (0 = any free port)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated handler latency on the stub")
+    parser.add_argument("--serve", action="store_true", help="Only run the stub server until Ctrl+C")
+    args = parser.parse_args()
+
+    server = start_stub(args.port, args.latency_ms)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    if args.serve:
+        print(f"Stub field trainer API listening on {base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    print(f"Stub field trainer API: {base_url}, {args.calls} calls")
+    bare = bench_bare(base_url, args.calls)
+    pooled = bench_pooled(base_url, args.calls)
+    print(f"  bare requests.post : {bare / args.calls * 1000:7.3f} ms/call")
+    print(f"  pooled keep-alive  : {pooled / args.calls * 1000:7.3f} ms/call ({bare / pooled:.1f}x)")
+
+    sequential, pipelined = bench_deploy_activate(base_url, max(args.calls // 25, 5))
+    print(f"  deploy+activate then 20 ms DB write : {sequential * 1000:7.3f} ms")
+    print(f"  deploy+activate overlapped          : {pipelined * 1000:7.3f} ms")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
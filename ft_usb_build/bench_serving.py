@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Serving benchmark - Coach Interface
+Starts the coach interface in each serving mode and hammers the two pages
+tablets hit hardest - the session status poll and the session history -
+from concurrent clients, then reports p50/p99 latency per endpoint.
+
+    python3 bench_serving.py [--modes dev,production] [--clients 8] [--requests 2000]
+
+Run it on a device (or with field_trainer importable) with at least one
+session in the database. Each server runs on a temporary copy of --db with
+its own journal, trace directory and touch handler lock, so the device's
+data and a running coach interface are left alone. To measure a server that
+is already running:
+
+    python3 bench_serving.py --url http://127.0.0.1:5001 --session <session_id>
+"""
+
+import argparse
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COACH_SCRIPT = '/opt/coach_interface.py' if os.path.exists('/opt/coach_interface.py') \
+    else os.path.join(HERE, 'coach_interface_working.py')
+
+
+def latest_session_id(db_path: str) -> str:
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute('SELECT session_id FROM sessions ORDER BY created_at DESC LIMIT 1').fetchone()
+    if not row:
+        sys.exit(f"No sessions in {db_path} - create one or pass --session")
+    return row[0]
+
+
+def start_server(mode: str, port: int, db_path: str, workdir: str) -> subprocess.Popen:
+    """The coach interface on a copy of db_path, with all of its state under workdir"""
+    shutil.copy(db_path, os.path.join(workdir, 'field_trainer.db'))
+    env = dict(os.environ,
+               COACH_DB=os.path.join(workdir, 'field_trainer.db'),
+               COACH_JOURNAL=os.path.join(workdir, 'coach_journal.jsonl'),
+               COACH_TRACE_DIR=os.path.join(workdir, 'traces'),
+               COACH_HANDLER_LOCK=os.path.join(workdir, 'touch_handler.lock'))
+    cmd = [sys.executable, COACH_SCRIPT, '--host', '127.0.0.1', '--port', str(port)]
+    if mode == 'dev':
+        cmd.append('--dev')
+    # Own process group so the dev reloader's child goes down with it
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def stop_server(proc: subprocess.Popen):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+def wait_ready(base_url: str, timeout: float = 30.0) -> float:
+    """Seconds until the server answers"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            requests.get(f"{base_url}/sessions", timeout=1)
+            return time.perf_counter() - started
+        except requests.RequestException:
+            time.sleep(0.05)
+    raise RuntimeError(f"{base_url} not ready after {timeout:.0f}s")
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def load(base_url: str, session_id: str, clients: int, total: int) -> dict:
+    """Each client alternates between the two endpoints on its own keep-alive session"""
+    paths = {
+        'status': f"/api/session/{session_id}/status",
+        'sessions': '/sessions',
+    }
+    results = {name: [] for name in paths}
+    errors = {name: 0 for name in paths}
+    lock = threading.Lock()
+    per_client = total // clients
+
+    def client(index: int):
+        http = requests.Session()
+        local = {name: [] for name in paths}
+        local_errors = {name: 0 for name in paths}
+        names = list(paths)
+        for i in range(per_client):
+            name = names[(i + index) % len(names)]
+            started = time.perf_counter()
+            try:
+                response = http.get(base_url + paths[name], timeout=10)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                local[name].append((time.perf_counter() - started) * 1000)
+            else:
+                local_errors[name] += 1
+        with lock:
+            for name in paths:
+                results[name].extend(local[name])
+                errors[name] += local_errors[name]
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    report = {'rps': sum(len(v) for v in results.values()) / elapsed}
+    for name, samples in results.items():
+        report[name] = {
+            'p50': percentile(samples, 50) if samples else None,
+            'p99': percentile(samples, 99) if samples else None,
+            'errors': errors[name],
+        }
+    return report
+
+
+def print_report(label: str, ready_s, report: dict):
+    ready = f"ready {ready_s:.2f}s, " if ready_s is not None else ""
+    print(f"\n{label}: {ready}{report['rps']:.0f} req/s")
+    for name in ('status', 'sessions'):
+        r = report[name]
+        if r['p50'] is None:
+            print(f"  {name:<9} all requests failed ({r['errors']})")
+        else:
+            print(f"  {name:<9} p50 {r['p50']:7.2f} ms   p99 {r['p99']:7.2f} ms   errors {r['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='dev,production')
+    parser.add_argument('--url', help='benchmark a running server instead of starting one')
+    parser.add_argument('--session', help='session_id for the status endpoint (default: most recent)')
+    parser.add_argument('--db', default='/opt/data/field_trainer.db')
+    parser.add_argument('--port', type=int, default=5101)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    session_id = args.session or latest_session_id(args.db)
+    print(f"Session {session_id}, {args.clients} clients, {args.requests} requests per mode")
+
+    if args.url:
+        print_report(args.url, None, load(args.url, session_id, args.clients, args.requests))
+        return
+
+    for mode in args.modes.split(','):
+        with tempfile.TemporaryDirectory(prefix='coach_serving_') as workdir:
+            proc = start_server(mode, args.port, args.db, workdir)
+            base_url = f"http://127.0.0.1:{args.port}"
+            try:
+                ready_s = wait_ready(base_url)
+                load(base_url, session_id, args.clients, args.clients * 10)  # warm up
+                print_report(mode, ready_s, load(base_url, session_id, args.clients, args.requests))
+            finally:
+                stop_server(proc)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+SQLite tuning benchmark - Coach Interface
+Plays the database traffic of a 30-athlete session - runs started, segments
+created, a touch per cone, runs completed - the way the journal writer
+applies it, while tablets poll the session, and reports per-operation write
+latency and poll latency for DatabaseManager's own connections ('default')
+and for the coach interface's TunedConnections layer ('tuned').
+
+    python3 bench_sqlite_tuning.py [--athletes 30] [--interval-ms 10] [--course-id N] [--dir DIR]
+
+Each mode runs on a fresh copy of --db, written to a temporary directory
+unless --dir is given. Write latency is only worth measuring on the SD card,
+and that is the device's own data directory, so it has to be asked for:
+--dir /opt/data (the copies are removed afterwards). Touches are spaced
+--interval-ms apart so both modes see the same polling load. Needs a course with its
+devices in the database (the first course unless --course-id is given).
+"""
+
+import argparse
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, '/opt')
+
+SCRATCH = tempfile.mkdtemp(prefix='coach_sqlite_bench_')
+atexit.register(shutil.rmtree, SCRATCH, ignore_errors=True)
+os.environ.setdefault('COACH_LOG_LEVEL', 'WARNING')
+os.environ['COACH_DB'] = os.path.join(SCRATCH, 'import.db')  # Importing the module must not touch the real one
+os.environ['COACH_DB_TUNING'] = '0'
+os.environ['COACH_JOURNAL'] = os.path.join(SCRATCH, 'coach_journal.jsonl')
+
+try:
+    import coach_interface as ci  # Deployed as /opt/coach_interface.py
+except ImportError:
+    import coach_interface_working as ci  # Running from ft_usb_build/
+
+from field_trainer.db_manager import DatabaseManager
+
+MAX_ACTIVE = 5
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def timed(samples: dict, name: str, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def run_session(db, course_id: int, devices: list, athletes: int, interval: float, samples: dict, session_ids: list):
+    """Athletes go round MAX_ACTIVE at a time, touches interleaved the way they arrive on the field"""
+    team_id = db.create_team(name='SQLite bench', age_group=None)
+    athlete_ids = [db.create_athlete(team_id=team_id, name=f"Athlete {n}", jersey_number=n)
+                   for n in range(1, athletes + 1)]
+    session_id = db.create_session(team_id=team_id, course_id=course_id, athlete_queue=athlete_ids,
+                                   audio_voice='male')
+    runs = sorted(db.get_session(session_id)['runs'], key=lambda r: r['queue_position'])
+    db.start_session(session_id)
+    session_ids.append(session_id)  # The tablets start polling
+
+    clock = datetime.utcnow()
+    waiting = [run['run_id'] for run in runs]
+    on_course = {}  # {run_id: (next cone, started_at)}
+    while waiting or on_course:
+        while waiting and len(on_course) < MAX_ACTIVE:
+            run_id = waiting.pop(0)
+            timed(samples, 'start_run', db.start_run, run_id, clock)
+            timed(samples, 'create_segments', db.create_segments_for_run, run_id, course_id)
+            on_course[run_id] = (0, clock)
+        for run_id, (cone, started_at) in list(on_course.items()):
+            clock += timedelta(milliseconds=250)
+            time.sleep(interval)
+            timed(samples, 'record_touch', db.record_touch, run_id, devices[cone], clock)
+            if cone + 1 < len(devices):
+                on_course[run_id] = (cone + 1, started_at)
+            else:
+                timed(samples, 'complete_run', db.complete_run, run_id, clock, (clock - started_at).total_seconds())
+                del on_course[run_id]
+    timed(samples, 'complete_session', db.complete_session, session_id)
+
+
+def poll(db, session_ids: list, stop: threading.Event, samples: dict):
+    """A tablet refreshing the monitor page"""
+    while not stop.is_set():
+        if session_ids:
+            timed(samples, 'poll', db.get_session, session_ids[0])
+        time.sleep(0.02)
+
+
+def bench(mode: str, source: str, directory: str, course_id: int, devices: list, athletes: int, interval: float) -> dict:
+    path = os.path.join(directory, f"bench_{mode}.db")
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    shutil.copy(source, path)
+    db = DatabaseManager(path)
+    if mode == 'tuned':
+        ci.TunedConnections.install(db, path)
+
+    samples = {}
+    poll_samples = {}
+    session_ids = []
+    stop = threading.Event()
+    poller = threading.Thread(target=poll, args=(db, session_ids, stop, poll_samples), daemon=True)
+    poller.start()
+    started = time.perf_counter()
+    try:
+        run_session(db, course_id, devices, athletes, interval, samples, session_ids)
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        poller.join()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    samples.update(poll_samples)
+    return {'elapsed': elapsed, 'samples': samples}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/opt/data/field_trainer.db', help='database to copy')
+    parser.add_argument('--dir', default=SCRATCH, help='where the copies are written (default: a temporary directory)')
+    parser.add_argument('--course-id', type=int)
+    parser.add_argument('--athletes', type=int, default=30)
+    parser.add_argument('--interval-ms', type=float, default=10.0, help='time between touches')
+    parser.add_argument('--modes', default='default,tuned')
+    args = parser.parse_args()
+
+    source = DatabaseManager(args.db)
+    course_id = args.course_id or next((c['course_id'] for c in source.get_all_courses()), None)
+    course = source.get_course(course_id) if course_id is not None else None
+    if not course:
+        sys.exit(f"No course in {args.db} - create one or pass --course-id")
+    devices = [action['device_id'] for action in course['actions'] if action['device_id'] != ci.DEVICE_0]
+    print(f"{args.athletes} athletes on '{course['course_name']}' ({len(devices)} cones), copies in {args.dir}")
+
+    for mode in args.modes.split(','):
+        result = bench(mode, args.db, args.dir, course_id, devices, args.athletes, args.interval_ms / 1000)
+        writes = sum(len(v) for k, v in result['samples'].items() if k != 'poll')
+        print(f"\n{mode}: {writes} writes in {result['elapsed']:.2f}s")
+        for name, samples in result['samples'].items():
+            print(f"  {name:<17} n={len(samples):<5} p50 {percentile(samples, 50):7.2f} ms   "
+                  f"p99 {percentile(samples, 99):7.2f} ms   max {max(samples):7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Touch attribution micro-benchmark - Coach Interface
+Compares the original scan-and-sort attribution against the
+position-bucket index at 5, 50 and 500 active athletes.
+
+Run on the gateway (needs /opt/field_trainer on the path):
+    python3 bench_touch_attribution.py [--course-length 12] [--touches 20000]
+
+The coach interface is imported against an empty database and journal in a
+temporary directory - the device's data is never opened.
+"""
+
+import argparse
+import atexit
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, '/opt')
+
+WORKDIR = tempfile.mkdtemp(prefix='coach_attribution_bench_')
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+os.environ['COACH_DB'] = os.path.join(WORKDIR, 'field_trainer.db')
+os.environ['COACH_JOURNAL'] = os.path.join(WORKDIR, 'coach_journal.jsonl')
+os.environ['COACH_TRACE_DIR'] = os.path.join(WORKDIR, 'traces')
+os.environ['COACH_HANDLER_LOCK'] = os.path.join(WORKDIR, 'touch_handler.lock')
+
+try:
+    import coach_interface as ci  # Deployed as /opt/coach_interface.py
+except ImportError:
+    import coach_interface_working as ci  # Running from ft_usb_build/
+
+
+def legacy_select(active_runs: dict, device_position: int):
+    """Original find_athlete_for_touch candidate selection (without the prints)"""
+    priority_1 = []
+    priority_2 = []
+    for run_id, run_info in active_runs.items():
+        gap = device_position - run_info.get('sequence_position', -1)
+        if gap == 1:
+            priority_1.append((run_id, run_info, gap))
+        elif gap > 1:
+            priority_2.append((run_id, run_info, gap))
+
+    if priority_1:
+        priority_1.sort(key=lambda x: x[1].get('queue_position', 999))
+        return priority_1[0][0], 0
+    if priority_2:
+        priority_2.sort(key=lambda x: (x[2], x[1].get('queue_position', 999)))
+        run_id, _, gap = priority_2[0]
+        return run_id, gap - 1
+    return None
+
+
+def load_state(athletes: int, course_length: int, rng: random.Random):
+    """Spread athletes across the course the way a busy relay drill looks"""
+    device_sequence = [f"192.168.99.{101 + i}" for i in range(course_length)]
+    state = ci.session_state
+    state.clear()
+    state.session_id = 'bench'
+    state.device_sequence = device_sequence
+    state.device_positions = ci.index_device_sequence(device_sequence)
+
+    for queue_position in range(1, athletes + 1):
+        state.restore_run(f"run-{queue_position}", {
+            'athlete_name': f"Athlete {queue_position}",
+            'athlete_id': f"athlete-{queue_position}",
+            'queue_position': queue_position,
+            'started_at': None,
+            'last_device': None,
+            'sequence_position': rng.randrange(-1, course_length - 1)
+        })
+    return device_sequence
+
+
+def bench(athletes: int, course_length: int, touches: int, seed: int):
+    rng = random.Random(seed)
+    device_sequence = load_state(athletes, course_length, rng)
+    positions = [rng.randrange(course_length) for _ in range(touches)]
+    active_runs = ci.session_state.active_runs
+
+    # Both paths must agree before timing means anything
+    for position in positions[:500]:
+        assert legacy_select(active_runs, position) == ci.session_state.select_for_position(position), position
+
+    def run_legacy():
+        for position in positions:
+            legacy_select(active_runs, position)
+
+    def run_indexed():
+        for position in positions:
+            ci.session_state.select_for_position(position)
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=3)) / touches
+    indexed = min(timeit.repeat(run_indexed, number=1, repeat=3)) / touches
+    return legacy, indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Touch attribution micro-benchmark")
+    parser.add_argument("--course-length", type=int, default=12, help="Devices in the course sequence")
+    parser.add_argument("--touches", type=int, default=20000, help="Touches per measurement")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+
+    print(f"Course length: {args.course_length} devices, {args.touches} touches per run")
+    print(f"{'Athletes':>10} {'Scan+sort (us)':>16} {'Indexed (us)':>14} {'Speedup':>9}")
+    for athletes in (5, 50, 500):
+        legacy, indexed = bench(athletes, args.course_length, args.touches, args.seed)
+        print(f"{athletes:>10} {legacy * 1e6:>16.2f} {indexed * 1e6:>14.2f} {legacy / indexed:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
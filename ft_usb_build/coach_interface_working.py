@@ -2,12 +2,78 @@
 """
 Coach Interface for Field Trainer - Port 5001
 Separate from admin interface, focused on team/athlete/session management
+
+    python3 coach_interface_working.py --profile-startup   # where startup time goes, then exit
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+import sys
+import time
+
+STARTUP_STARTED = time.perf_counter()
+
+
+# ==================== STARTUP PROFILING ====================
+# --profile-startup re-runs this script under "python3 -X importtime", which
+# starts up as normal (imports, database, journal recovery) and stops
+# before serving; the parent summarizes the import times it reports. The
+# run uses copies of the database and journal and its own handler lock, so
+# a coach interface already serving on the device is not disturbed.
+
+def profile_startup(top: int = 25):
+    """Run the startup path under -X importtime and print the slowest imports"""
+    import os
+    import shutil
+    import subprocess
+    import tempfile
+    with tempfile.TemporaryDirectory(prefix='coach_profile_') as workdir:
+        env = dict(os.environ,
+                   COACH_HANDLER_LOCK=os.path.join(workdir, 'coach_touch_handler.lock'),
+                   COACH_TRACE_DIR=os.path.join(workdir, 'touch_traces'))
+        for name, default in (('COACH_DB', '/opt/data/field_trainer.db'),
+                              ('COACH_JOURNAL', '/opt/data/coach_journal.jsonl')):
+            source = os.environ.get(name, default)
+            env[name] = os.path.join(workdir, os.path.basename(source))
+            for suffix in ('', '-wal'):
+                if os.path.exists(source + suffix):
+                    shutil.copy(source + suffix, env[name] + suffix)
+        result = subprocess.run([sys.executable, '-X', 'importtime', *sys.argv], env=env,
+                                stderr=subprocess.PIPE, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            print(line, file=sys.stderr)
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+        except ValueError:
+            continue  # The header line
+    total_ms = sum(cumulative for cumulative, _, name in imports if not name.startswith('  ')) / 1000
+    print(f"\n⏱️  Imports: {total_ms:.0f} ms in {len(imports)} modules - slowest (cumulative / self):")
+    for cumulative, self_us, name in sorted(imports, reverse=True)[:top]:
+        print(f"   {cumulative / 1000:8.1f} ms {self_us / 1000:8.1f} ms  {name}")
+    sys.exit(result.returncode)
+
+
+if __name__ == '__main__' and '--profile-startup' in sys.argv and 'importtime' not in sys._xoptions:
+    profile_startup()
+
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for
 from datetime import datetime
 from typing import Optional
-import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from io import StringIO
+import csv
+import json
+import logging
+import logging.handlers
+import queue
+import sqlite3
+import threading
+import atexit
+import fcntl
 import os
 
 # Add field_trainer to path
@@ -16,119 +82,1298 @@ sys.path.insert(0, '/opt')
 from field_trainer.db_manager import DatabaseManager
 from field_trainer.ft_registry import REGISTRY
 
+startup_phases = [('imports', time.perf_counter())]  # (phase, perf_counter when it finished)
+
+
+def mark_startup(phase: str):
+    startup_phases.append((phase, time.perf_counter()))
+
+
+def process_uptime() -> float:
+    """Seconds since this process started - includes interpreter start-up and compiling the script"""
+    try:
+        with open('/proc/self/stat') as f:
+            started_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            return float(f.read().split()[0]) - started_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.perf_counter() - STARTUP_STARTED
+
+
+def startup_breakdown() -> str:
+    """'imports 310 ms, database 12 ms, ...' from the phases marked so far"""
+    parts = []
+    previous = STARTUP_STARTED
+    for phase, finished in startup_phases:
+        parts.append(f"{phase} {(finished - previous) * 1000:.0f} ms")
+        previous = finished
+    return ', '.join(parts)
+
 app = Flask(__name__, template_folder='/opt/templates/coach')
 app.config['SECRET_KEY'] = 'field-trainer-coach-2025'
 
 # Initialize database
-db = DatabaseManager('/opt/data/field_trainer.db')
-
-# Store active session state - supports multiple simultaneous athletes
-active_session_state = {
-    'session_id': None,
-    'active_runs': {},  # {run_id: {'athlete_name', 'athlete_id', 'started_at', 'last_device', 'sequence_position'}}
-    'device_sequence': [],  # Ordered list of device_ids in course
-    'total_queued': 0  # Total athletes in queue at session start
-}
+DB_PATH = os.environ.get('COACH_DB', '/opt/data/field_trainer.db')
+db = DatabaseManager(DB_PATH)
+mark_startup('database')
+
+DEVICE_0 = '192.168.99.100'  # Start/finish cone, not part of the touch sequence
+
+
+# ==================== LOGGING ====================
+# Log calls only put a record on a queue; a listener thread does the
+# formatting and the writes, so a slow journald never stalls the touch path.
+# Per-touch detail is DEBUG - set COACH_LOG_LEVEL=DEBUG to see it.
+
+LOG_LEVEL = os.environ.get('COACH_LOG_LEVEL', 'INFO').upper()
+TRACE_DIR = os.environ.get('COACH_TRACE_DIR', '/opt/data/touch_traces')
+
+log = logging.getLogger('coach_interface')
+trace_log = logging.getLogger('coach_interface.trace')
+
+
+class TouchTraceHandler(logging.Handler):
+    """Write trace records as JSONL, one file per traced session"""
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self._files = {}  # {session_id: open file}
+
+    def emit(self, record):
+        try:
+            f = self._files.get(record.session_id)
+            if f is None:
+                os.makedirs(self.directory, exist_ok=True)
+                f = open(os.path.join(self.directory, f"{record.session_id}.jsonl"), 'a')
+                self._files[record.session_id] = f
+            f.write(json.dumps({'t': record.created, 'event': record.getMessage(), **record.fields}) + '\n')
+            if record.getMessage() == 'trace_stopped':
+                self._files.pop(record.session_id).close()
+            else:
+                f.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        super().close()
+
+
+traced_sessions = set()  # session_ids with the touch-trace sink switched on
 
-# Helper function to find which athlete should receive a touch
-def find_athlete_for_touch(device_id: str, timestamp: datetime) -> Optional[str]:
+
+def trace(session_id: str, event: str, **fields):
+    """Record a touch-trace event if tracing is on for this session"""
+    if session_id in traced_sessions:
+        trace_log.info(event, extra={'session_id': session_id, 'fields': fields})
+
+
+def set_session_trace(session_id: str, enabled: bool):
+    """Switch the touch-trace sink on or off for a session"""
+    if enabled and session_id not in traced_sessions:
+        traced_sessions.add(session_id)
+        trace(session_id, 'trace_started')
+    elif not enabled and session_id in traced_sessions:
+        trace(session_id, 'trace_stopped')
+        traced_sessions.discard(session_id)
+
+
+def _is_trace(record) -> bool:
+    return record.name == trace_log.name
+
+
+def setup_logging():
+    """Route coach_interface logging through a queue to stderr and the trace sink"""
+    console = logging.StreamHandler()
+    console.setLevel(LOG_LEVEL)
+    console.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s [%(threadName)s] %(message)s'))
+    console.addFilter(lambda record: not _is_trace(record))
+
+    traces = TouchTraceHandler(TRACE_DIR)
+    traces.addFilter(_is_trace)
+
+    log_queue = queue.SimpleQueue()
+    log.addHandler(logging.handlers.QueueHandler(log_queue))
+    log.setLevel(LOG_LEVEL)
+    log.propagate = False
+    trace_log.setLevel(logging.INFO)
+
+    listener = logging.handlers.QueueListener(log_queue, console, traces, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+log_listener = setup_logging()
+
+
+# ==================== DATABASE CONNECTIONS ====================
+# DatabaseManager opens a connection for every call. Everything here goes
+# through db.get_connection(), so it is swapped for one that hands each thread
+# its own long-lived connection - WAL, synchronous=NORMAL, memory-mapped reads
+# and a statement cache that survives between calls. WAL checkpoints and
+# PRAGMA optimize run in the background while no session is running.
+# COACH_DB_TUNING=0 keeps DatabaseManager's own connections.
+
+DB_TUNING = os.environ.get('COACH_DB_TUNING', '1') != '0'
+DB_MMAP_SIZE = int(os.environ.get('COACH_DB_MMAP', str(64 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = 5000  # The field trainer app writes the same database
+DB_CACHED_STATEMENTS = 256
+DB_MAINTENANCE_INTERVAL = 300.0  # seconds
+
+
+class _TunedConnection(sqlite3.Connection):
     """
-    Determine which active athlete should be attributed a touch on device_id.
-    Priority 1: Athletes at correct sequential position (gap == 1)
-    Priority 2: Athletes who skipped devices (gap > 1)
-    Ignores: Same device twice (gap == 0) or backwards (gap < 0)
+    A connection whose commit() inside nested get_connection() blocks waits
+    for the outermost one, so DatabaseManager methods called in a block
+    share its transaction even when they commit themselves.
     """
-    if not active_session_state['active_runs']:
-        print(f"   ❌ No active runs")
+    depth = 0  # get_connection() blocks open on this connection
+
+    def commit(self):
+        if self.depth <= 1:
+            super().commit()
+
+
+class TunedConnections:
+    """Per-thread reusable connections for one database file - see the section comment"""
+
+    def __init__(self, path: str, row_factory=sqlite3.Row, foreign_keys: bool = False):
+        self.path = path
+        self.row_factory = row_factory
+        self.foreign_keys = foreign_keys
+        self._local = threading.local()
+
+        with self.connect() as conn:
+            mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        if mode.lower() != 'wal':
+            log.warning("Database %s stayed in %s journal mode", path, mode)
+
+    @classmethod
+    def install(cls, manager, path: str) -> 'TunedConnections':
+        """Route manager.get_connection() through tuned connections, keeping its row factory and foreign keys"""
+        original = manager.get_connection()
+        conn = original.__enter__()
+        try:
+            row_factory = conn.row_factory
+            foreign_keys = bool(conn.execute('PRAGMA foreign_keys').fetchone()[0])
+        finally:
+            original.__exit__(None, None, None)
+            if isinstance(original, sqlite3.Connection):
+                original.close()
+        connections = cls(path, row_factory, foreign_keys)
+        manager.get_connection = connections.get_connection
+        return connections
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, factory=_TunedConnection,
+                               cached_statements=DB_CACHED_STATEMENTS, check_same_thread=False)
+        conn.row_factory = self.row_factory
+        conn.execute('PRAGMA synchronous=NORMAL')  # WAL: durable at checkpoints, never corrupt
+        conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        if self.foreign_keys:
+            conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            try:
+                conn.in_transaction  # Raises if a caller closed it
+                return conn
+            except sqlite3.ProgrammingError:
+                pass
+        conn = self._local.conn = self.connect()
+        return conn
+
+    @contextmanager
+    def get_connection(self):
+        """Drop-in for DatabaseManager.get_connection(): commits when the outermost block exits"""
+        conn = self._thread_connection()
+        conn.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            conn.depth -= 1
+            if conn.depth == 0 and conn.in_transaction:
+                conn.rollback()
+            raise
+        conn.depth -= 1
+        if conn.depth == 0 and conn.in_transaction:
+            conn.commit()
+
+    def maintain(self, checkpoint: str = 'TRUNCATE'):
+        """Fold the WAL back into the database and refresh the query planner's statistics"""
+        started = time.perf_counter()
+        with self.get_connection() as conn:
+            busy, wal_pages, _ = conn.execute(f'PRAGMA wal_checkpoint({checkpoint})').fetchone()
+            conn.execute('PRAGMA optimize')
+        log.debug("Database maintenance: checkpointed %d WAL pages%s in %.0f ms", wal_pages,
+                  ' (busy)' if busy else '', (time.perf_counter() - started) * 1000)
+
+    def start_maintenance(self, interval: float = DB_MAINTENANCE_INTERVAL):
+        """Background checkpoint/optimize, skipped while a session is running"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                if session_state.model is not None:
+                    continue  # SQLite's own auto-checkpoint keeps the WAL in check meanwhile
+                try:
+                    self.maintain()
+                except sqlite3.Error as e:
+                    log.warning("Database maintenance failed: %s", e)
+        threading.Thread(target=loop, name='coach-db-maintenance', daemon=True).start()
+
+
+db_connections = None
+if DB_TUNING:
+    db_connections = TunedConnections.install(db, DB_PATH)
+    db_connections.start_maintenance()
+
+
+# ==================== FIELD TRAINER CONTROL CLIENT ====================
+
+class FieldTrainerControl:
+    """
+    Shared HTTP client for the field trainer API (port 5000).
+    One pooled keep-alive session, a timeout budget per endpoint and retry
+    with backoff on connection failures. Point FIELD_TRAINER_API at a stub
+    server to benchmark or test without devices.
+    """
+
+    # endpoint: (total time budget in seconds, retries)
+    BUDGETS = {
+        'deploy': (5.0, 2),
+        'activate': (5.0, 2),
+        'audio': (2.0, 1),
+        'deactivate': (2.0, 2),
+        'led': (2.0, 1)
+    }
+    BACKOFF = 0.1  # seconds, doubled after each failed attempt
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(self, base_url: str, pool_size: int = 4):
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self._session = None
+        self._connection_error = None  # requests.ConnectionError, once requests is imported
+        self._session_lock = threading.Lock()
+        self._executor = None
+
+    def _get_session(self):
+        """Create the pooled session on first use"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('http://', adapter)
+                    self._connection_error = requests.ConnectionError
+                    self._session = session
+        return self._session
+
+    def post(self, endpoint: str, path: str, json: Optional[dict] = None):
+        """
+        POST to the field trainer API within the endpoint's time budget.
+        Only connection failures and gateway errors are retried - a read
+        timeout may mean the request was acted on, so it is not repeated.
+        """
+        budget, retries = self.BUDGETS[endpoint]
+        session = self._get_session()
+        deadline = time.monotonic() + budget
+        backoff = self.BACKOFF
+        attempt = 0
+
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                response = session.post(self.base_url + path, json=json, timeout=max(remaining, 0.05))
+            except self._connection_error:
+                if not self._can_retry(attempt, retries, backoff, deadline):
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    return response
+                if not self._can_retry(attempt, retries, backoff, deadline):
+                    return response
+
+            time.sleep(backoff)
+            backoff *= 2
+            attempt += 1
+
+    @staticmethod
+    def _can_retry(attempt: int, retries: int, backoff: float, deadline: float) -> bool:
+        return attempt < retries and time.monotonic() + backoff < deadline
+
+    def submit(self, fn, *args, **kwargs):
+        """Run a control call on the client's own executor, returning a Future"""
+        if self._executor is None:
+            with self._session_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='ft-control')
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def deploy_course(self, course_name: str):
+        return self.post('deploy', '/api/course/deploy', {'course_name': course_name})
+
+    def activate_course(self, course_name: str):
+        return self.post('activate', '/api/course/activate', {'course_name': course_name})
+
+    def deploy_and_activate(self, course_name: str):
+        """Deploy, then activate if the deploy succeeded. Returns (deploy, activate) responses"""
+        deploy_response = self.deploy_course(course_name)
+        if deploy_response.status_code != 200:
+            return deploy_response, None
+        return deploy_response, self.activate_course(course_name)
+
+    def deploy_and_activate_async(self, course_name: str):
+        """Async variant of deploy_and_activate - overlap it with other work"""
+        return self.submit(self.deploy_and_activate, course_name)
+
+    def play_audio(self, node_id: str, clip: str):
+        return self.post('audio', '/api/audio/play', {'node_id': node_id, 'clip': clip})
+
+    def deactivate(self):
+        return self.post('deactivate', '/api/deactivate')
+
+    def set_led(self, device_ip: str, pattern: str):
+        return self.post('led', f'/api/device/{device_ip}/led', {'pattern': pattern})
+
+
+control = FieldTrainerControl(os.environ.get('FIELD_TRAINER_API', 'http://localhost:5000'))
+
+def index_device_sequence(device_sequence: list) -> dict:
+    """Build the device_id -> sequence position lookup for a course"""
+    return {device_id: position for position, device_id in enumerate(device_sequence)}
+
+
+# ==================== SESSION READ PATH ====================
+# Every change to a session made through this process bumps its version.
+# Status polls carry the version as an ETag, so an unchanged poll is a
+# dictionary lookup and a 304 instead of a session + per-run segment load.
+
+BOOT_ID = os.urandom(4).hex()  # Keeps ETags from a previous process from matching
+session_versions = {}  # {session_id: int}
+_session_versions_lock = threading.Lock()
+
+
+def bump_session_version(session_id: str):
+    """Call after a session's runs or segments change in the database"""
+    with _session_versions_lock:
+        session_versions[session_id] = session_versions.get(session_id, 0) + 1
+
+
+def session_etag(session_id: str) -> str:
+    return f"{BOOT_ID}-{session_id}-{session_versions.get(session_id, 0)}"
+
+
+def load_session_with_segments(session_id: str) -> Optional[dict]:
+    """
+    Load a session with every run's segments attached as run['segments'].
+    Two queries in total (session + runs, then all segments for the session)
+    instead of one get_run_segments() call per run.
+    """
+    session = db.get_session(session_id)
+    if not session:
         return None
-    
-    session_id = active_session_state.get('session_id')
-    if not session_id:
+
+    with db.get_connection() as conn:
+        rows = conn.execute('''
+            SELECT seg.*
+            FROM segments seg
+            JOIN runs r ON seg.run_id = r.run_id
+            WHERE r.session_id = ?
+            ORDER BY seg.rowid
+        ''', (session_id,)).fetchall()
+
+    segments_by_run = {}
+    for row in rows:
+        segment = dict(row)
+        segments_by_run.setdefault(segment['run_id'], []).append(segment)
+
+    for run in session['runs']:
+        run['segments'] = segments_by_run.get(run['run_id'], [])
+    return session
+
+
+# ==================== SEGMENT INDEX ====================
+# Per-run (from_device, to_device) -> segment_id, filled when a run's segments
+# are created or loaded, so marking segments never has to re-read them.
+
+run_segment_ids = {}  # {run_id: {(from_device, to_device): segment_id}}
+
+
+def index_run_segments(run_id: str, segments: list) -> dict:
+    index = {(seg['from_device'], seg['to_device']): seg['segment_id'] for seg in segments}
+    run_segment_ids[run_id] = index
+    return index
+
+
+def get_run_segment_index(run_id: str) -> dict:
+    index = run_segment_ids.get(run_id)
+    if index is None:
+        index = index_run_segments(run_id, db.get_run_segments(run_id))
+    return index
+
+
+# ==================== WRITE-BEHIND JOURNAL ====================
+
+JOURNAL_PATH = os.environ.get('COACH_JOURNAL', '/opt/data/coach_journal.jsonl')
+
+
+class WriteBehindJournal:
+    """
+    Append-only log of session writes, applied to the database in batches by
+    a background thread. Touch handling only pays for a buffered file write.
+
+    Entries are fsync'd once per batch before they are applied, and an
+    'applied' marker follows each one, so recover() can re-apply whatever the
+    database missed after a crash. An entry applied in the last fsync window
+    before a power cut may be applied twice. An entry that still fails after
+    APPLY_RETRIES gets no marker: it is logged as an error, kept through
+    compaction and re-applied by recover() at the next start.
+    """
+
+    FLUSH_INTERVAL = 0.25  # seconds to let a batch fill
+    BATCH_SIZE = 64
+    APPLY_RETRIES = 3
+
+    def __init__(self, path: str):
+        self.path = path
+        self._cond = threading.Condition()
+        self._pending = deque()  # (entry, on_applied)
+        self._seq = 0
+        self._applied_seq = 0
+        self._file = None
+        self._failed = []  # Entries the database refused - left for recover()
+        self._thread = None
+        self._compact_requested = False
+        self._urgent = False
+
+    def append(self, op: str, session_id: str, *args, on_applied=None, urgent: bool = False) -> int:
+        """
+        Journal an operation; on_applied(result) runs on the writer thread once
+        it is in the database. urgent skips the batching window.
+        """
+        with self._cond:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._seq += 1
+            entry = {'seq': self._seq, 'op': op, 'session_id': session_id, 'args': list(args)}
+            self._file.write(json.dumps(entry, separators=(',', ':'), default=str) + '\n')
+            self._pending.append((entry, on_applied))
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='coach-journal-writer', daemon=True)
+                self._thread.start()
+            if urgent:
+                self._urgent = True
+            if urgent or len(self._pending) == 1 or len(self._pending) >= self.BATCH_SIZE:
+                self._cond.notify_all()
+            return self._seq
+
+    def wait_applied(self, seq: int, timeout: float) -> bool:
+        """Block until entry seq is in the database - for callers that read their own write next"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._applied_seq < seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def wait_drained(self, timeout: float) -> bool:
+        """Block until everything journaled so far is in the database"""
+        with self._cond:
+            seq = self._seq
+        return self.wait_applied(seq, timeout)
+
+    def request_compaction(self):
+        """Truncate the journal once everything pending has been applied (session over)"""
+        with self._cond:
+            self._compact_requested = True
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                if len(self._pending) < self.BATCH_SIZE and not self._urgent:
+                    self._cond.wait(timeout=self.FLUSH_INTERVAL)
+                batch = list(self._pending)
+                self._pending.clear()
+                self._urgent = False
+                self._file.flush()  # Into the page cache - cheap
+                fd = os.dup(self._file.fileno())
+            # The SD card write happens without the lock: append() - the touch
+            # path - never waits for it
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._apply_batch(batch)
+
+    def _apply_batch(self, batch: list):
+        sessions = set()
+        for entry, on_applied in batch:
+            try:
+                result = self._apply_entry(entry)
+                applied = True
+            except Exception as e:
+                self._log_failure(entry, e)
+                result, applied = None, False
+            with self._cond:
+                if applied:
+                    self._file.write(json.dumps({'applied': entry['seq']}) + '\n')
+                    self._file.flush()
+                else:
+                    self._failed.append(entry)
+                self._applied_seq = entry['seq']  # Done with, either way - nobody waits on it for longer
+                self._cond.notify_all()
+            sessions.add(entry['session_id'])
+            if on_applied:
+                try:
+                    on_applied(result)
+                except Exception as e:
+                    log.warning("Journal callback for %s failed: %s", entry['op'], e)
+
+        for session_id in sessions:
+            bump_session_version(session_id)
+
+        with self._cond:
+            if self._compact_requested and not self._pending:
+                self._file.close()
+                self._file = open(self.path, 'w', encoding='utf-8')
+                for entry in self._failed:  # Still owed to the database
+                    self._file.write(json.dumps(entry, separators=(',', ':'), default=str) + '\n')
+                self._file.flush()
+                self._compact_requested = False
+
+    def _apply_entry(self, entry: dict):
+        """Apply one entry, retrying; raises if the last attempt fails"""
+        handler = getattr(self, f"_apply_{entry['op']}")
+        for attempt in range(self.APPLY_RETRIES):
+            try:
+                return handler(entry['session_id'], *entry['args'])
+            except Exception:
+                if attempt == self.APPLY_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+
+    @staticmethod
+    def _log_failure(entry: dict, error: Exception):
+        message = f"Journal entry {entry['seq']} ({entry['op']}) failed, left for recovery: {error}"
+        REGISTRY.log(message, level="error")
+        log.error("❌ %s", message)
+
+    def recover(self) -> list:
+        """
+        Re-apply entries the database never saw, e.g. after a crash.
+        Returns every journaled entry so in-memory state can be rebuilt.
+        """
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+
+        entries = []
+        applied = set()
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn write at the moment of the crash
+            if 'applied' in record:
+                applied.add(record['applied'])
+            else:
+                entries.append(record)
+
+        unapplied = [entry for entry in entries if entry['seq'] not in applied]
+        recovered = []
+        for entry in unapplied:
+            try:
+                self._apply_entry(entry)
+            except Exception as e:
+                self._log_failure(entry, e)
+                self._failed.append(entry)
+                continue
+            recovered.append(entry)
+            bump_session_version(entry['session_id'])
+
+        with self._cond:
+            self._seq = self._applied_seq = max((entry['seq'] for entry in entries), default=0)
+            if recovered:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    for entry in recovered:
+                        f.write(json.dumps({'applied': entry['seq']}) + '\n')
+        return entries
+
+    # ---- database operations, one per journal op ----
+
+    def _apply_start_session(self, session_id, schedule=None):
+        db.start_session(session_id)  # schedule is only read back by recovery
+
+    def _apply_start_run(self, session_id, run_id, started_at):
+        db.start_run(run_id, datetime.fromisoformat(started_at))
+
+    def _apply_create_segments(self, session_id, run_id, course_id):
+        db.create_segments_for_run(run_id, course_id)
+        index_run_segments(run_id, db.get_run_segments(run_id))
+
+    def _apply_record_touch(self, session_id, run_id, device_id, timestamp):
+        return db.record_touch(run_id, device_id, datetime.fromisoformat(timestamp))
+
+    def _apply_mark_missed(self, session_id, run_id, pairs):
+        """
+        All skipped segments of one touch in a single entry and a single
+        transaction: the mark_segment_missed() calls nest in this block and
+        commit once at its end. (COACH_DB_TUNING=0 commits each one.)
+        """
+        index = get_run_segment_index(run_id)
+        marked = []
+        with db.get_connection():
+            for from_device, to_device in pairs:
+                segment_id = index.get((from_device, to_device))
+                if segment_id is not None:
+                    db.mark_segment_missed(segment_id)
+                    marked.append(segment_id)
+        return marked
+
+    def _apply_update_run_status(self, session_id, run_id, status):
+        db.update_run_status(run_id, status)
+
+    def _apply_complete_run(self, session_id, run_id, completed_at, total_time):
+        db.complete_run(run_id, datetime.fromisoformat(completed_at), total_time)
+        analytics.record_run(run_id)
+
+    # The summary counts alerts, which the alert worker writes once each touch
+    # is applied - so it is computed there, behind every check already queued
+
+    def _apply_complete_session(self, session_id):
+        db.complete_session(session_id)
+        after_alert_checks(store_session_summary, session_id)
+
+    def _apply_stop_session(self, session_id, reason):
+        db.mark_session_incomplete(session_id, reason)
+        after_alert_checks(store_session_summary, session_id)
+
+
+journal = WriteBehindJournal(JOURNAL_PATH)
+
+
+# ==================== COURSE PLANS ====================
+
+class CoursePlan:
+    """
+    Everything touch handling needs from a course, compiled once: the
+    device -> action table, which devices trigger the next athlete or finish
+    a run, the start clip and the segment layout.
+    """
+
+    def __init__(self, course: dict):
+        self.course_id = course['course_id']
+        self.course_name = course['course_name']
+        self.actions = course['actions']
+        self.actions_by_device = {action['device_id']: action for action in self.actions}
+        self.device_sequence = [action['device_id'] for action in self.actions if action['device_id'] != DEVICE_0]
+        self.device_positions = index_device_sequence(self.device_sequence)
+        self.triggers_next = frozenset(a['device_id'] for a in self.actions if a.get('triggers_next_athlete'))
+        self.marks_complete = frozenset(a['device_id'] for a in self.actions if a.get('marks_run_complete'))
+        self.start_audio_file = self.actions[0]['audio_file'] if self.actions else None
+        self.start_clip = self.start_audio_file.replace('.mp3', '') if self.start_audio_file else None
+        # segment_templates[position] = (from_device, to_device) for the segment ending there
+        self.segment_templates = [
+            (self.device_sequence[position - 1] if position > 0 else DEVICE_0, device_id)
+            for position, device_id in enumerate(self.device_sequence)
+        ]
+
+
+_course_plans = {}  # {course_id: CoursePlan}
+_course_plans_lock = threading.Lock()
+
+
+def get_course_plan(course_id: int) -> Optional[CoursePlan]:
+    """Compiled plan for a course, built on first use"""
+    course_id = int(course_id)
+    plan = _course_plans.get(course_id)
+    if plan is None:
+        course = db.get_course(course_id)
+        if not course:
+            return None
+        plan = CoursePlan(course)
+        with _course_plans_lock:
+            _course_plans[course_id] = plan
+    return plan
+
+
+def invalidate_course_plan(course_id: int):
+    """Drop a course's plan after it is edited. A running session keeps the plan it started with."""
+    with _course_plans_lock:
+        _course_plans.pop(int(course_id), None)
+
+
+@app.route('/api/course/<int:course_id>/invalidate', methods=['POST'])
+def course_plan_invalidate(course_id):
+    """API: Called by the admin interface when a course is edited"""
+    invalidate_course_plan(course_id)
+    return jsonify({'success': True})
+
+
+# ==================== SESSION MODEL ====================
+
+class SessionModel:
+    """
+    Authoritative in-memory copy of the active session: athlete queue, runs,
+    segment layout and the course plan. Touch handling reads and updates
+    this; every change is journaled and reaches the database behind it.
+    """
+
+    def __init__(self, session: dict, plan: CoursePlan):
+        self.session_id = session['session_id']
+        self.course_id = session['course_id']
+        self.audio_voice = session.get('audio_voice', 'male')
+        self.plan = plan
+        self.runs = {run['run_id']: run for run in session['runs']}
+        self.queue = deque(run['run_id'] for run in sorted(session['runs'], key=lambda r: r['queue_position'])
+                           if run['status'] == 'queued')
+        for run in session['runs']:
+            if run.get('segments'):
+                index_run_segments(run['run_id'], run['segments'])
+
+    @classmethod
+    def load(cls, session_id: str) -> Optional['SessionModel']:
+        session = load_session_with_segments(session_id)
+        if not session:
+            return None
+        plan = get_course_plan(session['course_id'])
+        if not plan:
+            return None
+        return cls(session, plan)
+
+    def segment_for(self, position: int) -> tuple:
+        """(from_device, to_device) of the segment that ends at a sequence position"""
+        return self.plan.segment_templates[position]
+
+    def next_queued_run(self) -> Optional[dict]:
+        while self.queue and self.runs[self.queue[0]]['status'] != 'queued':
+            self.queue.popleft()
+        return self.runs[self.queue[0]] if self.queue else None
+
+    def start_session(self, schedule: dict):
+        journal.append('start_session', self.session_id, schedule, urgent=True)
+
+    def start_run(self, run_id: str, start_time: datetime):
+        run = self.runs[run_id]
+        run['status'] = 'running'
+        run['started_at'] = start_time.isoformat()
+        journal.append('start_run', self.session_id, run_id, run['started_at'])
+        journal.append('create_segments', self.session_id, run_id, self.course_id)
+
+    def record_touch(self, run_id: str, device_id: str, timestamp: datetime, on_applied=None):
+        journal.append('record_touch', self.session_id, run_id, device_id, timestamp.isoformat(), on_applied=on_applied)
+
+    def mark_missed(self, run_id: str, first_position: int, end_position: int) -> list:
+        """Mark the segments ending at positions first_position..end_position-1 missed; returns their (from, to) pairs"""
+        pairs = self.plan.segment_templates[first_position:end_position]
+        if pairs:
+            journal.append('mark_missed', self.session_id, run_id, pairs)
+        return pairs
+
+    def mark_absent(self, run_id: str):
+        self.runs[run_id]['status'] = 'absent'
+        journal.append('update_run_status', self.session_id, run_id, 'absent')
+
+    def complete_run(self, run_id: str, completed_at: datetime, total_time: float):
+        run = self.runs[run_id]
+        run['status'] = 'completed'
+        run['completed_at'] = completed_at.isoformat()
+        run['total_time'] = total_time
+        journal.append('complete_run', self.session_id, run_id, run['completed_at'], total_time)
+
+    def complete_session(self):
+        journal.append('complete_session', self.session_id)
+        journal.request_compaction()
+
+    def stop(self, reason: str) -> int:
+        seq = journal.append('stop_session', self.session_id, reason, urgent=True)
+        journal.request_compaction()
+        return seq
+
+
+MAX_ACTIVE_RUNS = int(os.environ.get('COACH_MAX_ACTIVE', '5'))  # Default cap on athletes on course at once
+
+
+def new_run_info(run: dict, start_time: datetime) -> dict:
+    """active_runs entry for an athlete who has just been sent off"""
+    return {
+        'athlete_name': run['athlete_name'],
+        'athlete_id': run['athlete_id'],
+        'queue_position': run.get('queue_position', 999),
+        'started_at': start_time.isoformat(),
+        'last_device': None,
+        'last_touch_at': start_time,  # For the split time of their next segment
+        'sequence_position': -1  # Haven't touched any device yet
+    }
+
+
+class ActiveSessionState:
+    """
+    Multi-athlete tracking for the running session. Request handlers and the
+    touch worker both change it, so everything happens under self.lock, and
+    each compound step - attribute a touch, send off the next athlete, finish
+    a run - is one method that cannot interleave with another.
+
+    active_runs: {run_id: {'athlete_name', 'athlete_id', 'queue_position', 'started_at', 'last_device', 'last_touch_at', 'sequence_position'}}
+    runs_by_position: {next expected position: {run_id: run_info}} - non-empty buckets only
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.model = None  # SessionModel for the running session, if any
+        self.session_id = None
+        self.active_runs = {}
+        self.runs_by_position = {}
+        self.device_sequence = []  # Ordered list of device_ids in course
+        self.device_positions = {}  # {device_id: index in device_sequence}
+        self.total_queued = 0  # Total athletes in queue at session start
+
+    # --- attribution index (caller holds self.lock) ---
+
+    def _track(self, run_id: str, run_info: dict):
+        """Add an athlete to active_runs and file them under their next expected position"""
+        self.active_runs[run_id] = run_info
+        next_position = run_info.get('sequence_position', -1) + 1
+        self.runs_by_position.setdefault(next_position, {})[run_id] = run_info
+
+    def _untrack(self, run_id: str) -> Optional[dict]:
+        """Remove an athlete from active_runs and from their position bucket"""
+        run_info = self.active_runs.pop(run_id, None)
+        if run_info is None:
+            return None
+        next_position = run_info.get('sequence_position', -1) + 1
+        bucket = self.runs_by_position.get(next_position)
+        if bucket is not None:
+            bucket.pop(run_id, None)
+            if not bucket:
+                del self.runs_by_position[next_position]
+        return run_info
+
+    def _advance(self, run_id: str, device_id: str, new_position: int):
+        """Move an athlete to a new sequence position, re-bucketing them"""
+        run_info = self._untrack(run_id)
+        if run_info is None:
+            return
+        run_info['last_device'] = device_id
+        run_info['sequence_position'] = new_position
+        self._track(run_id, run_info)
+
+    def select_for_position(self, device_position: int):
+        """
+        Pick the active run that should own a touch at device_position.
+        Returns (run_id, skipped_count) or None.
+
+        Sequential athletes (expecting exactly this position) win; otherwise the
+        athlete with the smallest skip. Ties go to queue order.
+        """
+        buckets = self.runs_by_position
+
+        candidates = buckets.get(device_position)
+        if candidates:
+            skipped_count = 0
+        else:
+            # Athletes expecting an earlier position skipped devices - closest one wins
+            earlier = [position for position in buckets if position < device_position]
+            if not earlier:
+                return None
+            expected_position = max(earlier)
+            candidates = buckets[expected_position]
+            skipped_count = device_position - expected_position
+
+        run_id = min(candidates, key=lambda r: candidates[r].get('queue_position', 999))
+        return run_id, skipped_count
+
+    # --- session lifecycle ---
+
+    def activate(self, model: 'SessionModel') -> bool:
+        """Make model the running session; False if it is already running"""
+        with self.lock:
+            if self.session_id == model.session_id:
+                return False
+            self._clear()
+            self.model = model
+            self.session_id = model.session_id
+            self.device_sequence = model.plan.device_sequence
+            self.device_positions = model.plan.device_positions
+            self.total_queued = len(model.runs)
+            return True
+
+    def restore_run(self, run_id: str, run_info: dict):
+        """Put a running athlete back on course after a restart"""
+        with self.lock:
+            self._track(run_id, run_info)
+
+    def _clear(self):
+        if self.model is not None:
+            for run_id in self.model.runs:
+                run_segment_ids.pop(run_id, None)
+        self._reset()
+
+    def clear(self, session_id: str = None):
+        """Forget the running session (or only if it is session_id)"""
+        with self.lock:
+            if session_id is None or session_id == self.session_id:
+                self._clear()
+
+    def stop(self, session_id: str, reason: str) -> Optional[int]:
+        """Stop session_id if it is the running one; returns the journal seq of the stop"""
+        with self.lock:
+            if self.model is None or self.session_id != session_id:
+                return None
+            seq = self.model.stop(reason)
+            self._clear()
+            return seq
+
+    # --- athletes ---
+
+    def claim_next_run(self, start_time: datetime, max_active: int = MAX_ACTIVE_RUNS) -> Optional[dict]:
+        """
+        Send off the next queued athlete. Returns their run, or None if the
+        queue is empty or the course is full - never the same athlete twice.
+        """
+        with self.lock:
+            if self.model is None or len(self.active_runs) >= max_active:
+                return None
+            run = self.model.next_queued_run()
+            if run is None or run['run_id'] in self.active_runs:
+                return None
+            self.model.start_run(run['run_id'], start_time)
+            self._track(run['run_id'], new_run_info(run, start_time))
+            return run
+
+    def attribute_touch(self, device_id: str, timestamp: datetime, on_applied=None) -> Optional[tuple]:
+        """
+        Attribute a touch to an athlete, mark any segments they skipped, move
+        them on and journal the touch. Returns (run_id, run_info, position,
+        missed_pairs, split) or None if no athlete can own the touch; split is
+        the segment time in seconds, or None if they skipped a device.
+        """
+        with self.lock:
+            position = self.device_positions.get(device_id)
+            if position is None or not self.active_runs:
+                return None
+            selection = self.select_for_position(position)
+            if selection is None:
+                return None
+
+            run_id, skipped_count = selection
+            run_info = self.active_runs[run_id]
+            missed = []
+            if skipped_count:
+                # Mark every skipped segment in one journal entry
+                missed = self.model.mark_missed(run_id, run_info['sequence_position'] + 1, position)
+            split = None if missed else (timestamp - run_info['last_touch_at']).total_seconds()
+            run_info['last_touch_at'] = timestamp
+            self._advance(run_id, device_id, position)
+            self.model.record_touch(run_id, device_id, timestamp, on_applied=on_applied)
+            return run_id, run_info, position, missed, split
+
+    def complete_run(self, run_id: str, completed_at: datetime) -> Optional[tuple]:
+        """
+        Finish an athlete's run, exactly once. Returns (run_info, total_time,
+        session_complete); completing the last athlete completes the session
+        and clears it.
+        """
+        with self.lock:
+            run_info = self._untrack(run_id)
+            if run_info is None:
+                return None
+            model = self.model
+            total_time = (completed_at - datetime.fromisoformat(model.runs[run_id]['started_at'])).total_seconds()
+            model.complete_run(run_id, completed_at, total_time)
+
+            session_complete = not self.active_runs and model.next_queued_run() is None
+            if session_complete:
+                model.complete_session()
+                self._clear()
+            return run_info, total_time, session_complete
+
+    def mark_absent(self, session_id: str, run_id: str) -> Optional[tuple]:
+        """
+        Take an athlete out of the running session. Returns (run,
+        session_complete), or None if the session is not running here.
+        """
+        with self.lock:
+            if self.model is None or self.session_id != session_id or run_id not in self.model.runs:
+                return None
+            model = self.model
+            run = model.runs[run_id]
+            if run['status'] == 'completed':
+                return run, False
+            self._untrack(run_id)
+            model.mark_absent(run_id)
+
+            session_complete = not self.active_runs and model.next_queued_run() is None
+            if session_complete:
+                model.complete_session()
+                self._clear()
+            return run, session_complete
+
+
+session_state = ActiveSessionState()
+
+
+# ==================== ATHLETE SCHEDULER ====================
+# Decides when the next athlete goes. In relay mode a touch on a
+# "triggers next athlete" cone owes the queue one start; in wave mode a timer
+# owes it wave_size starts every wave_interval seconds. Owed starts wait for a
+# free slot under max_active and at least min_spacing seconds after the last
+# start, and are admitted the moment both allow - on a completion, an absence
+# or a timer - so nothing polls the database.
+
+DEFAULT_SCHEDULE = {
+    'max_active': MAX_ACTIVE_RUNS,  # Athletes on course at once
+    'wave_interval': 0.0,  # Seconds between waves; 0 = relay starts from trigger cones
+    'wave_size': 1,  # Athletes per wave
+    'min_spacing': 0.0  # Minimum seconds between any two starts
+}
+
+session_schedules = {}  # {session_id: schedule} - set at session creation or GO
+
+
+def parse_schedule(data: dict, base: dict = None) -> dict:
+    """Schedule settings from request JSON, on top of base (or the defaults)"""
+    schedule = dict(base or DEFAULT_SCHEDULE)
+    for key, default in DEFAULT_SCHEDULE.items():
+        if data.get(key) is not None:
+            schedule[key] = type(default)(data[key])
+    if schedule['max_active'] < 1 or schedule['wave_size'] < 1:
+        raise ValueError("max_active and wave_size must be at least 1")
+    if schedule['wave_interval'] < 0 or schedule['min_spacing'] < 0:
+        raise ValueError("wave_interval and min_spacing cannot be negative")
+    return schedule
+
+
+class AthleteScheduler:
+    """Admits queued athletes for the running session - see the section comment"""
+
+    def __init__(self, state: ActiveSessionState):
+        self.state = state
+        self._reset(None, DEFAULT_SCHEDULE)
+
+    def _reset(self, session_id: Optional[str], schedule: dict):
+        self.session_id = session_id
+        self.schedule = dict(schedule)
+        self.owed = 0  # Starts promised but not yet admitted
+        self.last_start = 0.0  # time.monotonic() of the last start
+        self.next_wave = None  # time.monotonic() the next wave is due, in wave mode
+        self._timer = None
+        self._generation = getattr(self, '_generation', 0) + 1  # Invalidates pending timers
+
+    def _current(self) -> bool:
+        """Caller holds state.lock. Follow the running session; False if there is none."""
+        if self.state.session_id is None:
+            return False
+        if self.session_id != self.state.session_id:
+            self._cancel_timer()
+            self._reset(self.state.session_id, session_schedules.get(self.state.session_id, DEFAULT_SCHEDULE))
+        return True
+
+    def claim_first_wave(self, schedule: dict, start_time: datetime) -> list:
+        """GO: caller holds state.lock. Start the first athlete, or the first wave, under schedule."""
+        self._cancel_timer()
+        self._reset(self.state.session_id, schedule)
+        size = min(schedule['wave_size'], schedule['max_active']) if schedule['wave_interval'] > 0 else 1
+        first_wave = []
+        for _ in range(size):
+            run = self.state.claim_next_run(start_time, max_active=schedule['max_active'])
+            if run is None:
+                break
+            first_wave.append(run)
+        self.last_start = time.monotonic()
+        if schedule['wave_interval'] > 0:
+            self.next_wave = self.last_start + schedule['wave_interval']
+        self._schedule_timer(self.next_wave)
+        return first_wave
+
+    def resume(self, schedule: dict):
+        """After a restart, carry on with the recovered session's schedule"""
+        with self.state.lock:
+            self._cancel_timer()
+            self._reset(self.state.session_id, schedule)
+            if schedule['wave_interval'] > 0:
+                self.next_wave = time.monotonic()
+            started = self._admit()
+            model = self.state.model
+        announce_runs_started(model, started, cause='resume')
+
+    def configure(self, schedule: dict):
+        """Change the running session's limits; takes effect immediately"""
+        with self.state.lock:
+            if not self._current():
+                return
+            was_waves = self.schedule['wave_interval'] > 0
+            self.schedule = dict(schedule)
+            if schedule['wave_interval'] > 0 and not was_waves:
+                self.next_wave = time.monotonic() + schedule['wave_interval']
+            elif schedule['wave_interval'] == 0:
+                self.next_wave = None
+            started = self._admit()
+            model = self.state.model
+        announce_runs_started(model, started, cause='schedule')
+
+    def trigger(self, triggered_by: str, triggered_at: float, touched_at: Optional[datetime] = None):
+        """
+        A trigger cone was touched - owe the queue one start (relay mode).
+        An athlete started straight away is stamped touched_at, the touch's time.
+        """
+        with self.state.lock:
+            if not self._current() or self.schedule['wave_interval'] > 0:
+                return
+            self.owed += 1
+            started = self._admit(touched_at)
+            model = self.state.model
+        announce_runs_started(model, started, cause=triggered_by, triggered_at=triggered_at)
+
+    def slot_freed(self, freed_at: Optional[datetime] = None):
+        """An athlete finished or left the course - admit anyone waiting, stamped freed_at if given"""
+        with self.state.lock:
+            if not self._current():
+                return
+            started = self._admit(freed_at)
+            model = self.state.model
+        announce_runs_started(model, started, cause='slot_freed')
+
+    def status(self) -> dict:
+        with self.state.lock:
+            self._current()
+            return {
+                **self.schedule,
+                'owed_starts': self.owed,
+                'active': len(self.state.active_runs),
+                'next_wave_in': round(self.next_wave - time.monotonic(), 2) if self.next_wave else None
+            }
+
+    # ---- caller holds state.lock ----
+
+    def _admit(self, start_time: Optional[datetime] = None) -> list:
+        """
+        Start as many owed athletes as the limits allow; returns [(run, start_time)].
+        start_time is when the touch that let them go happened - now if not given.
+        """
+        model = self.state.model
+        if model is None:
+            return []
+        now = time.monotonic()
+        if self.next_wave is not None and now >= self.next_wave:
+            self.owed += self.schedule['wave_size']
+            missed_waves = int((now - self.next_wave) // self.schedule['wave_interval'])
+            self.next_wave += self.schedule['wave_interval'] * (missed_waves + 1)
+        if not self.state.active_runs and self.owed == 0 and self.next_wave is None:
+            self.owed = 1  # An empty course has nobody left to touch a trigger cone
+
+        started = []
+        wake_at = self.next_wave
+        while self.owed > 0 and len(self.state.active_runs) < self.schedule['max_active']:
+            spacing_ends = self.last_start + self.schedule['min_spacing']
+            if now < spacing_ends:
+                wake_at = spacing_ends if wake_at is None else min(wake_at, spacing_ends)
+                break
+            run_start = start_time or datetime.utcnow()
+            run = self.state.claim_next_run(run_start, max_active=self.schedule['max_active'])
+            if run is None:
+                break
+            started.append((run, run_start))
+            self.owed -= 1
+            self.last_start = now
+
+        if model.next_queued_run() is None:
+            self.owed = 0
+            self.next_wave = None
+            wake_at = None
+        else:
+            self.owed = min(self.owed, len(model.queue))
+        self._schedule_timer(wake_at)
+        return started
+
+    def _schedule_timer(self, wake_at: Optional[float]):
+        self._cancel_timer()
+        if wake_at is None:
+            return
+        self._timer = threading.Timer(max(0.0, wake_at - time.monotonic()), self._on_timer, args=(self._generation,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self, generation: int):
+        with self.state.lock:
+            if generation != self._generation or not self._current():
+                return
+            self._timer = None
+            started = self._admit()
+            model = self.state.model
+        announce_runs_started(model, started, cause='timer')
+
+
+scheduler = AthleteScheduler(session_state)
+
+
+def recover_session_state():
+    """
+    Replay the journal into the database and, if a session was still running
+    when the process died, rebuild the in-memory model and athlete positions.
+    """
+    entries = journal.recover()
+    starts = [entry for entry in entries if entry['op'] == 'start_session']
+    if not starts:
         return None
-    
-    # Find device position in sequence
-    device_sequence = active_session_state['device_sequence']
-    if device_id not in device_sequence:
-        print(f"   ❌ Device {device_id} not in course sequence")
+
+    session_id = starts[-1]['session_id']
+    session_entries = [entry for entry in entries if entry['session_id'] == session_id]
+    if any(entry['op'] in ('complete_session', 'stop_session') for entry in session_entries):
         return None
-    
-    device_position = device_sequence.index(device_id)
-    
-    # Categorize athletes by gap
-    priority_1 = []  # gap == 1 (sequential)
-    priority_2 = []  # gap > 1 (skipped devices)
-    
-    print(f"   🔍 Checking {len(active_session_state['active_runs'])} active athletes for device {device_id} (position {device_position}):")
-    
-    for run_id, run_info in active_session_state['active_runs'].items():
-        last_position = run_info.get('sequence_position', -1)
-        gap = device_position - last_position
-        
-        print(f"      {run_info['athlete_name']}: last_position={last_position}, gap={gap}")
-        
-        if gap == 0:
-            print(f"         ⚠️  Same device twice - IGNORE")
-            continue
-        elif gap < 0:
-            print(f"         ⚠️  Backwards touch - IGNORE")
-            continue
-        elif gap == 1:
-            print(f"         ✅ Sequential (Priority 1)")
-            priority_1.append((run_id, run_info, gap))
-        elif gap > 1:
-            print(f"         ⚠️  Skipped {gap-1} device(s) (Priority 2)")
-            priority_2.append((run_id, run_info, gap))
-    
-    # Attribution logic
-    chosen = None
-    skipped_count = 0
-    
-    if priority_1:
-        # Choose first athlete in queue order
-        priority_1.sort(key=lambda x: x[1].get('queue_position', 999))
-        chosen, chosen_info, _ = priority_1[0]
-        print(f"   ✅ Attributed to {chosen_info['athlete_name']} (sequential)")
-        
-    elif priority_2:
-        # Choose athlete with smallest gap, then by queue order
-        priority_2.sort(key=lambda x: (x[2], x[1].get('queue_position', 999)))
-        chosen, chosen_info, gap = priority_2[0]
-        skipped_count = gap - 1
-        print(f"   ⚠️  Attributed to {chosen_info['athlete_name']} (skipped {skipped_count} device(s))")
-        
-    else:
-        print(f"   ⚠️  No valid candidates for device {device_id}")
+
+    model = SessionModel.load(session_id)
+    if not model:
         return None
-    
-    # Mark skipped segments if applicable
-    if skipped_count > 0:
-        mark_skipped_segments(chosen, device_position, skipped_count)
-    
-    return chosen
+    session_state.activate(model)
+    start_args = starts[-1]['args']
+    session_schedules[session_id] = parse_schedule(start_args[0] if start_args else {})
+
+    positions = {}
+    for entry in session_entries:
+        if entry['op'] == 'record_touch':
+            run_id, device_id, touched_at = entry['args'][:3]
+            position = model.plan.device_positions.get(device_id)
+            if position is not None:
+                positions[run_id] = (device_id, position, datetime.fromisoformat(touched_at))
+
+    for run_id, run in model.runs.items():
+        if run['status'] == 'running':
+            run_info = new_run_info(run, datetime.fromisoformat(run['started_at']))
+            if run_id in positions:
+                run_info['last_device'], run_info['sequence_position'], run_info['last_touch_at'] = positions[run_id]
+            session_state.restore_run(run_id, run_info)
+
+    scheduler.resume(session_schedules[session_id])
+    return model
 
 
-def mark_skipped_segments(run_id: str, current_position: int, skipped_count: int):
-    """Mark segments as missed when athlete skips devices"""
-    run_info = active_session_state['active_runs'].get(run_id)
-    if not run_info:
-        return
-    
-    last_position = run_info.get('sequence_position', -1)
-    print(f"   📝 Marking {skipped_count} skipped segment(s) for {run_info['athlete_name']}:")
-    
-    # Mark each skipped segment
-    for pos in range(last_position + 1, current_position):
-        device_sequence = active_session_state['device_sequence']
-        from_device = device_sequence[pos - 1] if pos > 0 else '192.168.99.100'
-        to_device = device_sequence[pos]
-        
-        # Find and mark the segment
-        segments = db.get_run_segments(run_id)
-        for seg in segments:
-            if seg['from_device'] == from_device and seg['to_device'] == to_device:
-                db.mark_segment_missed(seg['segment_id'])
-                print(f"      ❌ {from_device} → {to_device} marked as missed")
-                break
 @app.route("/")
 @app.route("/teams")
 
@@ -251,7 +1496,17 @@ def create_session():
         course_id = data['course_id']
         athlete_queue = data['athlete_queue']  # List of athlete_ids in order
         audio_voice = data.get('audio_voice', 'male')
+        schedule = parse_schedule(data)
         
+        # Deploy course to devices via API while the session is written
+        plan = get_course_plan(course_id)
+        deployment = None
+        if plan:
+            log.info("📤 Deploying course via API: %s", plan.course_name)
+            deployment = control.deploy_and_activate_async(plan.course_name)
+        else:
+            log.error("❌ Course %s not found in database!", course_id)
+
         # Create session
         session_id = db.create_session(
             team_id=team_id,
@@ -259,36 +1514,12 @@ def create_session():
             athlete_queue=athlete_queue,
             audio_voice=audio_voice
         )
+        session_schedules[session_id] = schedule
         
-        # Store in global state
-        active_session_state['session_id'] = session_id
-
-        # Deploy course to devices via API (but don't activate yet)
-        course = db.get_course(int(course_id))
-        if course:
-            print(f"📤 Deploying course via API: {course['course_name']}")
-            import requests
-            try:
-                response = requests.post(
-                    'http://localhost:5000/api/course/deploy',
-                    json={'course_name': course['course_name']},
-                    timeout=5
-                )
-                print(f"   Deploy response: {response.status_code} - {response.json()}")
-
-                # Activate immediately after successful deploy
-                if response.status_code == 200:
-                    print(f"🟢 Activating course immediately...")
-                    activate_response = requests.post(
-                        'http://localhost:5000/api/course/activate',
-                        json={'course_name': course['course_name']},
-                        timeout=5
-                    )
-                    print(f"   Activate response: {activate_response.status_code} - {activate_response.json()}")
-            except Exception as e:
-                print(f"   ❌ Deploy failed: {e}")
-        else:
-            print(f"❌ Course not found in database!")
+        # GO waits on this acknowledgement instead of a fixed delay
+        if deployment:
+            course_activations[session_id] = deployment
+            deployment.add_done_callback(report_course_activation)
 
         return jsonify({
             'success': True,
@@ -299,6 +1530,41 @@ def create_session():
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
+# ==================== COURSE ACTIVATION ====================
+
+ACTIVATION_TIMEOUT = 10.0  # deploy + activate budgets
+course_activations = {}  # {session_id: Future of control.deploy_and_activate()}
+
+
+def report_course_activation(deployment):
+    """Log deploy/activate results (activation only follows a successful deploy)"""
+    try:
+        response, activate_response = deployment.result()
+        log.info("Deploy response: %s - %s", response.status_code, response.text)
+        if activate_response is not None:
+            log.info("🟢 Activate response: %s - %s", activate_response.status_code, activate_response.text)
+    except Exception as e:
+        log.error("❌ Deploy failed: %s", e)
+
+
+def wait_for_course_activation(session_id: str, plan: CoursePlan) -> bool:
+    """
+    Block until the field trainer has acknowledged activating the course.
+    Returns immediately if it already has; deploys and activates now if this
+    process never started it (e.g. restarted between setup and GO).
+    """
+    deployment = course_activations.pop(session_id, None)
+    try:
+        if deployment is None:
+            _, activate_response = control.deploy_and_activate(plan.course_name)
+        else:
+            _, activate_response = deployment.result(timeout=ACTIVATION_TIMEOUT)
+    except Exception as e:
+        log.warning("No activation acknowledgement for session %s: %s", session_id, e)
+        return False
+    return activate_response is not None and activate_response.status_code == 200
+
+
 # ==================== SESSION MONITORING ====================
 
 @app.route('/session/<session_id>/monitor')
@@ -322,112 +1588,219 @@ def session_monitor(session_id):
 @app.route('/api/session/<session_id>/status')
 def session_status(session_id):
     """API: Get current session status"""
-    session = db.get_session(session_id)
-    if not session:
-        return jsonify({'error': 'Session not found'}), 404
+    etag = session_etag(session_id)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
     
     # Get runs with segment details
-    runs_with_segments = []
-    for run in session['runs']:
-        segments = db.get_run_segments(run['run_id'])
-        run['segments'] = segments
-        runs_with_segments.append(run)
-    
-    session['runs'] = runs_with_segments
+    session = load_session_with_segments(session_id)
+    if not session:
+        return jsonify({'error': 'Session not found'}), 404
     
-    return jsonify({
+    response = jsonify({
         'session': session,
-        'active_run': active_session_state.get('current_run_id'),
-        'waiting_for_device': active_session_state.get('waiting_for_device')
+        'active_run': None,  # Kept for older monitor pages - live progress comes from the stream
+        'waiting_for_device': None
     })
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# ==================== LIVE SESSION STREAM ====================
+# Server-Sent Events pushed straight from the touch handler, so coach tablets
+# get compact deltas instead of polling the full session status. Each session
+# keeps a short replay buffer; a reconnecting EventSource sends Last-Event-ID
+# and receives everything it missed (or a 'resync' if it fell too far behind).
+# An open stream holds a server thread for as long as the tablet is connected,
+# so at most STREAM_CLIENTS are served at once and SERVER_THREADS leaves room
+# for ordinary requests on top; a stream over the limit gets a 503 and the
+# client goes back to polling session_status.
+
+class SessionEventStream:
+    """Per-session event fan-out with a replay buffer"""
+
+    REPLAY_SIZE = 500
+    SUBSCRIBER_QUEUE_SIZE = 1000
+
+    class Subscriber:
+        def __init__(self, maxsize: int):
+            self.queue = queue.Queue(maxsize=maxsize)
+            self.lagged = False
+            self.closed = False
+
+    def __init__(self, max_subscribers: int):
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._replay = {}  # {session_id: deque of (event_id, event, data)}
+        self._subscribers = {}  # {session_id: set of Subscriber}
+        self.max_subscribers = max_subscribers
+        self._open = 0  # Subscribers across all sessions
+
+    def publish(self, session_id: str, event: str, data: dict):
+        with self._lock:
+            event_id = f"{BOOT_ID}-{self._next_id}"
+            self._next_id += 1
+            item = (event_id, event, json.dumps(data, separators=(',', ':'), default=str))
+            self._replay.setdefault(session_id, deque(maxlen=self.REPLAY_SIZE)).append(item)
+
+            for subscriber in list(self._subscribers.get(session_id, ())):
+                try:
+                    subscriber.queue.put_nowait(item)
+                except queue.Full:
+                    # Slow client - cut it loose; its stream sends 'resync' and closes
+                    subscriber.lagged = True
+                    self._subscribers[session_id].discard(subscriber)
+
+    def subscribe(self, session_id: str, last_event_id: Optional[str] = None):
+        """
+        Returns (subscriber, backlog, in_sync), or None if max_subscribers are
+        already open. in_sync is False if the replay can't cover the gap.
+        """
+        subscriber = self.Subscriber(self.SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if self._open >= self.max_subscribers:
+                return None
+            self._open += 1
+            self._subscribers.setdefault(session_id, set()).add(subscriber)
+            if not last_event_id:
+                return subscriber, [], True
+
+            replay = list(self._replay.get(session_id, ()))
+            for index, item in enumerate(replay):
+                if item[0] == last_event_id:
+                    return subscriber, replay[index + 1:], True
+            return subscriber, [], False
+
+    def unsubscribe(self, session_id: str, subscriber):
+        with self._lock:
+            if subscriber.closed:
+                return
+            subscriber.closed = True
+            self._open -= 1
+            subscribers = self._subscribers.get(session_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[session_id]
+
+
+STREAM_CLIENTS = int(os.environ.get('COACH_STREAM_CLIENTS', '8'))  # Open streams at once, one server thread each
+STREAM_KEEPALIVE = 15  # seconds between SSE comments when idle
+session_events = SessionEventStream(STREAM_CLIENTS)
+
+
+def publish_session_event(session_id: str, event: str, **data):
+    """Push a delta to every coach device watching session_id"""
+    if session_id:
+        session_events.publish(session_id, event, data)
+
+
+def _format_sse(event_id: str, event: str, data: str) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+@app.route('/api/session/<session_id>/stream')
+def session_stream(session_id):
+    """API: Live session deltas as Server-Sent Events"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscribed = session_events.subscribe(session_id, last_event_id)
+    if subscribed is None:
+        # Every stream slot is taken - poll session_status instead of tying up a thread
+        response = jsonify({'success': False, 'error': 'Too many live streams, poll /status instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STREAM_KEEPALIVE)
+        return response
+    subscriber, backlog, in_sync = subscribed
+
+    def generate():
+        yield "retry: 2000\n\n"
+        if not in_sync:
+            yield "event: resync\ndata: {}\n\n"
+        for item in backlog:
+            yield _format_sse(*item)
+
+        while True:
+            if subscriber.lagged:
+                # Dropped for falling behind: what is still queued is stale, resync now
+                yield "event: resync\ndata: {}\n\n"
+                return
+            try:
+                item = subscriber.queue.get(timeout=STREAM_KEEPALIVE)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield _format_sse(*item)
+
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # The server closes the response however the stream ends - even one that
+    # never started - which a finally in generate() would miss
+    response.call_on_close(lambda: session_events.unsubscribe(session_id, subscriber))
+    return response
 
 
 @app.route('/session/<session_id>/start', methods=['POST'])
 def start_session(session_id):
     """GO button - start session and first athlete"""
-    import requests
-    print(f"\n{'='*80}")
-    print(f"🎬 START_SESSION CALLED - Session ID: {session_id}")
-    print(f"{'='*80}\n")
+    go_pressed_at = time.perf_counter()
+    log.info("🎬 Starting session %s", session_id)
     try:
-        # Mark session as active
-        print(f"Step 1: Marking session as active...")
-        db.start_session(session_id)
+        # Load the session into memory - touches are handled from here on
+        model = SessionModel.load(session_id)
+        if not model:
+            return jsonify({'success': False, 'error': 'Session not found'}), 404
         
-        # Get first queued run
-        first_run = db.get_next_queued_run(session_id)
-        if not first_run:
+        if not model.next_queued_run():
             return jsonify({'success': False, 'error': 'No athletes in queue'}), 400
         
-        # Start first run
-        start_time = datetime.utcnow()
-        db.start_run(first_run['run_id'], start_time)
-        
-        # Small delay to ensure segments are committed before touches arrive
-        import time
-        time.sleep(0.1)
-        
-        # Pre-create segments for this run
-        session = db.get_session(session_id)
-        db.create_segments_for_run(first_run['run_id'], session['course_id'])
-        
-        # Get course device sequence for multi-athlete tracking
-        course = db.get_course(session['course_id'])
-        device_sequence = [action['device_id'] for action in course['actions'] if action['device_id'] != '192.168.99.100']
+        # Concurrency limit and wave starts - set at session creation, adjustable at GO
+        try:
+            schedule = parse_schedule(request.get_json(silent=True) or {}, session_schedules.get(session_id))
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        session_schedules[session_id] = schedule
         
-        # Count total athletes
-        all_runs = db.get_session_runs(session_id)
-        total_athletes = len(all_runs)
+        # Mark session as active and start first run (segments are created behind it).
+        # Held together so a double-tapped GO cannot start the session twice.
+        start_time = datetime.utcnow()
+        with session_state.lock:
+            if not session_state.activate(model):
+                return jsonify({'success': False, 'error': 'Session already started'}), 409
+            model.start_session(schedule)
+            first_wave = scheduler.claim_first_wave(schedule, start_time)
+        first_run = first_wave[0]
         
-        # Initialize multi-athlete state
-        active_session_state['session_id'] = session_id
-        active_session_state['device_sequence'] = device_sequence
-        active_session_state['total_queued'] = total_athletes
-        active_session_state['active_runs'] = {
-            first_run['run_id']: {
-                'athlete_name': first_run['athlete_name'],
-                'athlete_id': first_run['athlete_id'],
-                'started_at': start_time.isoformat(),
-                'last_device': None,
-                'sequence_position': -1  # Haven't touched any device yet
-            }
-        }
+        for run in first_wave:
+            publish_session_event(session_id, 'run_started',
+                                  run_id=run['run_id'],
+                                  athlete_name=run['athlete_name'],
+                                  queue_position=run.get('queue_position'),
+                                  started_at=start_time.isoformat())
+            trace(session_id, 'run_started', run_id=run['run_id'], cause='go', started_at=start_time.isoformat())
         
-        print(f"✅ Multi-athlete state initialized:")
-        print(f"   Active athletes: 1/{total_athletes}")
-        print(f"   Device sequence: {device_sequence}")
-        print(f"   First athlete: {first_run['athlete_name']}")
-
-        # Set audio voice
-        audio_voice = session.get('audio_voice', 'male')
-        # TODO: Send audio voice setting to devices
-
-        # Get course for audio playback
-        session = db.get_session(session_id)
-        course = db.get_course(session['course_id'])    
-    
-        # Course already activated during session creation
-        print(f"\nStep 5: Course already active, proceeding with audio...")
+        log.info("First athlete(s): %s (%d/%d), device sequence %s",
+                 ', '.join(run['athlete_name'] for run in first_wave), len(first_wave),
+                 len(model.runs), model.plan.device_sequence)
 
-        # Wait for activation to propagate
-        import time
-        time.sleep(0.5)
+        # TODO: Send the audio voice setting (model.audio_voice) to devices
+
+        # Course was deployed and activated during session creation - wait for the acknowledgement
+        if not wait_for_course_activation(session_id, model.plan):
+            log.warning("⚠️  Course activation not confirmed, playing start audio anyway")
 
         # Play first audio on Device 0 via API
-        first_action = course['actions'][0]
-        print(f"🔊 Playing Device 0 audio via API: {first_action['audio_file']}")
         try:
-            audio_response = requests.post(
-                'http://localhost:5000/api/audio/play',
-                json={
-                    'node_id': '192.168.99.100',
-                    'clip': first_action['audio_file'].replace('.mp3', '')
-                },
-                timeout=2
-            )
-            print(f"   Audio response: {audio_response.status_code}")
+            audio_response = control.play_audio(DEVICE_0, model.plan.start_clip)
+            log.debug("Start audio %s: %s", model.plan.start_audio_file, audio_response.status_code)
         except Exception as e:
-            print(f"   ❌ Audio command failed: {e}")
+            log.error("❌ Start audio failed: %s", e)
+        record_latency('go_to_audio_ms', go_pressed_at)
         
         return jsonify({
             'success': True,
@@ -439,21 +1812,42 @@ def start_session(session_id):
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
+@app.route('/api/session/<session_id>/schedule', methods=['GET', 'POST'])
+def session_schedule(session_id):
+    """API: Concurrency limit and wave settings; POST changes them, live if the session is running"""
+    running = session_state.session_id == session_id
+    if request.method == 'POST':
+        try:
+            schedule = parse_schedule(request.get_json(silent=True) or {},
+                                      session_schedules.get(session_id))
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        session_schedules[session_id] = schedule
+        if running:
+            scheduler.configure(schedule)
+    if running:
+        return jsonify({'success': True, 'running': True, **scheduler.status()})
+    return jsonify({'success': True, 'running': False, **session_schedules.get(session_id, DEFAULT_SCHEDULE)})
+
+
 @app.route('/session/<session_id>/stop', methods=['POST'])
 def stop_session(session_id):
     """Stop session (mark incomplete)"""
     try:
         reason = request.get_json().get('reason', 'Stopped by coach')
-        db.mark_session_incomplete(session_id, reason)
+        seq = session_state.stop(session_id, reason)
+        if seq is not None:
+            # The coach goes straight to the results page - let the stop reach the database first
+            journal.wait_applied(seq, timeout=2.0)
+        else:
+            db.mark_session_incomplete(session_id, reason)
+            bump_session_version(session_id)
+        publish_session_event(session_id, 'session_stopped', reason=reason)
+        set_session_trace(session_id, False)
         
         # Deactivate course
         REGISTRY.deactivate_course()
         
-        # Clear global state
-        active_session_state['session_id'] = None
-        active_session_state['current_run_id'] = None
-        active_session_state['waiting_for_device'] = None
-        
         REGISTRY.log(f"Session stopped: {reason}")
         
         return jsonify({'success': True})
@@ -465,9 +1859,20 @@ def stop_session(session_id):
 def mark_athlete_absent(session_id, run_id):
     """Mark athlete as absent (remove from queue but note absence)"""
     try:
-        db.update_run_status(run_id, 'absent')
+        marked = session_state.mark_absent(session_id, run_id)
+        if marked is None:
+            db.update_run_status(run_id, 'absent')
+            bump_session_version(session_id)
+            run, session_complete = db.get_run(run_id), False
+        else:
+            run, session_complete = marked
+        publish_session_event(session_id, 'run_absent', run_id=run_id)
+        if session_complete:
+            publish_session_event(session_id, 'session_complete')
+            side_effects.submit(celebrate_session_complete)
+        elif marked is not None:
+            scheduler.slot_freed()
         
-        run = db.get_run(run_id)
         REGISTRY.log(f"Athlete marked absent: {run.get('athlete_name', 'Unknown')}")
         
         return jsonify({'success': True})
@@ -477,38 +1882,162 @@ def mark_athlete_absent(session_id, run_id):
 
 # ==================== SESSION HISTORY ====================
 
-@app.route('/sessions')
-def sessions():
-    """Session history list"""
-    # Get recent sessions
+# History pages read a per-session summary row written once when the session
+# finishes, and page through sessions newest first by (created_at, session_id)
+# keyset - every page is an index range scan, however long the history.
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+HISTORY_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS session_summaries (
+        session_id TEXT PRIMARY KEY,
+        athlete_count INTEGER,
+        completed_count INTEGER,
+        best_time REAL,
+        median_time REAL,
+        alert_count INTEGER,
+        computed_at TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions(created_at, session_id)',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_team_created ON sessions(team_id, created_at, session_id)',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_course_created ON sessions(course_id, created_at, session_id)',
+    'CREATE INDEX IF NOT EXISTS idx_runs_session ON runs(session_id, status, total_time)',
+    'CREATE INDEX IF NOT EXISTS idx_segments_run ON segments(run_id)'
+]
+
+
+def migrate_history_schema():
+    """Add the summary table and history indexes; summarize finished sessions that predate it"""
     with db.get_connection() as conn:
-        rows = conn.execute('''
-            SELECT s.*, t.name as team_name, c.course_name
+        for statement in HISTORY_SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        missing = [row[0] for row in conn.execute('''
+            SELECT s.session_id FROM sessions s
+            LEFT JOIN session_summaries sm ON sm.session_id = s.session_id
+            WHERE sm.session_id IS NULL AND s.status IN ('completed', 'incomplete')
+        ''')]
+    if missing:
+        def backfill():
+            for session_id in missing:
+                store_session_summary(session_id)
+            log.info("Summarized %d sessions for history", len(missing))
+        threading.Thread(target=backfill, name='coach-summary-backfill', daemon=True).start()
+
+
+def store_session_summary(session_id: str):
+    """Compute a finished session's history summary once and store it"""
+    with db.get_connection() as conn:
+        runs = conn.execute(
+            'SELECT status, total_time FROM runs WHERE session_id = ?', (session_id,)
+        ).fetchall()
+        alert_count = conn.execute('''
+            SELECT COUNT(*) FROM segments seg
+            JOIN runs r ON seg.run_id = r.run_id
+            WHERE r.session_id = ? AND seg.alert_type IS NOT NULL
+        ''', (session_id,)).fetchone()[0]
+
+        times = sorted(run['total_time'] for run in runs if run['status'] == 'completed' and run['total_time'] is not None)
+        median_time = None
+        if times:
+            middle = len(times) // 2
+            median_time = times[middle] if len(times) % 2 else (times[middle - 1] + times[middle]) / 2
+
+        conn.execute('''
+            INSERT OR REPLACE INTO session_summaries
+                (session_id, athlete_count, completed_count, best_time, median_time, alert_count, computed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (session_id, len(runs), len(times), times[0] if times else None, median_time,
+              alert_count, datetime.utcnow().isoformat()))
+        conn.commit()
+
+
+def query_session_history(team_id=None, course_id=None, date_from=None, date_to=None,
+                          cursor: str = None, limit: int = HISTORY_PAGE_SIZE):
+    """One page of session history, newest first. Returns (sessions, next_cursor)."""
+    clauses, params = [], []
+    if team_id:
+        clauses.append('s.team_id = ?')
+        params.append(team_id)
+    if course_id:
+        clauses.append('s.course_id = ?')
+        params.append(course_id)
+    if date_from:
+        clauses.append('s.created_at >= ?')
+        params.append(date_from)
+    if date_to:
+        clauses.append('s.created_at < date(?, \'+1 day\')')
+        params.append(date_to)
+    if cursor:
+        created_at, _, session_id = cursor.partition('|')
+        clauses.append('(s.created_at < ? OR (s.created_at = ? AND s.session_id < ?))')
+        params.extend([created_at, created_at, session_id])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    with db.get_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT s.*, t.name as team_name, c.course_name,
+                   sm.athlete_count, sm.completed_count, sm.best_time, sm.median_time, sm.alert_count
             FROM sessions s
             JOIN teams t ON s.team_id = t.team_id
             JOIN courses c ON s.course_id = c.course_id
-            ORDER BY s.created_at DESC
-            LIMIT 50
-        ''').fetchall()
-        sessions = [dict(row) for row in rows]
-    
-    return render_template('session_history.html', sessions=sessions)
+            LEFT JOIN session_summaries sm ON sm.session_id = s.session_id
+            {where}
+            ORDER BY s.created_at DESC, s.session_id DESC
+            LIMIT ?
+        ''', params + [limit + 1]).fetchall()
+    sessions = [dict(row) for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = sessions[-1]
+        next_cursor = f"{last['created_at']}|{last['session_id']}"
+    return sessions, next_cursor
+
+
+def _history_args() -> dict:
+    return {
+        'team_id': request.args.get('team_id') or None,
+        'course_id': request.args.get('course_id', type=int),
+        'date_from': request.args.get('from') or None,
+        'date_to': request.args.get('to') or None,
+        'cursor': request.args.get('cursor') or None,
+        'limit': max(1, min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), HISTORY_MAX_PAGE_SIZE))
+    }
+
+
+migrate_history_schema()
+mark_startup('history schema')
+
+
+@app.route('/sessions')
+def sessions():
+    """Session history list - ?team_id=&course_id=&from=&to=&cursor="""
+    filters = _history_args()
+    sessions, next_cursor = query_session_history(**filters)
+    return render_template('session_history.html', sessions=sessions,
+                           next_cursor=next_cursor, filters=filters)
+
+
+@app.route('/api/sessions')
+def sessions_api():
+    """API: Session history page as JSON, same filters as /sessions"""
+    sessions, next_cursor = query_session_history(**_history_args())
+    return jsonify({'sessions': sessions, 'next_cursor': next_cursor})
 
 
 @app.route('/session/<session_id>/results')
 def session_results(session_id):
     """View completed session results"""
-    session = db.get_session(session_id)
+    # Get all runs with segments
+    session = load_session_with_segments(session_id)
     if not session:
         return "Session not found", 404
     
     course = db.get_course(session['course_id'])
     team = db.get_team(session['team_id'])
-    
-    # Get all runs with segments
     runs = session['runs']
-    for run in runs:
-        run['segments'] = db.get_run_segments(run['run_id'])
     
     return render_template(
         'session_results.html',
@@ -519,344 +2048,971 @@ def session_results(session_id):
     )
 
 
+# ==================== EXPORT ====================
+# Exports are generators: rows are produced one session at a time and sent
+# as they are formatted (chunked transfer), so a season-long pull never sits
+# in memory and never holds a worker thread until the whole file is built.
+
+RUN_COLUMNS = ['athlete_name', 'jersey_number', 'queue_position', 'status',
+               'total_time', 'started_at', 'completed_at']
+SEGMENT_COLUMNS = RUN_COLUMNS[:3] + ['sequence', 'from_device', 'to_device', 'actual_time',
+                                     'expected_min_time', 'expected_max_time', 'touch_detected',
+                                     'touch_timestamp', 'alert_type']
+SESSION_COLUMNS = ['session_id', 'session_date', 'team_name', 'course_name']  # Bulk exports only
+
+EXPORT_CHUNK_ROWS = 256  # Rows per chunk written to the response (and per columns block)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'columns': ('application/x-ndjson', 'columns.jsonl')
+}
+
+
+def iter_session_rows(session_id: str, level: str, session_fields: dict = None):
+    """Export rows (dicts) for one session - one per run, or one per segment"""
+    session = load_session_with_segments(session_id) if level == 'segments' else db.get_session(session_id)
+    if not session:
+        return
+    for run in session['runs']:
+        row = dict(session_fields or {})
+        for column in RUN_COLUMNS:
+            row[column] = run.get(column)
+        if level != 'segments':
+            yield row
+            continue
+        for segment in run.get('segments', []):
+            segment_row = dict(row)
+            for column in SEGMENT_COLUMNS[3:]:
+                segment_row[column] = segment.get(column)
+            yield segment_row
+
+
+def iter_export_sessions(team_id=None, date_from: str = None, date_to: str = None):
+    """(session_id, session fields) for the sessions matching a bulk export, oldest first"""
+    clauses, params = [], []
+    if team_id:
+        clauses.append('s.team_id = ?')
+        params.append(team_id)
+    if date_from:
+        clauses.append('s.created_at >= ?')
+        params.append(date_from)
+    if date_to:
+        clauses.append('s.created_at < date(?, \'+1 day\')')
+        params.append(date_to)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    # Only the ids and labels are read up front; each session's runs are loaded as it is written
+    with db.get_connection() as conn:
+        sessions = conn.execute(f'''
+            SELECT s.session_id, s.created_at, t.name as team_name, c.course_name
+            FROM sessions s
+            JOIN teams t ON s.team_id = t.team_id
+            JOIN courses c ON s.course_id = c.course_id
+            {where}
+            ORDER BY s.created_at
+        ''', params).fetchall()
+    for row in sessions:
+        yield row['session_id'], {
+            'session_id': row['session_id'],
+            'session_date': row['created_at'],
+            'team_name': row['team_name'],
+            'course_name': row['course_name']
+        }
+
+
+def _chunked(rows, size: int = EXPORT_CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def format_export(rows, columns: list, fmt: str):
+    """Encode export rows as CSV, JSONL, or JSON column blocks, a chunk at a time"""
+    if fmt == 'csv':
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([column.replace('_', ' ').title() for column in columns])
+        for chunk in _chunked(rows):
+            writer.writerows([['' if row.get(c) is None else row[c] for c in columns] for row in chunk])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    elif fmt == 'jsonl':
+        for chunk in _chunked(rows):
+            yield ''.join(json.dumps({c: row.get(c) for c in columns}, separators=(',', ':')) + '\n' for row in chunk)
+    else:
+        # First line names the columns; each following line holds up to EXPORT_CHUNK_ROWS rows as one array per column
+        yield json.dumps({'columns': columns}) + '\n'
+        for chunk in _chunked(rows):
+            yield json.dumps([[row.get(c) for row in chunk] for c in columns], separators=(',', ':')) + '\n'
+
+
+def export_response(rows, columns: list, fmt: str, filename: str):
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    return Response(
+        format_export(rows, columns, fmt),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}.{extension}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+def _export_options():
+    """(format, level) from the query string, or an error response"""
+    fmt = request.args.get('format', 'csv')
+    level = request.args.get('level', 'runs')
+    if fmt not in EXPORT_FORMATS or level not in ('runs', 'segments'):
+        return None, None
+    return fmt, level
+
+
 @app.route('/session/<session_id>/export')
 def export_session(session_id):
-    """Export session results as CSV"""
-    import csv
-    from io import StringIO
-    
-    session = db.get_session(session_id)
-    if not session:
+    """Export session results - ?format=csv|jsonl|columns&level=runs|segments"""
+    fmt, level = _export_options()
+    if fmt is None:
+        return "Unknown export format or level", 400
+    if not db.get_session(session_id):
         return "Session not found", 404
     
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
-        'Athlete Name', 'Jersey Number', 'Queue Position',
-        'Status', 'Total Time', 'Started At', 'Completed At'
-    ])
-    
-    # Rows
-    for run in session['runs']:
-        writer.writerow([
-            run['athlete_name'],
-            run.get('jersey_number', ''),
-            run['queue_position'],
-            run['status'],
-            run.get('total_time', ''),
-            run.get('started_at', ''),
-            run.get('completed_at', '')
-        ])
+    columns = SEGMENT_COLUMNS if level == 'segments' else RUN_COLUMNS
+    suffix = '_segments' if level == 'segments' else ''
+    return export_response(iter_session_rows(session_id, level), columns, fmt,
+                           f'session_{session_id[:8]}{suffix}')
+
+
+@app.route('/export')
+def export_sessions():
+    """
+    Bulk export many sessions in one file -
+    ?team_id=&from=YYYY-MM-DD&to=YYYY-MM-DD&format=csv|jsonl|columns&level=runs|segments
+    """
+    fmt, level = _export_options()
+    if fmt is None:
+        return "Unknown export format or level", 400
+    team_id = request.args.get('team_id')
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
     
-    output.seek(0)
+    def rows():
+        for session_id, session_fields in iter_export_sessions(team_id, date_from, date_to):
+            yield from iter_session_rows(session_id, level, session_fields)
     
-    from flask import Response
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename=session_{session_id[:8]}.csv'}
-    )
+    columns = SESSION_COLUMNS + (SEGMENT_COLUMNS if level == 'segments' else RUN_COLUMNS)
+    filename = '_'.join(['sessions', team_id or 'all', date_from or 'start', date_to or 'now', level])
+    return export_response(rows(), columns, fmt, filename)
+
+
+# ==================== ANALYTICS ====================
+# Per-athlete and per-team performance across sessions. History is read once
+# (one query for runs, one for segment splits) into per-athlete, per-course
+# series; after that each completed run is folded in as the journal writes
+# it, so a request never rescans the run tables. Stats are computed with
+# numpy over the series and cached until the series changes. Times are only
+# compared within a course.
+
+ROLLING_WINDOW = 5  # Runs in the rolling average
+TREND_WINDOW = 10  # Most recent runs in the improvement trend
+SPLIT_PERCENTILES = (10, 50, 90)
+
+
+def _numpy():
+    """numpy is only needed for analytics - import it on first use"""
+    import numpy
+    return numpy
+
+
+def _round(value, places: int = 3):
+    return None if value is None else round(float(value), places)
+
+
+class PerformanceAnalytics:
+    """Incrementally maintained run and split history - see the section comment"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        self.runs = {}  # {(athlete_id, course_id): [(completed_at, total_time)]} oldest first
+        self.splits = {}  # {(athlete_id, course_id): {(from_device, to_device): [actual_time]}}
+        self.athletes = {}  # {athlete_id: {'athlete_name', 'team_id'}}
+        self.team_athletes = {}  # {team_id: set of athlete_ids}
+        self.course_names = {}  # {course_id: course_name}
+        self.versions = {}  # {('athlete', id) or ('team', id): int} - ETags for the endpoints
+        self._cache = {}  # {('athlete', id) or ('team', id): computed summary}
+        self._counted = set()  # run_ids already folded in
+
+    # ---- loading ----
+
+    RUNS_QUERY = '''
+        SELECT r.run_id, r.athlete_id, r.total_time, r.completed_at,
+               a.name as athlete_name, s.team_id, s.course_id, c.course_name
+        FROM runs r
+        JOIN sessions s ON r.session_id = s.session_id
+        JOIN athletes a ON r.athlete_id = a.athlete_id
+        JOIN courses c ON s.course_id = c.course_id
+        WHERE r.status = 'completed' AND r.total_time IS NOT NULL {run_filter}
+        ORDER BY r.completed_at
+    '''
+    SPLITS_QUERY = '''
+        SELECT seg.run_id, seg.from_device, seg.to_device, seg.actual_time
+        FROM segments seg
+        JOIN runs r ON seg.run_id = r.run_id
+        WHERE r.status = 'completed' AND seg.actual_time IS NOT NULL {run_filter}
+        ORDER BY seg.rowid
+    '''
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            started = time.perf_counter()
+            self._reset()
+            folded = self._fold_in('', ())
+            self._loaded = True
+            log.info("📈 Analytics loaded %d runs in %.0f ms", len(folded), (time.perf_counter() - started) * 1000)
+
+    def _fold_in(self, run_filter: str, params: tuple) -> dict:
+        """Add the completed runs matching run_filter (and their splits) to the series; returns {run_id: key}"""
+        with db.get_connection() as conn:
+            runs = conn.execute(self.RUNS_QUERY.format(run_filter=run_filter), params).fetchall()
+            splits = conn.execute(self.SPLITS_QUERY.format(run_filter=run_filter), params).fetchall()
+
+        keys = {}
+        for run in runs:
+            if run['run_id'] in self._counted:
+                continue
+            self._counted.add(run['run_id'])
+            key = (run['athlete_id'], run['course_id'])
+            keys[run['run_id']] = key
+            self.runs.setdefault(key, []).append((run['completed_at'], run['total_time']))
+            self.athletes[run['athlete_id']] = {'athlete_name': run['athlete_name'], 'team_id': run['team_id']}
+            self.team_athletes.setdefault(run['team_id'], set()).add(run['athlete_id'])
+            self.course_names[run['course_id']] = run['course_name']
+            self._invalidate(run['athlete_id'], run['team_id'])
+        for split in splits:
+            key = keys.get(split['run_id'])
+            if key is not None:
+                segments = self.splits.setdefault(key, {})
+                segments.setdefault((split['from_device'], split['to_device']), []).append(split['actual_time'])
+        return keys
+
+    def _invalidate(self, athlete_id: str, team_id: str):
+        for key in (('athlete', athlete_id), ('team', team_id)):
+            self._cache.pop(key, None)
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+    def record_run(self, run_id: str):
+        """A run was completed in the database (journal writer thread)"""
+        with self._lock:
+            # Checked under the lock: a load in progress holds it, and whether
+            # or not its query saw this run, _counted keeps it from doubling
+            if not self._loaded:
+                return  # The first load will read it
+            self._fold_in('AND r.run_id = ?', (run_id,))
+
+    def version(self, kind: str, key_id: str) -> int:
+        return self.versions.get((kind, key_id), 0)
+
+    # ---- summaries ----
+
+    def _course_stats(self, np, key) -> dict:
+        """Personal best, rolling average, trend and split percentiles for one athlete on one course"""
+        series = self.runs[key]
+        times = np.fromiter((t for _, t in series), dtype=float, count=len(series))
+        best = int(times.argmin())
+        window = min(ROLLING_WINDOW, len(times))
+        rolling = np.convolve(times, np.ones(window) / window, mode='valid')
+        recent = times[-TREND_WINDOW:]
+        trend = float(np.polyfit(np.arange(len(recent)), recent, 1)[0]) if len(recent) >= 3 else None
+
+        splits = []
+        for (from_device, to_device), values in self.splits.get(key, {}).items():
+            values = np.asarray(values, dtype=float)
+            percentiles = np.percentile(values, SPLIT_PERCENTILES)
+            splits.append({
+                'from_device': from_device,
+                'to_device': to_device,
+                'count': int(values.size),
+                'best': _round(values.min()),
+                **{f"p{p}": _round(v) for p, v in zip(SPLIT_PERCENTILES, percentiles)}
+            })
+
+        return {
+            'course_id': key[1],
+            'course_name': self.course_names.get(key[1]),
+            'runs': int(times.size),
+            'personal_best': _round(times[best]),
+            'personal_best_at': series[best][0],
+            'latest': _round(times[-1]),
+            'rolling_average': _round(rolling[-1]),
+            'rolling_averages': [_round(v) for v in rolling[-TREND_WINDOW:]],
+            'trend_per_run': _round(trend, 4),  # Seconds per run; negative = getting faster
+            'splits': splits
+        }
 
+    def athlete_summary(self, athlete_id: str) -> Optional[dict]:
+        self.ensure_loaded()
+        with self._lock:
+            cached = self._cache.get(('athlete', athlete_id))
+            if cached is not None:
+                return cached
+            athlete = self.athletes.get(athlete_id)
+            if athlete is None:
+                return None
+            np = _numpy()
+            summary = {
+                'athlete_id': athlete_id,
+                **athlete,
+                'courses': [self._course_stats(np, key) for key in self.runs if key[0] == athlete_id]
+            }
+            self._cache[('athlete', athlete_id)] = summary
+            return summary
+
+    def team_summary(self, team_id: str) -> Optional[dict]:
+        self.ensure_loaded()
+        with self._lock:
+            cached = self._cache.get(('team', team_id))
+            if cached is not None:
+                return cached
+            athlete_ids = self.team_athletes.get(team_id)
+            if not athlete_ids:
+                return None
+            np = _numpy()
+
+            courses = {}
+            for key in self.runs:
+                if key[0] in athlete_ids:
+                    courses.setdefault(key[1], []).append(key)
+
+            summaries = []
+            for course_id, keys in courses.items():
+                stats = [(key[0], self._course_stats(np, key)) for key in keys]
+                bests = np.array([s['personal_best'] for _, s in stats], dtype=float)
+                leaderboard = sorted(({
+                    'athlete_id': athlete_id,
+                    'athlete_name': self.athletes[athlete_id]['athlete_name'],
+                    'personal_best': s['personal_best'],
+                    'rolling_average': s['rolling_average'],
+                    'trend_per_run': s['trend_per_run'],
+                    'runs': s['runs']
+                } for athlete_id, s in stats), key=lambda row: row['personal_best'])
+
+                segment_times = {}
+                for key in keys:
+                    for segment, values in self.splits.get(key, {}).items():
+                        segment_times.setdefault(segment, []).extend(values)
+                splits = []
+                for (from_device, to_device), values in segment_times.items():
+                    percentiles = np.percentile(np.asarray(values, dtype=float), SPLIT_PERCENTILES)
+                    splits.append({
+                        'from_device': from_device,
+                        'to_device': to_device,
+                        'count': len(values),
+                        **{f"p{p}": _round(v) for p, v in zip(SPLIT_PERCENTILES, percentiles)}
+                    })
+
+                trends = [row for row in leaderboard if row['trend_per_run'] is not None]
+                summaries.append({
+                    'course_id': course_id,
+                    'course_name': self.course_names.get(course_id),
+                    'athletes': len(stats),
+                    'runs': sum(s['runs'] for _, s in stats),
+                    'team_best': leaderboard[0],
+                    'median_personal_best': _round(np.median(bests)),
+                    'most_improved': min(trends, key=lambda row: row['trend_per_run']) if trends else None,
+                    'leaderboard': leaderboard,
+                    'splits': splits
+                })
+
+            summary = {'team_id': team_id, 'courses': summaries}
+            self._cache[('team', team_id)] = summary
+            return summary
+
+
+analytics = PerformanceAnalytics()
+
+
+def _analytics_response(kind: str, key_id: str, build):
+    """Serve a cached summary with an ETag, so an unchanged tablet refresh is a 304"""
+    analytics.ensure_loaded()
+    etag = f"{BOOT_ID}-{kind}-{analytics.version(kind, key_id)}"
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        summary = build(key_id)
+        if summary is None:
+            return jsonify({'error': f'No completed runs for {kind} {key_id}'}), 404
+        response = jsonify(summary)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/analytics/athlete/<athlete_id>')
+def athlete_analytics(athlete_id):
+    """API: Personal bests, rolling averages, trends and split percentiles for an athlete"""
+    return _analytics_response('athlete', athlete_id, analytics.athlete_summary)
+
+
+@app.route('/api/analytics/team/<team_id>')
+def team_analytics(team_id):
+    """API: Leaderboards, team split percentiles and most improved athletes for a team"""
+    return _analytics_response('team', team_id, analytics.team_summary)
+
+
+# ==================== SEGMENT ALERTS ====================
+# DatabaseManager.check_segment_alerts() decides whether a segment raises an
+# alert, and it needs the touch in the database first. It runs on a single
+# alert worker, queued the moment the journal has written the touch, so the
+# touch path never waits on it and checks run in the order touches were
+# applied. Raised alerts are published to the monitor.
+
+alert_checks = ThreadPoolExecutor(max_workers=1, thread_name_prefix='coach-alerts')
+
+
+def after_alert_checks(fn, *args):
+    """Run fn on the alert worker once every check queued so far is done, its alert written"""
+    def run():
+        try:
+            fn(*args)
+        except Exception as e:
+            log.error("❌ %s%s failed: %s", fn.__name__, args, e)
+    alert_checks.submit(run)
+
+
+def queue_alert_check(model: 'SessionModel', run_id: str, from_device: str, to_device: str,
+                      split: Optional[float], persisted: Future):
+    """Check the touch's segment on the alert worker once the journal has written it"""
+    def written(future):
+        segment_id = future.result()
+        if segment_id:
+            alert_checks.submit(check_segment_alert, model, run_id, from_device, to_device, split, segment_id)
+    persisted.add_done_callback(written)
+
+
+def check_segment_alert(model: 'SessionModel', run_id: str, from_device: str, to_device: str,
+                        split: Optional[float], segment_id: int):
+    """Alert worker: check a written touch's segment and publish any alert"""
+    alert_raised, alert_type = db.check_segment_alerts(segment_id)
+    if not alert_raised:
+        return
+    bump_session_version(model.session_id)  # The segment row now carries the alert
+    run = model.runs[run_id]
+    REGISTRY.log(f"ALERT: Segment {segment_id} - {alert_type}", level="warning")
+    publish_session_event(model.session_id, 'alert',
+                          run_id=run_id,
+                          segment_id=segment_id,
+                          athlete_name=run['athlete_name'],
+                          from_device=from_device,
+                          to_device=to_device,
+                          split=round(split, 3) if split is not None else None,
+                          alert_type=alert_type)
+    trace(model.session_id, 'alert', run_id=run_id, segment_id=segment_id, split=split, alert_type=alert_type)
+    log.warning("⚠️  ALERT: %s on segment %s", alert_type, segment_id)
+
+
+# ==================== TOUCH PIPELINE ====================
+# REGISTRY calls handle_touch_event_from_registry from its own thread. All it
+# does is queue the touch; a single worker processes touches in arrival order
+# and slow side effects (audio, LEDs, deactivation) go to a separate executor.
+
+TOUCH_QUEUE_SIZE = 256
+LATENCY_SAMPLES = 1000
+
+touch_queue = queue.Queue(maxsize=TOUCH_QUEUE_SIZE)
+side_effects = ThreadPoolExecutor(max_workers=2, thread_name_prefix='coach-side-effects')
+
+_touch_worker_lock = threading.Lock()
+_touch_worker_thread = None
+
+_touch_metrics_lock = threading.Lock()
+touch_metrics = {
+    'received': 0,
+    'processed': 0,
+    'dropped': 0,
+    'errors': 0,
+    'max_queue_depth': 0,
+    'latency_ms': deque(maxlen=LATENCY_SAMPLES),  # enqueue -> processed
+    'wait_ms': deque(maxlen=LATENCY_SAMPLES),  # enqueue -> worker picked it up
+    'go_to_audio_ms': deque(maxlen=LATENCY_SAMPLES),  # GO pressed -> first start audio acknowledged
+    'handoff_to_audio_ms': deque(maxlen=LATENCY_SAMPLES)  # next athlete triggered -> start audio acknowledged
+}
+
+
+def record_latency(name: str, started_at: float):
+    """Add a perf_counter() interval to one of the touch_metrics latency series"""
+    with _touch_metrics_lock:
+        touch_metrics[name].append((time.perf_counter() - started_at) * 1000)
 
-# ==================== TOUCH EVENT HANDLER ====================
 
 def handle_touch_event_from_registry(device_id: str, timestamp: datetime):
     """
     Called by REGISTRY when a device touch is detected.
+    Queues the touch for the worker and returns immediately.
+    """
+    ensure_touch_worker()
+    try:
+        touch_queue.put_nowait((device_id, timestamp, time.perf_counter()))
+    except queue.Full:
+        with _touch_metrics_lock:
+            touch_metrics['dropped'] += 1
+        REGISTRY.log(f"Touch queue full - dropped touch on {device_id}", level="error")
+        return
+
+    depth = touch_queue.qsize()
+    with _touch_metrics_lock:
+        touch_metrics['received'] += 1
+        if depth > touch_metrics['max_queue_depth']:
+            touch_metrics['max_queue_depth'] = depth
+
+
+def ensure_touch_worker():
+    """Start the touch worker thread once"""
+    global _touch_worker_thread
+    if _touch_worker_thread is not None:
+        return
+    with _touch_worker_lock:
+        if _touch_worker_thread is None:
+            _touch_worker_thread = threading.Thread(target=touch_worker, name='coach-touch-worker', daemon=True)
+            _touch_worker_thread.start()
+
+
+def touch_worker():
+    """Process queued touches one at a time, in arrival order"""
+    while True:
+        device_id, timestamp, enqueued_at = touch_queue.get()
+        picked_up_at = time.perf_counter()
+        failed = False
+        try:
+            process_touch(device_id, timestamp)
+        except Exception as e:
+            failed = True
+            log.exception("❌ Touch processing failed for %s: %s", device_id, e)
+        finally:
+            done_at = time.perf_counter()
+            with _touch_metrics_lock:
+                touch_metrics['processed'] += 1
+                if failed:
+                    touch_metrics['errors'] += 1
+                touch_metrics['wait_ms'].append((picked_up_at - enqueued_at) * 1000)
+                touch_metrics['latency_ms'].append((done_at - enqueued_at) * 1000)
+            touch_queue.task_done()
+
+
+def _percentiles(samples) -> dict:
+    """p50/p95/p99/max of a list of millisecond samples"""
+    if not samples:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        'p50': round(ordered[int(last * 0.50)], 3),
+        'p95': round(ordered[int(last * 0.95)], 3),
+        'p99': round(ordered[int(last * 0.99)], 3),
+        'max': round(ordered[last], 3)
+    }
+
+
+@app.route('/api/touch/metrics')
+def touch_pipeline_metrics():
+    """API: Touch queue depth and per-touch latency"""
+    with _touch_metrics_lock:
+        counters = {k: v for k, v in touch_metrics.items() if not isinstance(v, deque)}
+        series = {k: list(v) for k, v in touch_metrics.items() if isinstance(v, deque)}
+
+    return jsonify({
+        'queue_depth': touch_queue.qsize(),
+        'queue_capacity': TOUCH_QUEUE_SIZE,
+        **counters,
+        **{name: _percentiles(samples) for name, samples in series.items()},
+        'samples': {name: len(samples) for name, samples in series.items()}
+    })
+
+
+@app.route('/api/session/<session_id>/trace', methods=['POST'])
+def session_trace(session_id):
+    """Switch the JSONL touch trace for a session on or off"""
+    enabled = bool((request.get_json(silent=True) or {}).get('enabled', True))
+    set_session_trace(session_id, enabled)
+    return jsonify({
+        'success': True,
+        'enabled': enabled,
+        'path': os.path.join(TRACE_DIR, f"{session_id}.jsonl")
+    })
+
+
+# ==================== SIDE EFFECTS ====================
+# Fire-and-forget calls to the field trainer API. These run on the
+# side_effects executor so they never hold up the touch worker.
+
+def play_start_audio(clip: str, triggered_at: float):
+    """Play the course start clip on Device 0 for the next athlete"""
+    try:
+        audio_response = control.play_audio(DEVICE_0, clip)
+        log.debug("Start audio: %s", audio_response.status_code)
+    except Exception as e:
+        log.error("❌ Start audio failed: %s", e)
+    record_latency('handoff_to_audio_ms', triggered_at)
+
+
+def celebrate_session_complete():
+    """Deactivate the course and run the rainbow on Device 0 for 10 seconds"""
+    try:
+        control.deactivate()
+        log.info("Course deactivated - devices returning to standby")
+    except Exception as e:
+        log.warning("⚠️  Deactivate failed: %s", e)
+
+    # Rainbow celebration on Device 0
+    try:
+        control.set_led(DEVICE_0, 'rainbow')
+        log.debug("🌈 Rainbow celebration started on Device 0")
+    except Exception as e:
+        log.warning("⚠️  Rainbow failed: %s", e)
+        return
+
+    # Turn off rainbow after 10 seconds
+    def stop_rainbow():
+        try:
+            control.set_led(DEVICE_0, 'off')
+            log.debug("Rainbow celebration ended")
+        except:
+            pass
+
+    timer = threading.Timer(10, stop_rainbow)
+    timer.daemon = True
+    timer.start()
+
+
+def announce_runs_started(model: Optional['SessionModel'], started: list, cause: str, triggered_at: float = None):
+    """Tell the coach devices and the field about athletes the scheduler just sent off"""
+    if not started:
+        return
+    for run, start_time in started:
+        publish_session_event(model.session_id, 'run_started',
+                              run_id=run['run_id'],
+                              athlete_name=run['athlete_name'],
+                              queue_position=run.get('queue_position'),
+                              started_at=start_time.isoformat())
+        trace(model.session_id, 'run_started', run_id=run['run_id'], cause=cause, started_at=start_time.isoformat())
+        log.info("🏃 Next athlete started: %s (%s, active %d/%d)", run['athlete_name'], cause,
+                 len(session_state.active_runs), len(model.runs))
+        REGISTRY.log(f"Next athlete started: {run['athlete_name']}")
+
+    # One start clip on Device 0 per admission, however many athletes went
+    side_effects.submit(play_start_audio, model.plan.start_clip, triggered_at or time.perf_counter())
+
+
+# ==================== TOUCH EVENT HANDLER ====================
+
+def process_touch(device_id: str, timestamp: datetime):
+    """
+    Handle one touch from the queue.
     Supports multiple simultaneous athletes on course.
+    Works entirely against the in-memory session state; database writes are
+    journaled and applied behind it.
     """
-    session_id = active_session_state.get('session_id')
-    
-    if not session_id:
+    model = session_state.model
+    if model is None:
         REGISTRY.log(f"Touch on {device_id} but no active session", level="warning")
         return
+    session_id = model.session_id
     
-    print(f"\n{'='*80}")
-    print(f"👆 MULTI-ATHLETE TOUCH HANDLER")
-    print(f"   Device: {device_id}")
-    print(f"   Active athletes: {len(active_session_state.get('active_runs', {}))}")
-    print(f"{'='*80}")
-    
-    # Find which athlete should receive this touch
-    run_id = find_athlete_for_touch(device_id, timestamp)
+    persisted = Future()  # The touch's segment_id, once the journal has written it
+
+    def on_touch_persisted(segment_id):
+        persisted.set_result(segment_id)
+        if not segment_id:
+            REGISTRY.log(f"Touch on {device_id} but no matching segment", level="warning")
     
-    if not run_id:
+    # Find which athlete should receive this touch and move them on
+    attributed = session_state.attribute_touch(device_id, timestamp, on_applied=on_touch_persisted)
+    if attributed is None:
         REGISTRY.log(f"Touch on {device_id} - no valid athlete found", level="warning")
-        print(f"❌ Could not attribute touch to any athlete")
-        print(f"{'='*80}\n")
+        trace(session_id, 'unattributed', device_id=device_id, timestamp=timestamp.isoformat(),
+              active_runs=len(session_state.active_runs))
         return
     
-    # Record the touch
-    segment_id = db.record_touch(run_id, device_id, timestamp)
+    run_id, run_info, new_position, missed, split = attributed
+    from_device, _ = model.segment_for(new_position)
     
-    if not segment_id:
-        REGISTRY.log(f"Touch on {device_id} but no matching segment for run {run_id}", level="warning")
-        print(f"⚠️  No segment found for this touch")
-        print(f"{'='*80}\n")
-        return
+    queue_alert_check(model, run_id, from_device, device_id, split, persisted)
     
-    # Update athlete's progression
-    run_info = active_session_state['active_runs'][run_id]
-    device_sequence = active_session_state['device_sequence']
-    new_position = device_sequence.index(device_id)
+    if missed:
+        log.info("%s skipped %d device(s) - missed %s", run_info['athlete_name'], len(missed),
+                 ', '.join(f"{a}→{b}" for a, b in missed))
+        trace(session_id, 'segments_missed', run_id=run_id, segments=missed)
+        publish_session_event(session_id, 'segments_missed',
+                              run_id=run_id,
+                              segments=[list(pair) for pair in missed])
     
-    run_info['last_device'] = device_id
-    run_info['sequence_position'] = new_position
+    publish_session_event(session_id, 'touch',
+                          run_id=run_id,
+                          from_device=from_device,
+                          device_id=device_id,
+                          position=new_position,
+                          timestamp=timestamp.isoformat())
+    trace(session_id, 'touch', run_id=run_id, device_id=device_id, from_device=from_device,
+          position=new_position, timestamp=timestamp.isoformat(),
+          active_runs=len(session_state.active_runs))
     
-    print(f"✅ Touch recorded: {run_info['athlete_name']} → Device {device_id}")
-    print(f"   Segment ID: {segment_id}")
-    print(f"   Sequence position: {new_position + 1}/{len(device_sequence)}")
-    
-    # Check for alerts
-    alert_raised, alert_type = db.check_segment_alerts(segment_id)
-    if alert_raised:
-        REGISTRY.log(f"ALERT: Segment {segment_id} - {alert_type}", level="warning")
-        print(f"⚠️  ALERT: {alert_type}")
-    
-    # Get session and course info
-    session = db.get_session(session_id)
-    course = db.get_course(session['course_id'])
+    log.debug("✅ %s: %s → %s (position %d/%d)", run_info['athlete_name'], from_device, device_id,
+              new_position + 1, len(model.plan.device_sequence))
     
     # Find the action for this device
-    action = next((a for a in course['actions'] if a['device_id'] == device_id), None)
-    
-    if not action:
-        print(f"⚠️  No action found for device {device_id}")
-        print(f"{'='*80}\n")
+    plan = model.plan
+    if device_id not in plan.actions_by_device:
+        log.debug("No action found for device %s", device_id)
         return
     
-    # Check if this action triggers next athlete
-    if action.get('triggers_next_athlete'):
-        print(f"🔔 Device triggers next athlete")
-        next_run = db.get_next_queued_run(session_id)
-        if next_run:
-            # CRITICAL: Double-check status to prevent race conditions
-            current_status = db.get_run(next_run['run_id'])['status']
-            if current_status != 'queued':
-                print(f"ℹ️  {next_run['athlete_name']} already started (status: {current_status})")
-                return
-            
-            # Check if already started (in-memory check)
-            if next_run['run_id'] in active_session_state['active_runs']:
-                print(f"ℹ️  {next_run['athlete_name']} already in active_runs")
-                return
-    
-            # Check if we're at max capacity (5 active athletes)
-            elif len(active_session_state['active_runs']) >= 5:
-                print(f"⏸️  At max capacity (5 athletes) - next athlete will wait")
-
-            else:
-                # Start next athlete
-                start_time = datetime.utcnow()
-                
-                print(f"   🎬 Starting run for {next_run['athlete_name']}...")
-                try:
-                    db.start_run(next_run['run_id'], start_time)
-                    print(f"      ✅ Run started successfully")
-                except Exception as e:
-                    print(f"      ❌ start_run FAILED: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    print(f"{'='*80}\n")
-                    return
-                
-                # Add to active runs IMMEDIATELY to prevent duplicate triggers
-                active_session_state['active_runs'][next_run['run_id']] = {
-                    'athlete_name': next_run['athlete_name'],
-                    'athlete_id': next_run['athlete_id'],
-                    'started_at': start_time.isoformat(),
-                    'last_device': None,
-                    'sequence_position': -1
-                }
-                print(f"      ✅ Added to active_runs")
-                
-                # Create segments for next athlete
-                print(f"   📋 Creating segments for {next_run['athlete_name']}...")
-                print(f"      run_id: {next_run['run_id'][:8]}...")
-                print(f"      course_id: {session['course_id']}")
-                
-                try:
-                    db.create_segments_for_run(next_run['run_id'], session['course_id'])
-                    
-                    # Verify segments were created
-                    segments = db.get_run_segments(next_run['run_id'])
-                    print(f"      ✅ Created {len(segments)} segments")
-                    for seg in segments:
-                        print(f"         {seg['from_device']} → {seg['to_device']}")
-                    
-                    # Small delay to ensure segments are committed
-                    import time
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"      ❌ Segment creation failed: {e}")
-                    import traceback
-                    traceback.print_exc()
-                
-                print(f"🏃 Next athlete started: {next_run['athlete_name']}")
-                print(f"   Active: {len(active_session_state['active_runs'])}/{active_session_state['total_queued']}")
-
-                # Play audio on Device 0 for next athlete
-                first_action = course['actions'][0]
-                print(f"🔊 Playing Device 0 audio for next athlete via API")
-                try:
-                    import requests
-                    audio_response = requests.post(
-                        'http://localhost:5000/api/audio/play',
-                        json={
-                            'node_id': '192.168.99.100',
-                            'clip': first_action['audio_file'].replace('.mp3', '')
-                        },
-                        timeout=2
-                    )
-                    print(f"   Audio response: {audio_response.status_code}")
-                except Exception as e:
-                    print(f"   ❌ Audio failed: {e}")
-                
-                REGISTRY.log(f"Next athlete started: {next_run['athlete_name']}")
-        else:
-            print(f"ℹ️  No more athletes queued")
+    # Check if this action triggers next athlete - the scheduler starts them when a slot allows
+    if device_id in plan.triggers_next:
+        scheduler.trigger(device_id, time.perf_counter(), timestamp)
     
     # Check if this marks run complete
-    if action.get('marks_run_complete'):
-        print(f"🏁 Device marks run complete")
-        
-        # Complete this athlete's run
-        run = db.get_run(run_id)
-        start_time = datetime.fromisoformat(run['started_at'])
-        total_time = (timestamp - start_time).total_seconds()
-        
-        db.complete_run(run_id, timestamp, total_time)
-        
-        # Remove from active runs
-        completed_athlete = active_session_state['active_runs'].pop(run_id)
-        
-        print(f"✅ Run completed: {completed_athlete['athlete_name']} in {total_time:.2f}s")
-        print(f"   Remaining active: {len(active_session_state['active_runs'])}")
+    if device_id in plan.marks_complete:
+        completed = session_state.complete_run(run_id, timestamp)
+        if completed is None:
+            return
+        completed_athlete, total_time, session_complete = completed
         
-        REGISTRY.log(f"Run completed: {run.get('athlete_name')} in {total_time:.2f}s")
+        publish_session_event(session_id, 'run_completed',
+                              run_id=run_id,
+                              athlete_name=completed_athlete['athlete_name'],
+                              completed_at=timestamp.isoformat(),
+                              total_time=total_time)
+        trace(session_id, 'run_completed', run_id=run_id, total_time=total_time)
         
-        # Check if session is complete
-        next_run = db.get_next_queued_run(session_id)
-        no_queued = (next_run is None)
-        no_active = (len(active_session_state['active_runs']) == 0)
+        log.info("🏁 Run completed: %s in %.2fs (%d still active)", completed_athlete['athlete_name'],
+                 total_time, len(session_state.active_runs))
         
-        print(f"   Queued remaining: {not no_queued}")
-        print(f"   Active athletes: {len(active_session_state['active_runs'])}")
+        REGISTRY.log(f"Run completed: {completed_athlete['athlete_name']} in {total_time:.2f}s")
         
-        if no_queued and no_active:
-            print(f"🎉 SESSION COMPLETE - All athletes finished!")
-            
-            # Complete session
-            db.complete_session(session_id)
-            
-            # Deactivate course
-            import requests
-            try:
-                requests.post('http://localhost:5000/api/deactivate', timeout=2)
-                print(f"   ✅ Course deactivated - devices returning to standby")
-            except Exception as e:
-                print(f"   ⚠️  Deactivate failed: {e}")
-            
-            # Rainbow celebration on Device 0
-            try:
-                requests.post(
-                    'http://localhost:5000/api/device/192.168.99.100/led',
-                    json={'pattern': 'rainbow'},
-                    timeout=2
-                )
-                print(f"   🌈 Rainbow celebration started on Device 0")
-                
-                # Turn off rainbow after 10 seconds
-                import threading
-                def stop_rainbow():
-                    import time
-                    time.sleep(10)
-                    try:
-                        requests.post(
-                            'http://localhost:5000/api/device/192.168.99.100/led',
-                            json={'pattern': 'off'},
-                            timeout=2
-                        )
-                        print(f"   ✅ Rainbow celebration ended")
-                    except:
-                        pass
-                
-                threading.Thread(target=stop_rainbow, daemon=True).start()
-            except Exception as e:
-                print(f"   ⚠️  Rainbow failed: {e}")
+        if not session_complete:
+            scheduler.slot_freed(timestamp)
+        else:
+            log.info("🎉 SESSION COMPLETE - All athletes finished!")
+            publish_session_event(session_id, 'session_complete')
+            trace(session_id, 'session_complete')
+            set_session_trace(session_id, False)
             
-            # Clear state
-            active_session_state['session_id'] = None
-            active_session_state['active_runs'] = {}
-            active_session_state['device_sequence'] = []
-            active_session_state['total_queued'] = 0
+            # Deactivate course and celebrate, off the touch path
+            side_effects.submit(celebrate_session_complete)
             
             REGISTRY.log("🎉 Session completed - all athletes finished")
-    
-    print(f"{'='*80}\n")
 
 # Export handler for REGISTRY integration
 app.handle_touch_event = handle_touch_event_from_registry
 
 # ==================== REGISTRY INTEGRATION ====================
 
-def register_touch_handler():
+# The session model and journal live in memory, so touches must be handled
+# by exactly one process. The lock file catches a second worker or a second
+# importer of this module.
+HANDLER_LOCK_PATH = os.environ.get('COACH_HANDLER_LOCK', '/opt/data/coach_touch_handler.lock')
+
+_registration_lock = threading.Lock()
+_handler_lock_file = None  # held open for the life of the process once registered
+
+
+def _claim_touch_handler() -> bool:
+    """Take the cross-process touch handler lock; False if another process has it"""
+    global _handler_lock_file
+    lock_file = open(HANDLER_LOCK_PATH, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(f"{os.getpid()}\n")
+    lock_file.flush()
+    _handler_lock_file = lock_file
+    return True
+
+
+def register_touch_handler(self_test: bool = False):
     """
     Register our touch handler with REGISTRY
-    This allows REGISTRY to call us when device touches occur
+    This allows REGISTRY to call us when device touches occur.
+    Safe to call more than once - only the first call in the first process registers.
     """
+    with _registration_lock:
+        if _handler_lock_file is not None:
+            return True
+        try:
+            if not _claim_touch_handler():
+                log.warning("⚠️  Touch handler already registered by another process - "
+                            "this process will not see touches")
+                return False
+            
+            # Finish any journaled writes and pick up a session that was running
+            recovered = recover_session_state()
+            if recovered:
+                log.info("♻️  Recovered running session %s (%d athletes on course)",
+                         recovered.session_id, len(session_state.active_runs))
+            
+            # Set the touch handler
+            REGISTRY.set_touch_handler(handle_touch_event_from_registry)
+            ensure_touch_worker()
+            
+            # Verify registration
+            log.info("✅ Touch handler registered with REGISTRY")
+            log.debug("   Handler function: %s", handle_touch_event_from_registry)
+            
+            # Quick test to ensure it works
+            if self_test:
+                log.info("🧪 Testing handler with dummy call (should see warning about no active session)...")
+                handle_touch_event_from_registry("test_device", datetime.now())
+            
+            return True
+        except Exception as e:
+            log.exception("❌ Failed to register touch handler: %s", e)
+            return False
+
+
+# ==================== SERVING ====================
+
+# Every open live stream holds a thread (see LIVE SESSION STREAM), so the
+# default is the stream limit plus 8 for pages, polls and the API
+SERVER_THREADS = int(os.environ.get('COACH_SERVER_THREADS', str(STREAM_CLIENTS + 8)))
+if SERVER_THREADS <= STREAM_CLIENTS:
+    log.warning("COACH_SERVER_THREADS=%d leaves no thread for requests once %d live streams are open",
+                SERVER_THREADS, STREAM_CLIENTS)
+
+
+def log_ready(where: str):
+    """Log how long the process took to start serving, and where the time went"""
+    mark_startup('listening')
+    uptime = process_uptime()
+    log.info("✅ READY in %.2fs: %s (interpreter and compile %.0f ms, %s)", uptime, where,
+             (uptime - (time.perf_counter() - STARTUP_STARTED)) * 1000, startup_breakdown())
+
+
+def warm_up():
+    """
+    Once serving, load what the first GO, export and analytics request would
+    otherwise pay for: the requests library and its connection pool, numpy,
+    and the compiled templates.
+    """
+    started = time.perf_counter()
+    control._get_session()
     try:
-        # Set the touch handler
-        REGISTRY.set_touch_handler(handle_touch_event_from_registry)
-        
-        # Verify registration
-        print("✅ Touch handler registered with REGISTRY")
-        print(f"   Handler function: {handle_touch_event_from_registry}")
-#        print(f"   REGISTRY handler: {getattr(REGISTRY, '_touch_handler', 'NOT SET')}")
-        
-        # Quick test to ensure it works
-        test_timestamp = datetime.now()
-        print(f"🧪 Testing handler with dummy call (should see warning about no active session)...")
-        handle_touch_event_from_registry("test_device", test_timestamp)  
-
-      # Test the handler with a dummy call
- #       test_timestamp = datetime.now()
- #       print(f"🧪 Testing handler with dummy call...")
- #       handle_touch_event_from_registry("test_device", test_timestamp)
- #       print("✅ Handler test complete")
-        
-        return True
-    except Exception as e:
-        print(f"❌ Failed to register touch handler: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+        _numpy()
+    except ImportError:
+        pass  # Analytics reports the missing package when asked
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+        except Exception as e:
+            log.warning("Template %s does not compile: %s", name, e)
+    log.info("🔥 Warmed up in %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+def start_warm_up():
+    threading.Thread(target=warm_up, name='coach-warm-up', daemon=True).start()
+
+
+def claim_serving():
+    """
+    Register the touch handler before serving. The journal and the session
+    state live in one process, so a second one - another gunicorn worker, or
+    a second copy of the service - is refused rather than left to write the
+    same journal.
+    """
+    if not register_touch_handler():
+        if _handler_lock_file is None:
+            raise RuntimeError(f"Another process holds {HANDLER_LOCK_PATH}: the coach interface serves from "
+                               f"a single process (gunicorn -w 1)")
+        log.warning("⚠️  WARNING: Touch handler registration failed! Relay system will not work properly")
+    mark_startup('touch handler')
+
+
+def wsgi_app():
+    """
+    WSGI entry point for an external server. Use a single process with threads:
+        gunicorn -w 1 --threads 16 -b 0.0.0.0:5001 'coach_interface:wsgi_app()'
+    with --threads above COACH_STREAM_CLIENTS - each live stream holds one.
+    More workers are refused (see claim_serving).
+    """
+    claim_serving()
+    start_warm_up()
+    return app
+
+
+def serve(host: str = '0.0.0.0', port: int = 5001, dev: bool = False):
+    """
+    Serve the coach interface.
+    Production uses waitress (or Werkzeug's threaded server if waitress is not
+    installed) with debug off; dev keeps the debugger and reloader.
+    """
+    if dev:
+        # The reloader runs this module twice - register in the serving child only
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            register_touch_handler(self_test=True)
+        app.run(host=host, port=port, debug=True)
+        return
+
+    claim_serving()
+
+    try:
+        from waitress import create_server
+    except ImportError:
+        from werkzeug.serving import make_server
+        server = make_server(host, port, app, threaded=True)
+        log_ready(f"serving on http://{host}:{port} (werkzeug threaded)")
+        start_warm_up()
+        server.serve_forever()
+    else:
+        server = create_server(app, host=host, port=port, threads=SERVER_THREADS, ident='coach-interface')
+        log_ready(f"serving on http://{host}:{port} (waitress, {SERVER_THREADS} threads)")
+        start_warm_up()
+        server.run()
+
+
+mark_startup('module')
 
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Field Trainer Coach Interface')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--dev', action='store_true', help='Werkzeug dev server with debugger and reloader')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='report where start-up time goes (imports, database, recovery) and exit')
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        # Running under -X importtime (see profile_startup): everything up to serving, then stop
+        register_touch_handler()
+        mark_startup('touch handler')
+        print(f"⏱️  Start-up to ready-to-serve: {process_uptime():.2f}s - {startup_breakdown()}")
+        sys.exit(0)
+
     print("=" * 60)
     print("Field Trainer Coach Interface")
     print("=" * 60)
-    print("Starting on http://0.0.0.0:5001")
+    print(f"Starting on http://{args.host}:{args.port}")
     print("Use this interface for:")
     print("  - Team and athlete management")
     print("  - Session setup and monitoring")
     print("  - Viewing results and history")
     print("=" * 60)
     
-    # Register touch handler with REGISTRY
-    print("\n🔗 Registering touch handler with REGISTRY...")
-    if register_touch_handler():
-        print("=" * 60)
-        print("✅ READY: Touch events will trigger athlete relay")
-        print("=" * 60)
-    else:
-        print("=" * 60)
-        print("⚠️  WARNING: Touch handler registration failed!")
-        print("   Relay system will not work properly")
-        print("=" * 60)
-    print()  # blank line before Flask output
-    app.run(host='0.0.0.0', port=5001, debug=True)
-
+    serve(args.host, args.port, dev=args.dev)
@@ -36,6 +36,7 @@ echo -e "${YELLOW}[3] Replacing with working version...${NC}"
 sudo cp /mnt/usb/ft_usb_build/coach_interface_working.py /opt/coach_interface.py
 sudo chmod 755 /opt/coach_interface.py
 sudo chown pi:pi /opt/coach_interface.py
+sudo python3 -m py_compile /opt/coach_interface.py  # Bytecode now, not on the first start at the field
 echo -e "${GREEN}✓ File replaced${NC}"
 echo ""
 
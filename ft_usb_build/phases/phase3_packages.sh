@@ -350,6 +350,7 @@ PYTHON_PACKAGES=(
     "python3-venv"
     "python3-flask"
     "python3-pil"        # Pillow/PIL - REQUIRED for coach interface in Phase 6
+    "python3-numpy"      # Coach interface performance analytics
     "sqlite3"
     "python3-dev"
     "python3-smbus"
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Touch replay harness - Coach Interface
+Feeds a timeline of touches through handle_touch_event_from_registry() - the
+entry point the registry calls - during a real session (created and started
+through the web routes), then reports throughput, how many touches went to
+the right athlete, and per-touch latency. A repeatable regression benchmark
+for the touch engine.
+
+Synthetic timelines:
+
+    python3 replay_touches.py [--athletes 30] [--course-length 6] [--pace 3.0] [--pace-sd 0.3]
+                              [--skip-rate 0.02] [--double-rate 0] [--seed 1] [--save timeline.jsonl]
+
+Recorded timelines - a file written by --save, or a session's touch trace
+(POST /api/session/<id>/trace, files in COACH_TRACE_DIR):
+
+    python3 replay_touches.py --replay /opt/data/touch_traces/<session_id>.jsonl
+
+Touches are delivered as fast as the queue accepts them unless --speed is
+given (1 = real time, 10 = ten times faster). Timeline times count from GO,
+so splits and run times come out as the timeline has them. Runs against a temporary copy
+of the database (or an empty one) and a local stub of the field trainer API;
+the device's own data is never written. The course is synthetic - written
+into the temporary database, so runs get segments and splits are checked -
+unless --course-id picks one from the copied database.
+
+Expected accuracy. The timeline is fixed: it cannot react when the coach
+interface gets a touch wrong. At the defaults seeds 1-3 score 91-98% (seed
+1: 94.9%); the misses are athletes overtaking each other, which crediting
+the nearest athlete behind the cone cannot see. Compare runs on the same
+seed and rates - the numbers are a regression baseline, not a field
+estimate.
+
+Double touches are a stress case, off by default: there is no double-touch
+filter, so a double is credited to the athlete behind, who jumps a cone,
+their own touches go to the athlete behind them, and so on until the course
+empties. --double-rate 0.03 scores 13-81% over seeds 1-6, a swing of tens
+of points per double, too noisy to catch a regression with.
+"""
+
+import argparse
+import atexit
+import heapq
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+sys.path.insert(0, '/opt')
+
+STUB_PORT = 5053
+WORKDIR = tempfile.mkdtemp(prefix='coach_replay_')
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+
+os.environ.setdefault('FIELD_TRAINER_API', f'http://127.0.0.1:{STUB_PORT}')
+os.environ.setdefault('COACH_LOG_LEVEL', 'WARNING')
+os.environ['COACH_DB'] = os.path.join(WORKDIR, 'field_trainer.db')
+os.environ['COACH_JOURNAL'] = os.path.join(WORKDIR, 'coach_journal.jsonl')
+os.environ['COACH_TRACE_DIR'] = os.path.join(WORKDIR, 'traces')
+os.environ['COACH_HANDLER_LOCK'] = os.path.join(WORKDIR, 'touch_handler.lock')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/opt/data/field_trainer.db', help='database to copy (schema and courses)')
+    parser.add_argument('--replay', help='timeline file (--save output or a touch trace)')
+    parser.add_argument('--save', help='write the synthetic timeline here')
+    parser.add_argument('--athletes', type=int, default=30)
+    parser.add_argument('--course-length', type=int, default=6, help='cones after the start cone')
+    parser.add_argument('--course-id', type=int, help='use this course from the database instead')
+    parser.add_argument('--pace', type=float, default=3.0, help='mean seconds per segment')
+    parser.add_argument('--pace-sd', type=float, default=0.3, help='spread of athlete paces')
+    parser.add_argument('--jitter', type=float, default=0.1, help='per-segment variation, fraction of pace')
+    parser.add_argument('--skip-rate', type=float, default=0.02, help='chance a mid-course touch is missed')
+    parser.add_argument('--double-rate', type=float, default=0.0,
+                        help='chance a touch registers twice (a stress case - see above)')
+    parser.add_argument('--max-active', type=int, default=5)
+    parser.add_argument('--speed', type=float, default=0, help='time compression; 0 = as fast as possible')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+if os.path.exists(ARGS.db):
+    shutil.copy(ARGS.db, os.environ['COACH_DB'])
+
+try:
+    import coach_interface as ci  # Deployed as /opt/coach_interface.py
+except ImportError:
+    import coach_interface_working as ci  # Running from ft_usb_build/
+
+from bench_control_client import start_stub
+
+
+# ==================== TIMELINES ====================
+# A timeline is a header - {'course_length', 'athletes', 'triggers', 'complete'},
+# all positions in the touch sequence - and touches sorted by time:
+# {'t': seconds, 'position': int, 'athlete': queue index, or None for a double touch}
+
+def synthetic_plan(course_length: int, pace: float) -> 'ci.CoursePlan':
+    """
+    Start cone, then course_length cones; the first sends the next athlete, the
+    last finishes. Written into the temporary database like a course built in
+    the admin pages, so runs get their segments and splits are checked.
+    """
+    actions = [{'device_id': ci.DEVICE_0, 'audio_file': 'start.mp3'}]
+    for i in range(course_length):
+        actions.append({
+            'device_id': f"192.168.99.{101 + i}",
+            'audio_file': f"cone{i}.mp3",
+            'triggers_next_athlete': int(i == 0),
+            'marks_run_complete': int(i == course_length - 1),
+            'min_time': round(pace * 0.5, 1),
+            'max_time': round(pace * 2.0, 1),
+        })
+    with ci.db.get_connection() as conn:
+        course_id = insert_row(conn, 'courses', {'course_name': f"Replay {course_length} cones",
+                                                 'total_devices': len(actions)})
+        for sequence, action in enumerate(actions):
+            insert_row(conn, 'course_actions', dict(action, course_id=course_id, sequence=sequence,
+                                                    device_name=action['device_id'], action='touch'))
+    return ci.get_course_plan(course_id)
+
+
+def insert_row(conn, table: str, values: dict) -> int:
+    """INSERT the values the table has a column for - the course schema varies between releases"""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    values = {name: value for name, value in values.items() if name in columns}
+    cursor = conn.execute(f"INSERT INTO {table} ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                          tuple(values.values()))
+    return cursor.lastrowid
+
+
+def plan_header(plan: 'ci.CoursePlan', athletes: int) -> dict:
+    positions = plan.device_positions
+    return {
+        'course_length': len(plan.device_sequence),
+        'athletes': athletes,
+        'triggers': sorted(positions[d] for d in plan.triggers_next if d in positions),
+        'complete': min((positions[d] for d in plan.marks_complete if d in positions),
+                        default=len(plan.device_sequence) - 1),
+    }
+
+
+def synthesize(header: dict, args) -> list:
+    """
+    Walk athletes around the course the way the field does: each starts when
+    someone touches a trigger cone and there is room under --max-active, or
+    when a finisher frees a slot for a start that was owed.
+    """
+    rng = random.Random(args.seed)
+    triggers, complete = set(header['triggers']), header['complete']
+    paces = [max(0.5, rng.gauss(args.pace, args.pace_sd)) for _ in range(header['athletes'])]
+    touches = []
+    events = []  # heap of (t, kind, athlete)
+    state = {'next': 0, 'owed': 1, 'on_course': 0}  # GO owes the first start
+
+    def admit(t):
+        while state['owed'] and state['on_course'] < args.max_active and state['next'] < header['athletes']:
+            athlete = state['next']
+            state['next'] += 1
+            state['owed'] -= 1
+            state['on_course'] += 1
+            walk(athlete, t)
+
+    def walk(athlete, t):
+        for position in range(complete + 1):
+            t += paces[athlete] * max(0.2, rng.gauss(1.0, args.jitter))
+            if position in triggers:
+                heapq.heappush(events, (t, 'trigger', athlete))
+            if position == complete:
+                heapq.heappush(events, (t, 'finish', athlete))
+            elif position not in triggers and rng.random() < args.skip_rate:
+                continue  # Missed the cone - no touch registered
+            touches.append({'t': round(t, 6), 'position': position, 'athlete': athlete})
+            if rng.random() < args.double_rate:
+                touches.append({'t': round(t + rng.uniform(0.1, 0.4), 6), 'position': position, 'athlete': None})
+
+    admit(0.0)
+    while events:
+        t, kind, _ = heapq.heappop(events)
+        if kind == 'trigger':
+            state['owed'] += 1
+        else:
+            state['on_course'] -= 1
+        admit(t)
+    return sorted(touches, key=lambda touch: touch['t'])
+
+
+def load_timeline(path: str):
+    """(header, touches) from a --save file or a touch trace"""
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if records and 'course_length' in records[0]:
+        return records[0], records[1:]
+
+    # Touch trace: the attribution recorded at the time is the expected answer
+    athletes = {}  # {run_id: queue index, in start order}
+    devices = {}  # {device_id: position}
+    for record in records:
+        if record['event'] in ('run_started', 'touch'):
+            athletes.setdefault(record['run_id'], len(athletes))
+        if record['event'] == 'touch':
+            devices[record['device_id']] = record['position']
+    stamps = [datetime.fromisoformat(r['timestamp']) for r in records if r['event'] in ('touch', 'unattributed')]
+    if not stamps:
+        sys.exit(f"No touches in {path}")
+    # Times from GO - the first start - or, in a trace that has no starts, from the first touch
+    starts = [datetime.fromisoformat(r['started_at']) for r in records if r['event'] == 'run_started']
+    origin = min(starts or stamps)
+    touches = []
+    for record in records:
+        if record['event'] not in ('touch', 'unattributed') or record['device_id'] not in devices:
+            continue
+        touches.append({
+            't': (datetime.fromisoformat(record['timestamp']) - origin).total_seconds(),
+            'position': devices[record['device_id']],
+            'athlete': athletes[record['run_id']] if record['event'] == 'touch' else None,
+        })
+    # Traces do not say which cones trigger or finish; assume the usual first/last layout
+    course_length = max(devices.values()) + 1
+    header = {'course_length': course_length, 'athletes': len(athletes),
+              'triggers': [0], 'complete': course_length - 1}
+    return header, sorted(touches, key=lambda touch: touch['t'])
+
+
+# ==================== SESSION ====================
+
+def start_session(plan: 'ci.CoursePlan', athletes: int, max_active: int) -> tuple:
+    """Create a team and session through the web routes and press GO; returns (session_id, GO time)"""
+    team_id = ci.db.create_team(name=f"Replay {datetime.now():%H:%M:%S}", age_group=None)
+    athlete_ids = [ci.db.create_athlete(team_id=team_id, name=f"Athlete {n}", jersey_number=n)
+                   for n in range(1, athletes + 1)]
+    client = ci.app.test_client()
+    response = client.post('/session/create', json={
+        'team_id': team_id, 'course_id': plan.course_id, 'athlete_queue': athlete_ids})
+    session_id = response.get_json().get('session_id')
+    if not session_id:
+        sys.exit(f"Session not created: {response.get_json()}")
+    ci.set_session_trace(session_id, True)
+    response = client.post(f"/session/{session_id}/start", json={'max_active': max_active})
+    if response.status_code != 200:
+        sys.exit(f"GO failed: {response.get_json()}")
+    return session_id, datetime.fromisoformat(response.get_json()['current_run']['started_at'])
+
+
+def deliver(touches: list, devices: list, origin: datetime, speed: float) -> tuple:
+    """
+    Push every touch into the pipeline, timestamped origin (GO) + its time;
+    returns (elapsed seconds, {(device_id, timestamp): touch})
+    """
+    sent = {}
+    started = time.perf_counter()
+    for touch in touches:
+        if speed:
+            delay = started + touch['t'] / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        while ci.touch_queue.qsize() >= ci.TOUCH_QUEUE_SIZE - 1:
+            time.sleep(0.0005)  # Flat out: never let the queue drop a touch
+        device_id = devices[touch['position']]
+        timestamp = origin + timedelta(seconds=touch['t'])
+        sent[(device_id, timestamp.isoformat())] = touch
+        ci.handle_touch_event_from_registry(device_id, timestamp)
+    ci.touch_queue.join()
+    return time.perf_counter() - started, sent
+
+
+def read_attribution(session_id: str) -> dict:
+    """{(device_id, timestamp): run_id or None} from the session's touch trace"""
+    path = os.path.join(os.environ['COACH_TRACE_DIR'], f"{session_id}.jsonl")
+    ci.set_session_trace(session_id, False)
+    for _ in range(200):  # The log listener writes the trace behind us
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        if records and records[-1]['event'] == 'trace_stopped':
+            break
+        time.sleep(0.05)
+    return {(record['device_id'], record['timestamp']): record.get('run_id')
+            for record in records if record['event'] in ('touch', 'unattributed')}
+
+
+def score(sent: dict, attributed: dict, run_order: list) -> dict:
+    counts = {'touches': 0, 'correct': 0, 'wrong_athlete': 0, 'dropped': 0,
+              'doubles': 0, 'doubles_ignored': 0, 'missing': 0}
+    for key, touch in sent.items():
+        if key not in attributed:
+            counts['missing'] += 1
+            continue
+        run_id = attributed[key]
+        if touch['athlete'] is None:
+            counts['doubles'] += 1
+            counts['doubles_ignored'] += run_id is None
+            continue
+        counts['touches'] += 1
+        if run_id is None:
+            counts['dropped'] += 1
+        elif run_order.index(run_id) == touch['athlete']:
+            counts['correct'] += 1
+        else:
+            counts['wrong_athlete'] += 1
+    return counts
+
+
+def percentiles(samples) -> str:
+    ordered = sorted(samples)
+    if not ordered:
+        return "no samples"
+    last = len(ordered) - 1
+    return "   ".join(f"{name} {ordered[int(last * pct)]:7.3f} ms"
+                      for name, pct in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99), ('max', 1.0)))
+
+
+def main():
+    args = ARGS
+    stub = start_stub(STUB_PORT, 0)
+
+    if args.course_id is not None:
+        plan = ci.get_course_plan(args.course_id)
+        if plan is None:
+            sys.exit(f"Course {args.course_id} not found in {args.db}")
+    elif not args.replay:
+        plan = synthetic_plan(args.course_length, args.pace)
+
+    if args.replay:
+        header, touches = load_timeline(args.replay)
+        if args.course_id is None:
+            plan = synthetic_plan(header['course_length'], args.pace)
+        elif header['course_length'] > len(plan.device_sequence):
+            sys.exit(f"Timeline needs {header['course_length']} cones, course {args.course_id} has "
+                     f"{len(plan.device_sequence)}")
+    else:
+        header = plan_header(plan, args.athletes)
+        touches = synthesize(header, args)
+        if args.save:
+            with open(args.save, 'w', encoding='utf-8') as f:
+                for record in [header] + touches:
+                    f.write(json.dumps(record) + '\n')
+
+    session_id, started_at = start_session(plan, header['athletes'], args.max_active)
+    for name in ('latency_ms', 'wait_ms'):
+        ci.touch_metrics[name] = deque()  # Keep every sample, not the last 1000
+
+    elapsed, sent = deliver(touches, plan.device_sequence, started_at, args.speed)
+    journal_started = time.perf_counter()
+    ci.journal.wait_drained(timeout=60)
+    journal_s = time.perf_counter() - journal_started
+
+    session = ci.db.get_session(session_id)
+    run_order = [run['run_id'] for run in sorted(session['runs'], key=lambda r: r['queue_position'])]
+    counts = score(sent, read_attribution(session_id), run_order)
+    finished = sum(1 for run in session['runs'] if run['status'] == 'completed')
+    stub.shutdown()
+
+    print(f"{len(touches)} touches, {header['athletes']} athletes, {header['course_length']} cones"
+          f"{' from ' + args.replay if args.replay else ''}")
+    print(f"Throughput: {len(touches) / elapsed:.0f} touches/s ({elapsed:.2f}s), "
+          f"journal drained {journal_s * 1000:.0f} ms later")
+    print(f"Attribution: {counts['correct']}/{counts['touches']} correct "
+          f"({100.0 * counts['correct'] / max(1, counts['touches']):.1f}%), "
+          f"{counts['wrong_athlete']} to the wrong athlete, {counts['dropped']} unattributed")
+    print(f"Double touches: {counts['doubles_ignored']}/{counts['doubles']} ignored, "
+          f"{counts['doubles'] - counts['doubles_ignored']} credited to an athlete")
+    if counts['missing']:
+        print(f"{counts['missing']} touches arrived after the session had ended")
+    print(f"Runs completed: {finished}/{len(session['runs'])}, session {session['status']}")
+    print(f"Latency (enqueue -> processed): {percentiles(ci.touch_metrics['latency_ms'])}")
+    print(f"Queue wait:                     {percentiles(ci.touch_metrics['wait_ms'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Session state stress test - Coach Interface
+Fires thousands of simultaneous touches at process_touch() from many
+threads - far more contention than the single touch worker ever sees -
+while other threads mark athletes absent, then drains the course and checks
+the journal: no athlete started or completed twice, the course never holds
+more than MAX_ACTIVE_RUNS, nobody moves backwards, and every athlete who was
+not marked absent finishes.
+
+    python3 stress_session_state.py [--athletes 200] [--threads 16] [--touches 20000]
+
+--unsafe swaps the state lock for a no-op to show the checks catch the race.
+Uses a local stub of the field trainer API and keeps the journal in memory.
+Importing the coach interface opens (and migrates) a database and a journal:
+both are empty ones in a temporary directory, never the device's.
+"""
+
+import argparse
+import atexit
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, '/opt')
+
+STUB_PORT = 5052
+WORKDIR = tempfile.mkdtemp(prefix='coach_stress_')
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+
+os.environ.setdefault('FIELD_TRAINER_API', f'http://127.0.0.1:{STUB_PORT}')
+os.environ.setdefault('COACH_LOG_LEVEL', 'WARNING')
+os.environ['COACH_DB'] = os.path.join(WORKDIR, 'field_trainer.db')
+os.environ['COACH_JOURNAL'] = os.path.join(WORKDIR, 'coach_journal.jsonl')
+os.environ['COACH_TRACE_DIR'] = os.path.join(WORKDIR, 'traces')
+os.environ['COACH_HANDLER_LOCK'] = os.path.join(WORKDIR, 'touch_handler.lock')
+
+try:
+    import coach_interface as ci  # Deployed as /opt/coach_interface.py
+except ImportError:
+    import coach_interface_working as ci  # Running from ft_usb_build/
+
+from bench_control_client import start_stub
+
+COURSE_LENGTH = 4
+
+
+class RecordingJournal:
+    """
+    Keeps journaled operations in memory, in the order they were appended.
+    Nothing reaches a database, so on_applied gets None at once - a touch
+    with no segment row, which queues no alert check.
+    """
+
+    def __init__(self):
+        self.ops = []
+        self._lock = threading.Lock()
+
+    def append(self, op, session_id, *args, on_applied=None, urgent=False):
+        with self._lock:
+            self.ops.append((op, args))
+            seq = len(self.ops)
+        if on_applied:
+            on_applied(None)
+        return seq
+
+    def request_compaction(self):
+        pass
+
+    def wait_applied(self, seq, timeout):
+        return True
+
+
+class NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def build_model(athletes: int) -> 'ci.SessionModel':
+    devices = [f"192.168.99.{101 + i}" for i in range(COURSE_LENGTH)]
+    actions = [{'device_id': ci.DEVICE_0, 'audio_file': 'start.mp3'}]
+    for i, device_id in enumerate(devices):
+        actions.append({
+            'device_id': device_id,
+            'audio_file': f"cone{i}.mp3",
+            'triggers_next_athlete': i == 0,
+            'marks_run_complete': i == COURSE_LENGTH - 1,
+        })
+    plan = ci.CoursePlan({'course_id': 1, 'course_name': 'Stress', 'actions': actions})
+    session = {
+        'session_id': 'stress',
+        'course_id': 1,
+        'runs': [{
+            'run_id': f"run-{n:04d}",
+            'athlete_name': f"Athlete {n}",
+            'athlete_id': f"athlete-{n}",
+            'queue_position': n,
+            'status': 'queued',
+        } for n in range(1, athletes + 1)],
+    }
+    return ci.SessionModel(session, plan)
+
+
+def fire(model, threads: int, touches: int, absent: int, seed: int):
+    """All threads start together and touch cones; one more thread marks athletes absent"""
+    devices = model.plan.device_sequence
+    per_thread = touches // threads
+    barrier = threading.Barrier(threads + 1)
+    errors = []
+    clock = datetime.utcnow()
+
+    def toucher(index):
+        # Each thread walks the cones in order from a different starting cone,
+        # so together they keep athletes moving and the course full
+        barrier.wait()
+        for i in range(per_thread):
+            try:
+                ci.process_touch(devices[(index + i) % len(devices)], clock + timedelta(milliseconds=i))
+            except Exception as e:
+                errors.append(repr(e))
+
+    def coach():
+        rng = random.Random(seed)
+        run_ids = list(model.runs)
+        barrier.wait()
+        for run_id in rng.sample(run_ids, absent):
+            if ci.session_state.mark_absent(model.session_id, run_id):
+                ci.scheduler.slot_freed()
+            time.sleep(0.001)
+
+    workers = [threading.Thread(target=toucher, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=coach))
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return errors
+
+
+def drain(model, limit: int) -> int:
+    """Walk every athlete still out there around the course, one touch at a time"""
+    devices = model.plan.device_sequence
+    clock = datetime.utcnow()
+    touches = 0
+    while ci.session_state.model is model and touches < limit:
+        for device_id in devices:
+            ci.process_touch(device_id, clock)
+            touches += 1
+    return touches
+
+
+def check(ops: list, model, max_active: int) -> list:
+    problems = []
+    starts = Counter(args[0] for op, args in ops if op == 'start_run')
+    completes = Counter(args[0] for op, args in ops if op == 'complete_run')
+    for run_id, count in (starts + completes).items():
+        if starts[run_id] > 1:
+            problems.append(f"{run_id} started {starts[run_id]} times")
+        if completes[run_id] > 1:
+            problems.append(f"{run_id} completed {completes[run_id]} times")
+        if completes[run_id] and not starts[run_id]:
+            problems.append(f"{run_id} completed without starting")
+
+    # Replay the journal: athletes on course, and every athlete's touches move forward
+    on_course = set()
+    peak = 0
+    last_position = defaultdict(lambda: -1)
+    positions = model.plan.device_positions
+    for op, args in ops:
+        if op == 'start_run':
+            on_course.add(args[0])
+            peak = max(peak, len(on_course))
+        elif op == 'complete_run' or (op == 'update_run_status' and args[1] == 'absent'):
+            on_course.discard(args[0])
+        elif op == 'record_touch':
+            run_id, position = args[0], positions[args[1]]
+            if run_id not in on_course:
+                problems.append(f"touch for {run_id} while it was not on course")
+            if position <= last_position[run_id]:
+                problems.append(f"{run_id} moved back from {last_position[run_id]} to {position}")
+            last_position[run_id] = position
+    if peak > max_active:
+        problems.append(f"{peak} athletes on course at once (cap {max_active})")
+
+    sessions_completed = sum(1 for op, _ in ops if op == 'complete_session')
+    if sessions_completed != 1:
+        problems.append(f"session completed {sessions_completed} times")
+
+    unfinished = [run_id for run_id, run in model.runs.items() if run['status'] not in ('completed', 'absent')]
+    if unfinished:
+        problems.append(f"{len(unfinished)} athletes never finished, e.g. {unfinished[:3]}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session state stress test")
+    parser.add_argument('--athletes', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--touches', type=int, default=20000)
+    parser.add_argument('--absent', type=int, default=20, help="Athletes marked absent mid-session")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--unsafe', action='store_true', help="Run without the state lock")
+    args = parser.parse_args()
+
+    stub = start_stub(STUB_PORT, 0)
+    sys.setswitchinterval(1e-5)  # Switch threads as often as possible
+
+    journal = RecordingJournal()
+    ci.journal = journal
+    if args.unsafe:
+        ci.session_state.lock = NoLock()
+
+    model = build_model(args.athletes)
+    with ci.session_state.lock:
+        ci.session_state.activate(model)
+        model.start_session(ci.DEFAULT_SCHEDULE)
+        ci.scheduler.claim_first_wave(ci.DEFAULT_SCHEDULE, datetime.utcnow())
+
+    started = time.perf_counter()
+    errors = fire(model, args.threads, args.touches, args.absent, args.seed)
+    elapsed = time.perf_counter() - started
+    drained = drain(model, limit=args.athletes * COURSE_LENGTH * 4)
+    ci.side_effects.shutdown(wait=True)
+    stub.shutdown()
+
+    ops = Counter(op for op, _ in journal.ops)
+    print(f"{args.touches} touches from {args.threads} threads in {elapsed:.2f}s "
+          f"({args.touches / elapsed:.0f}/s), {drained} more to drain the course")
+    print(f"Journal: {ops['start_run']} starts, {ops['record_touch']} touches, "
+          f"{ops['complete_run']} completions, {ops['update_run_status']} absences")
+
+    problems = [f"exception: {e}" for e in errors[:5]] + check(journal.ops, model, ci.MAX_ACTIVE_RUNS)
+    if problems:
+        print(f"\nFAILED - {len(problems)} problem(s):")
+        for problem in problems[:20]:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("\nOK - no athlete started or completed twice, none dropped")
+
+
+if __name__ == '__main__':
+    main()
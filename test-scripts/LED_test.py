@@ -1,5 +1,4 @@
-import time
-from rpi_ws281x import PixelStrip, Color
+from hardware import PixelStrip, Color, clock
 
 # LED strip configuration:
 LED_COUNT = 15        # Number of LED pixels.
@@ -18,7 +17,7 @@ def color_wipe(color, wait_ms=50):
     for i in range(strip.numPixels()):
         strip.setPixelColor(i, color)
         strip.show()
-        time.sleep(wait_ms / 1000.0)
+        clock.sleep(wait_ms / 1000.0)
 
 # Example usage
 if __name__ == '__main__':
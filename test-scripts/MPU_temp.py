@@ -1,5 +1,6 @@
-import smbus
-import time
+import struct
+
+from hardware import SMBus, clock
 
 # MPU6050 address
 MPU6050_ADDR = 0x68
@@ -9,21 +10,15 @@ PWR_MGMT_1 = 0x6B
 TEMP_OUT_H = 0x41
 
 # Initialize I2C (SMBus)
-bus = smbus.SMBus(1)
+bus = SMBus(1)
 
 # Wake up the MPU6050
 bus.write_byte_data(MPU6050_ADDR, PWR_MGMT_1, 0)
 
 def read_raw_data(addr):
-    # Read 2 bytes of data from the given address
-    high = bus.read_byte_data(MPU6050_ADDR, addr)
-    low = bus.read_byte_data(MPU6050_ADDR, addr + 1)
-    # Combine high and low bytes
-    value = ((high << 8) | low)
-    # Convert to signed value
-    if value > 32768:
-        value -= 65536
-    return value
+    # Read both bytes of the register in one transaction, big-endian signed
+    high, low = bus.read_i2c_block_data(MPU6050_ADDR, addr, 2)
+    return struct.unpack('>h', bytes((high, low)))[0]
 
 def calibrate_sensor(samples=100):
     # Calibrate the sensor by averaging multiple temperature readings
@@ -34,7 +29,7 @@ def calibrate_sensor(samples=100):
     for _ in range(samples):
         temp_raw = read_raw_data(TEMP_OUT_H)
         temp_offset += temp_raw / 340.00 + 36.53  # Convert to temperature
-        time.sleep(0.01)  # Small delay between readings
+        clock.sleep(0.01)  # Small delay between readings
 
     # Calculate average temperature offset
     temp_offset /= samples
@@ -58,7 +53,7 @@ def main():
         while True:
             temperature = read_temperature(temp_offset)
             print(f"Temperature: {temperature:.2f} °C")
-            time.sleep(1)  # Delay of 1 second between readings
+            clock.sleep(1)  # Delay of 1 second between readings
  
     except KeyboardInterrupt:
         print("Temperature monitoring stopped by User")
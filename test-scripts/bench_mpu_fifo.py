@@ -0,0 +1,232 @@
+"""
+MPU touch sampling benchmark - polling vs FIFO
+
+Plays a run of short, sharp touches into a simulated MPU6050 and reports,
+for each way of sampling it, how many touches were caught, how long after
+the touch each one was noticed, how many samples arrived (and were lost),
+and the CPU it took per second of sensing:
+
+    poll-500ms   one read every 0.5 s, as mpu6050.py did
+    poll-10ms    one read every 10 ms, as mpu6050_gem3.py does
+    fifo-timer   MPUFifo at --rate, drained --drain-hz times a second
+    fifo-int     the same, also drained on the motion interrupt (INT pin)
+
+    python3 bench_mpu_fifo.py [--touches 20] [--touch-ms 5] [--rate 1000] [--drain-hz 20]
+
+Simulator only - ground truth needs touches the script placed itself.
+FT_SPEED=0 runs in virtual time: same result every run, and CPU is still
+per second of sensing. Each mode runs in its own process.
+"""
+
+import argparse
+import bisect
+import json
+import math
+import os
+import random
+import struct
+import subprocess
+import sys
+import time
+from array import array
+
+os.environ.setdefault('FT_HARDWARE', 'sim')
+os.environ.setdefault('FT_SPEED', '1')
+
+import hardware
+from hardware import SMBus, clock
+from mpu_sampler import (MPUSampler, MPUFifo, FifoBatch, MPU6050_ADDR, ACCEL_SCALE, ACCEL_XOUT_H, SMPLRT_DIV,
+                         CONFIG, FIFO_EN, USER_CTRL, FIFO_COUNTH, FIFO_R_W, FIFO_SIZE)
+from touch_detect import TouchDetector
+
+MODES = ('poll-500ms', 'poll-10ms', 'fifo-timer', 'fifo-int')
+INT_PIN = 17
+THRESHOLD = 1000  # counts, mpu6050.py's default
+
+
+class SimulatedMPU6050:
+    """
+    An MPU6050 for Replay.attach(): a sensor at rest with touches at
+    touch_s (seconds after t0), each a half-sine of touch_ms on X. With the
+    FIFO on it queues a sample every 1/rate into 1 KB, overwriting the
+    oldest when full, as the chip does.
+    """
+
+    def __init__(self, t0, touch_s, touch_ms, touch_counts, noise=60, seed=1):
+        self.t0 = t0
+        self.touch_s = touch_s
+        self.width_s = touch_ms / 1000
+        self.touch_counts = touch_counts
+        self.noise = noise
+        self.rng = random.Random(seed)
+        self.regs = bytearray(256)
+        self.fifo = bytearray()
+        self.next_sample = None
+        self.produced = 0
+        self.cpu_s = 0.0  # CPU the simulation itself used, left out of the report
+
+    def _rate(self):
+        base = 8000 if self.regs[CONFIG] & 0x07 in (0, 7) else 1000
+        return base / (1 + self.regs[SMPLRT_DIV])
+
+    def _fifo_on(self):
+        return self.regs[USER_CTRL] & 0x40 and self.regs[FIFO_EN]
+
+    def _accel(self, t):
+        x = self.rng.gauss(0, self.noise)
+        i = bisect.bisect_right(self.touch_s, t - self.t0) - 1
+        if i >= 0:
+            into = t - self.t0 - self.touch_s[i]
+            if into < self.width_s:
+                x += self.touch_counts * math.sin(math.pi * into / self.width_s)
+        return (max(-32768, min(32767, int(x))), int(self.rng.gauss(0, self.noise)),
+                int(ACCEL_SCALE + self.rng.gauss(0, self.noise)))
+
+    def _catch_up(self):
+        now = clock.monotonic()
+        if not self._fifo_on():
+            self.next_sample = None
+            return
+        period = 1 / self._rate()
+        if self.next_sample is None:
+            self.next_sample = now + period
+        gyro = self.regs[FIFO_EN] & 0x70
+        while self.next_sample <= now:
+            sample = self._accel(self.next_sample)
+            self.fifo += struct.pack('>6h', *sample, 0, 0, 0) if gyro else struct.pack('>3h', *sample)
+            if len(self.fifo) > FIFO_SIZE:
+                del self.fifo[:len(self.fifo) - FIFO_SIZE]
+            self.produced += 1
+            self.next_sample += period
+
+    def read(self, reg, length):
+        started = time.thread_time()
+        try:
+            self._catch_up()
+            if reg == FIFO_COUNTH:
+                return len(self.fifo).to_bytes(2, 'big')[:length]
+            if reg == FIFO_R_W:
+                out = bytes(self.fifo[:length]).ljust(length, b'\0')
+                del self.fifo[:length]
+                return out
+            if reg == ACCEL_XOUT_H:
+                return struct.pack('>7h', *self._accel(clock.monotonic()), 0, 0, 0, 0)[:length]
+            return bytes(self.regs[reg:reg + length])
+        finally:
+            self.cpu_s += time.thread_time() - started
+
+    def write(self, reg, data):
+        started = time.thread_time()
+        try:
+            self._catch_up()
+            self.regs[reg:reg + len(data)] = data
+            if reg == USER_CTRL and data[0] & 0x04:
+                self.fifo.clear()
+                self.regs[USER_CTRL] &= ~0x04
+            self._catch_up()  # Starts the sample clock if that turned the FIFO on
+        finally:
+            self.cpu_s += time.thread_time() - started
+
+
+def touch_schedule(touches, seed):
+    rng = random.Random(seed)
+    t, schedule = 0.5, []
+    for _ in range(touches):
+        schedule.append(t)
+        t += rng.uniform(0.5, 1.5)
+    return schedule, t
+
+
+def run_mode(mode, args):
+    """One mode, in this process; returns the report dict"""
+    touch_s, end_s = touch_schedule(args.touches, args.seed)
+    if mode == 'fifo-int':
+        # The motion interrupt as a GPIO trace: a 50 us pulse as each touch starts
+        for onset in touch_s:
+            hardware.replay.events += [{'t': onset + 0.001, 'gpio': INT_PIN, 'level': 1},
+                                       {'t': onset + 0.00105, 'gpio': INT_PIN, 'level': 0}]
+    bus = SMBus(1)  # Starts the replay - trace time 0
+    t0 = hardware.replay.anchor[0]
+    model = SimulatedMPU6050(t0, touch_s, args.touch_ms, args.touch_g * ACCEL_SCALE, seed=args.seed)
+    hardware.replay.attach(MPU6050_ADDR, model)
+
+    detector = TouchDetector(THRESHOLD)
+    found = []  # (sample t, noticed at), clock seconds
+    samples = 0
+    cpu_started = time.process_time()
+    end = t0 + end_s
+
+    def note(batch):
+        for t_ns, _magnitude in detector.feed(batch):
+            found.append((t_ns / 1e9, clock.monotonic()))
+
+    if mode.startswith('poll'):
+        sampler = MPUSampler(bus)
+        interval = 0.5 if mode == 'poll-500ms' else 0.01
+        while clock.monotonic() < end:
+            ax, ay, az = sampler.read()[:3]
+            note(FifoBatch(samples, clock.monotonic_ns(), 0, 3, array('h', (ax, ay, az))))
+            samples += 1
+            clock.sleep(interval)
+        lost = 0
+    else:
+        fifo = MPUFifo(bus, rate_hz=args.rate)
+        fifo.start()
+        int_pin = INT_PIN if mode == 'fifo-int' else None
+        for batch in fifo.batches(drain_hz=args.drain_hz, int_pin=int_pin):
+            note(batch)
+            samples += len(batch.data) // batch.channels
+            if clock.monotonic() >= end:
+                break
+        lost = fifo.lost
+
+    cpu = time.process_time() - cpu_started - model.cpu_s
+    sensed = clock.monotonic() - t0
+    caught, latencies, false = set(), [], 0
+    for sample_t, noticed in found:
+        i = bisect.bisect_right(touch_s, sample_t - t0 + 0.002) - 1
+        if i >= 0 and sample_t - t0 - touch_s[i] < args.touch_ms / 1000 + 0.002 and i not in caught:
+            caught.add(i)
+            latencies.append(noticed - t0 - touch_s[i])
+        else:
+            false += 1
+    return {
+        'caught': len(caught),
+        'touches': len(touch_s),
+        'false': false,
+        'latency_ms': 1000 * sum(latencies) / len(latencies) if latencies else None,
+        'latency_max_ms': 1000 * max(latencies) if latencies else None,
+        'samples_s': samples / sensed,
+        'lost': lost,
+        'cpu_pct': 100 * cpu / sensed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Polling vs FIFO touch sampling on a simulated MPU6050')
+    parser.add_argument('--touches', type=int, default=20)
+    parser.add_argument('--touch-ms', type=float, default=5, help='how long a touch lasts')
+    parser.add_argument('--touch-g', type=float, default=0.5, help='peak of a touch')
+    parser.add_argument('--rate', type=float, default=1000, help='FIFO sample rate, Hz')
+    parser.add_argument('--drain-hz', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args)))
+        return
+
+    print(f"{args.touches} touches of {args.touch_ms:g} ms at {args.touch_g:g} g, FT_SPEED={os.environ['FT_SPEED']}")
+    print(f"{'':<12}{'caught':>8}{'false':>7}{'latency ms':>14}{'max':>8}{'samples/s':>11}{'lost':>6}{'CPU %':>8}")
+    for mode in MODES:
+        out = subprocess.run([sys.executable, __file__, '--mode', mode] + sys.argv[1:],
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        latency = f"{r['latency_ms']:14.1f}{r['latency_max_ms']:8.1f}" if r['latency_ms'] is not None else f"{'-':>14}{'-':>8}"
+        print(f"{mode:<12}{r['caught']:>4}/{r['touches']:<3}{r['false']:>7}{latency}"
+              f"{r['samples_s']:>11.0f}{r['lost']:>6}{r['cpu_pct']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+MPU6050 read benchmark - byte-at-a-time vs burst block reads
+
+Reads accel+gyro samples back to back for --seconds with each reader and
+reports samples/sec and CPU per sample:
+
+    bytewise   read_raw_data() as in mpu6050.py - two read_byte_data() per axis
+    block      MPUSampler.read() - one 14-byte read_i2c_block_data()
+    batch      MPUSampler.read_batch() - the same, 100 samples per call
+
+    python3 bench_mpu_reads.py [--seconds 5] [--bus 1] [--address 0x68]
+
+On the Pi this measures the real bus. Off it, run on the simulator, where
+each transfer takes the time its bytes need at FT_I2C_HZ - the rates are
+then what the wire allows:
+
+    FT_HARDWARE=sim FT_SPEED=0 python3 bench_mpu_reads.py
+"""
+
+import argparse
+import time
+
+from hardware import SMBus, clock
+from mpu_sampler import MPUSampler, MPU6050_ADDR, ACCEL_XOUT_H
+
+GYRO_XOUT_H = 0x43
+BATCH = 100
+
+
+def bytewise_sample(bus, address):
+    """The six axes the way mpu6050.py used to read them"""
+    def read_raw_data(addr):
+        high = bus.read_byte_data(address, addr)
+        low = bus.read_byte_data(address, addr + 1)
+        value = ((high << 8) | low)
+        if value >= 32768:
+            value -= 65536
+        return value
+    return (read_raw_data(ACCEL_XOUT_H), read_raw_data(ACCEL_XOUT_H + 2), read_raw_data(ACCEL_XOUT_H + 4),
+            read_raw_data(GYRO_XOUT_H), read_raw_data(GYRO_XOUT_H + 2), read_raw_data(GYRO_XOUT_H + 4))
+
+
+def run(name, sampler, seconds):
+    bus, address = sampler.bus, sampler.address
+    samples = 0
+    cpu_started, started = time.process_time(), clock.monotonic()
+    while clock.monotonic() - started < seconds:
+        if name == 'bytewise':
+            bytewise_sample(bus, address)
+            samples += 1
+        elif name == 'block':
+            sampler.read()
+            samples += 1
+        else:
+            samples += len(sampler.read_batch(BATCH)) // 7
+    elapsed = clock.monotonic() - started
+    cpu = time.process_time() - cpu_started
+    return samples / elapsed, cpu / samples * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Byte-at-a-time vs burst MPU6050 reads')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--bus', type=int, default=1)
+    parser.add_argument('--address', type=lambda v: int(v, 0), default=MPU6050_ADDR)
+    args = parser.parse_args()
+
+    sampler = MPUSampler(SMBus(args.bus), args.address)
+    print(f"{args.seconds:g} s per reader, MPU at {args.address:#x}")
+    results = {}
+    for name, transactions in (('bytewise', 12), ('block', 1), ('batch', 1)):
+        rate, cpu_us = run(name, sampler, args.seconds)
+        results[name] = rate
+        print(f"  {name:<9} {rate:8.0f} samples/s   {transactions:2d} transactions/sample   {cpu_us:6.1f} us CPU/sample")
+    print(f"\nblock reads: {results['block'] / results['bytewise']:.1f}x the bytewise sample rate")
+
+
+if __name__ == '__main__':
+    main()
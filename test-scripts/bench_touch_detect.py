@@ -0,0 +1,215 @@
+"""
+Touch detection benchmark - per-sample vs windowed (numpy)
+
+Runs TouchDetector and WindowedTouchDetector (touch_detect.py) over the
+same recorded MPU FIFO session and reports, for each: touch events per
+second of recording, precision and recall against the labels in the trace
+(false triggers split by what caused them), how long after the touch
+began its timestamp falls, and CPU per 128 ms window of samples.
+
+    python3 bench_touch_detect.py [--trace session.jsonl] [--save session.jsonl] [--seconds 120]
+
+--trace is a hardware.py trace of an MPUFifo session (FT_RECORD=... on the
+Pi) with label lines added by hand where things happened:
+
+    {"t": 12.30, "label": "touch"}
+    {"t": 40.02, "label": "ball"}
+    {"t": 60.0, "label": "wind", "until": 68.0}
+
+Without --trace it makes one up - touches, ball hits and gusts of wind on
+a sensor at 1 kHz - and --save keeps it for replaying later.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from hardware import load_trace
+from mpu_sampler import (FifoBatch, MPU6050_ADDR, ACCEL_SCALE, PWR_MGMT_1, CONFIG, SMPLRT_DIV, FIFO_EN, USER_CTRL,
+                         FIFO_COUNTH, FIFO_R_W, I2C_BLOCK_MAX, decode)
+from touch_detect import TouchDetector, WindowedTouchDetector
+
+DRAIN_S = 0.05  # MPUFifo drained at 20 Hz
+WINDOW_S = 0.128  # WindowedTouchDetector's, and CPU is reported per this much signal
+MATCH_S = (-0.005, 0.02)  # A detection this close to a labelled touch is that touch
+THRESHOLD = 1000  # TouchDetector's, as mpu6050.py
+
+
+# --- making up a session ---
+
+def synthesize(seconds, rate, seed):
+    """(int16 samples n x 3, labels) for a sensor at rest with touches, ball hits and wind"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * rate)
+    t = np.arange(n) / rate
+    x = rng.normal(0, 60, (n, 3))
+    x[:, 2] += ACCEL_SCALE
+    labels = []
+
+    # Gusts: the cone sways a few Hz and rattles
+    for start in np.sort(rng.uniform(5, seconds - 15, 3)):
+        until = start + rng.uniform(6, 10)
+        gust = (t >= start) & (t < until)
+        ramp = np.sin(np.pi * (t[gust] - start) / (until - start))
+        for axis in (0, 1):
+            sway = rng.uniform(1200, 2500) * np.sin(2 * np.pi * rng.uniform(1.5, 4) * t[gust] + rng.uniform(0, 6))
+            x[gust, axis] += ramp * (sway + rng.normal(0, 250, gust.sum()))
+        labels.append({'t': round(float(start), 4), 'label': 'wind', 'until': round(float(until), 4)})
+
+    # Ball hits: well past full scale, ringing on for tens of ms
+    for onset in rng.uniform(2, seconds - 2, max(1, int(seconds / 15))):
+        i = int(onset * rate)
+        ring = np.arange(int(0.08 * rate)) / rate
+        shape = rng.uniform(2.5, 4) * ACCEL_SCALE * np.exp(-ring / 0.015) * np.sin(2 * np.pi * 80 * ring)
+        direction = rng.normal(0, 1, 3)
+        x[i:i + len(ring)] += np.outer(shape, direction / np.linalg.norm(direction))[:n - i]
+        labels.append({'t': round(float(onset), 4), 'label': 'ball'})
+
+    # Touches: a sharp half-sine, mostly sideways, every second or three
+    onset = 1.0
+    while onset < seconds - 1:
+        width = rng.uniform(0.004, 0.012)
+        i = int(np.ceil(onset * rate))
+        pulse = np.sin(np.pi * (np.arange(i, i + int(width * rate) + 1) / rate - onset) / width).clip(0)
+        direction = rng.normal(0, 1, 3) * (1, 1, 0.3)
+        x[i:i + len(pulse)] += np.outer(rng.uniform(0.3, 1.0) * ACCEL_SCALE * pulse, direction / np.linalg.norm(direction))
+        labels.append({'t': round(onset, 4), 'label': 'touch'})
+        onset += rng.uniform(1.0, 3.0)
+
+    return np.clip(np.rint(x), -32768, 32767).astype(np.int16), sorted(labels, key=lambda label: label['t'])
+
+
+def to_trace(samples, rate, labels):
+    """The trace an MPUFifo session at rate records: its set-up writes, then a drain every DRAIN_S"""
+    def write(reg, value):
+        return {'t': 0.0, 'i2c': MPU6050_ADDR, 'reg': reg, 'data': [value], 'write': True}
+    events = [write(PWR_MGMT_1, 0x01), write(CONFIG, 0x01), write(SMPLRT_DIV, round(1000 / rate) - 1),
+              write(FIFO_EN, 0x00), write(USER_CTRL, 0x04), write(USER_CTRL, 0x40), write(FIFO_EN, 0x08)]
+    raw = samples.astype('>i2').tobytes()
+    frame = 6
+    chunk = I2C_BLOCK_MAX // frame * frame
+    taken = 0
+    drain = DRAIN_S
+    while taken < len(raw):
+        ready = min(len(raw), int(drain * rate) * frame)
+        events.append({'t': round(drain, 6), 'i2c': MPU6050_ADDR, 'reg': FIFO_COUNTH, 'data': list((ready - taken).to_bytes(2, 'big'))})
+        while taken < ready:
+            events.append({'t': round(drain, 6), 'i2c': MPU6050_ADDR, 'reg': FIFO_R_W, 'data': list(raw[taken:taken + chunk])})
+            taken += chunk
+        drain += DRAIN_S
+    return sorted(events + labels, key=lambda event: event['t'])
+
+
+# --- reading a session back ---
+
+def fifo_batches(events):
+    """FifoBatch per drain, timed off the recorded set-up: sample n was taken (n + 1) periods after FIFO_EN"""
+    rate = 1000.0
+    frame = 6
+    anchor = None  # (t, index) when the FIFO was last (re)started
+    index = 0
+    batches = []
+    raw = None
+    for event in events:
+        if event.get('i2c') != MPU6050_ADDR:
+            continue
+        reg = event['reg']
+        if event.get('write'):
+            value = event['data'][0]
+            if reg == SMPLRT_DIV:
+                rate = 1000.0 / (1 + value)
+            elif reg == FIFO_EN and value:
+                frame = 12 if value & 0x70 else 6
+                if anchor is not None:  # Restarted after an overflow: samples since the last drain are gone
+                    index = anchor[1] + round((event['t'] - anchor[0]) * rate)
+                anchor = (event['t'], index)
+        elif reg == FIFO_COUNTH:
+            raw = bytearray()
+            batches.append((index, raw, frame, anchor))
+        elif reg == FIFO_R_W and raw is not None:
+            raw += bytes(event['data'])
+            index += len(event['data']) // frame
+    return [FifoBatch(first, int((anchor_t + (first - anchor_index + 1) / rate) * 1e9), 1e9 / rate, frame // 2, decode(raw))
+            for first, raw, frame, (anchor_t, anchor_index) in batches if raw], rate
+
+
+# --- scoring ---
+
+def score(found_s, labels):
+    touches = [label['t'] for label in labels if label['label'] == 'touch']
+    caught = set()
+    after_onset = []
+    false = {'wind': 0, 'ball': 0, 'other': 0}
+    for t in found_s:
+        match = next((i for i, onset in enumerate(touches)
+                      if MATCH_S[0] <= t - onset <= MATCH_S[1] and i not in caught), None)
+        if match is not None:
+            caught.add(match)
+            after_onset.append(t - touches[match])
+            continue
+        cause = 'other'
+        for label in labels:
+            if label['label'] == 'ball' and 0 <= t - label['t'] <= 0.2:
+                cause = 'ball'
+            elif label['label'] == 'wind' and label['t'] <= t <= label['until'] and cause == 'other':
+                cause = 'wind'
+        false[cause] += 1
+    true = len(caught)
+    return {
+        'found': len(found_s),
+        'precision': true / len(found_s) if found_s else 0.0,
+        'recall': true / len(touches) if touches else 0.0,
+        'false': false,
+        'after_onset_ms': 1000 * float(np.median(after_onset)) if after_onset else float('nan'),
+    }
+
+
+def run(name, batches, labels, seconds):
+    detector = TouchDetector(THRESHOLD) if name == 'per-sample' else WindowedTouchDetector(window_s=WINDOW_S)
+    found_ns = []
+    cpu_started = time.process_time()
+    for batch in batches:
+        found_ns += [event[0] for event in detector.feed(batch)]
+    cpu = time.process_time() - cpu_started
+    result = score([t / 1e9 for t in found_ns], labels)
+    result['events_s'] = len(found_ns) / seconds
+    result['cpu_window_us'] = 1e6 * cpu * WINDOW_S / seconds
+    result['cpu_pct'] = 100 * cpu / seconds
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-sample vs windowed touch detection on a recorded MPU session')
+    parser.add_argument('--trace', help='hardware.py trace with label lines')
+    parser.add_argument('--save', help='write the made-up session here')
+    parser.add_argument('--seconds', type=float, default=120)
+    parser.add_argument('--rate', type=float, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.trace:
+        events = load_trace(args.trace)
+    else:
+        samples, labels = synthesize(args.seconds, args.rate, args.seed)
+        events = to_trace(samples, args.rate, labels)
+        if args.save:
+            with open(args.save, 'w') as f:
+                f.writelines(json.dumps(event) + '\n' for event in events)
+    labels = [event for event in events if 'label' in event]
+    batches, rate = fifo_batches(events)
+    seconds = sum(len(batch.data) // batch.channels for batch in batches) / rate
+    kinds = {kind: sum(label['label'] == kind for label in labels) for kind in ('touch', 'ball', 'wind')}
+    print(f"{seconds:.0f} s at {rate:g} Hz: {kinds['touch']} touches, {kinds['ball']} ball hits, {kinds['wind']} gusts")
+    print(f"{'':<12}{'events/s':>9}{'precision':>11}{'recall':>8}{'false: wind':>13}{'ball':>6}{'other':>7}"
+          f"{'t - onset':>11}{'CPU/window':>13}{'CPU':>8}")
+    for name in ('per-sample', 'windowed'):
+        r = run(name, batches, labels, seconds)
+        print(f"{name:<12}{r['events_s']:>9.2f}{r['precision']:>11.2f}{r['recall']:>8.2f}{r['false']['wind']:>13}"
+              f"{r['false']['ball']:>6}{r['false']['other']:>7}{r['after_onset_ms']:>8.2f} ms"
+              f"{r['cpu_window_us']:>10.0f} us{r['cpu_pct']:>7.2f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Ultrasonic ranging benchmark - busy-wait vs edge-timed
+
+Runs the old busy-wait get_distance() and UltrasonicRanger against a
+simulated HC-SR04 and reports CPU use and how far each one's pulse width
+is off from the pulse the simulator actually produced.
+
+    python3 bench_ultrasonic.py [--samples 200] [--rate 10] [--distance 80] [--miss-rate 0.05]
+
+No Pi needed. Missed echoes are only simulated for the edge-timed ranger:
+the busy-wait loop has no timeout and would hang.
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+
+import hardware
+from ultrasonic_ranging import UltrasonicRanger, pulse_to_cm, SPEED_OF_SOUND_CM_S
+
+ECHO_DELAY_S = 0.0005  # Trigger to echo start on a real HC-SR04 is ~0.5 ms
+
+
+class SimulatedSR04:
+    """
+    Enough of RPi.GPIO for ranging, wired to a simulated sensor: the trigger
+    falling edge starts an echo pulse as wide as the distance needs. Echo
+    edges fire callbacks from the sensor thread, like RPi.GPIO's event thread.
+    """
+    BCM = 11
+    IN, OUT = 1, 0
+    LOW, HIGH = 0, 1
+    RISING, FALLING, BOTH = 31, 32, 33
+
+    def __init__(self, distance_cm=80.0, noise_cm=0.5, miss_rate=0.0, seed=1):
+        self.distance_cm = distance_cm
+        self.noise_cm = noise_cm
+        self.miss_rate = miss_rate
+        self.rng = random.Random(seed)
+        self.levels = {}
+        self.callbacks = {}
+        self.trig = self.echo = None
+        self.true_pulses_ns = []  # Pulse widths as produced, one per echo
+        self.cpu_s = 0.0  # CPU the simulated sensor itself used, left out of the report
+
+    # --- RPi.GPIO ---
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, channel, direction, **kwargs):
+        self.levels[channel] = self.LOW
+        if direction == self.OUT:
+            self.trig = channel
+        else:
+            self.echo = channel
+
+    def input(self, channel):
+        return self.levels[channel]
+
+    def output(self, channel, value):
+        was = self.levels.get(channel)
+        self.levels[channel] = int(bool(value))
+        if channel == self.trig and was and not value:
+            threading.Thread(target=self._echo, daemon=True).start()
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        self.callbacks[channel] = callback
+
+    def remove_event_detect(self, channel):
+        self.callbacks.pop(channel, None)
+
+    def cleanup(self):
+        self.callbacks.clear()
+
+    # --- the sensor ---
+
+    def _set_echo(self, level):
+        self.levels[self.echo] = level
+        callback = self.callbacks.get(self.echo)
+        if callback:
+            callback(self.echo)
+
+    def _echo(self):
+        cpu_started = time.thread_time()
+        try:
+            self._pulse()
+        finally:
+            self.cpu_s += time.thread_time() - cpu_started
+
+    def _pulse(self):
+        if self.rng.random() < self.miss_rate:
+            return
+        distance = max(2.0, self.rng.gauss(self.distance_cm, self.noise_cm))
+        width_s = 2 * distance / SPEED_OF_SOUND_CM_S
+        time.sleep(ECHO_DELAY_S)
+        rose = time.monotonic_ns()
+        self._set_echo(self.HIGH)
+        deadline = rose + int(width_s * 1e9)
+        while time.monotonic_ns() < deadline:  # Sleep is too coarse for a ~5 ms pulse
+            time.sleep(0)
+        fell = time.monotonic_ns()
+        self._set_echo(self.LOW)
+        self.true_pulses_ns.append(fell - rose)
+
+
+def busy_wait_distance(GPIO, TRIG, ECHO):
+    """get_distance() as it was in ultrasonic2/3/4.py and ultrasonic_calibrate.py"""
+    GPIO.output(TRIG, True)
+    time.sleep(0.00001)
+    GPIO.output(TRIG, False)
+
+    pulse_start = time.time()
+    while GPIO.input(ECHO) == 0:
+        pulse_start = time.time()
+
+    pulse_end = time.time()
+    while GPIO.input(ECHO) == 1:
+        pulse_end = time.time()
+
+    pulse_duration = pulse_end - pulse_start
+    return pulse_duration * 17150
+
+
+def run_busy_wait(args):
+    gpio = SimulatedSR04(args.distance, args.noise)
+    gpio.setup(23, gpio.OUT)
+    gpio.setup(24, gpio.IN)
+    period = 1.0 / args.rate
+    measured = []
+    stamps = []
+    cpu_started, wall_started = time.process_time(), time.monotonic()
+    for _ in range(args.samples):
+        ping_at = time.monotonic()
+        measured.append(busy_wait_distance(gpio, 23, 24))
+        stamps.append(time.monotonic_ns())
+        time.sleep(max(0.0, period - (time.monotonic() - ping_at)))
+    return report_data(gpio, measured, stamps, cpu_started, wall_started, timeouts=0)
+
+
+def run_edge_timed(args):
+    gpio = SimulatedSR04(args.distance, args.noise, args.miss_rate)
+    # The simulated sensor runs in wall time, so the ranger must too - not
+    # hardware.clock, which is virtual under FT_SPEED=0
+    ranger = UltrasonicRanger(23, 24, gpio=gpio, clock=hardware.Clock())
+    measured = []
+    stamps = []
+    cpu_started, wall_started = time.process_time(), time.monotonic()
+    ranger.start(rate_hz=args.rate)
+    while len(measured) + ranger.timeouts < args.samples:
+        sample = ranger.get(timeout=1)
+        if sample is None:
+            continue
+        if sample.distance_cm is None:
+            stamps.append(None)  # Timed out - no interval across the gap
+        else:
+            measured.append(sample.distance_cm)
+            stamps.append(sample.t_ns)
+    ranger.close()
+    return report_data(gpio, measured, stamps, cpu_started, wall_started, timeouts=ranger.timeouts)
+
+
+def report_data(gpio, measured, stamps, cpu_started, wall_started, timeouts):
+    cpu = time.process_time() - cpu_started - gpio.cpu_s
+    wall = time.monotonic() - wall_started
+    true_cm = [pulse_to_cm(ns) for ns in gpio.true_pulses_ns[:len(measured)]]
+    errors = [abs(m - t) for m, t in zip(measured, true_cm)]
+    intervals_ms = [(b - a) / 1e6 for a, b in zip(stamps, stamps[1:]) if a is not None and b is not None]
+    return {
+        'cpu_pct': 100.0 * cpu / wall,
+        'samples': len(measured),
+        'timeouts': timeouts,
+        'error_mean': statistics.mean(errors),
+        'error_p99': sorted(errors)[int(len(errors) * 0.99) - 1 if len(errors) > 1 else 0],
+        'interval_sd_ms': statistics.pstdev(intervals_ms) if len(intervals_ms) > 1 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Busy-wait vs edge-timed ultrasonic ranging (simulated sensor)')
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=10, help='pings per second')
+    parser.add_argument('--distance', type=float, default=80, help='cm')
+    parser.add_argument('--noise', type=float, default=0.5, help='cm, sensor noise')
+    parser.add_argument('--miss-rate', type=float, default=0.05, help='lost echoes (edge-timed only)')
+    args = parser.parse_args()
+
+    print(f"{args.samples} pings at {args.rate:g} Hz, target {args.distance:g} cm")
+    for name, run in (('busy-wait', run_busy_wait), ('edge-timed', run_edge_timed)):
+        r = run(args)
+        print(f"\n{name}:")
+        print(f"  CPU                 {r['cpu_pct']:6.1f} %")
+        print(f"  samples / timeouts  {r['samples']} / {r['timeouts']}")
+        print(f"  pulse error         mean {r['error_mean']:.3f} cm, p99 {r['error_p99']:.3f} cm")
+        print(f"  sample interval SD  {r['interval_sd_ms']:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-import RPi.GPIO as GPIO
+from hardware import GPIO
 
 pu_pin = 18
 pd_pin = 23
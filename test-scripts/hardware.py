@@ -0,0 +1,586 @@
+"""
+Hardware access for the test scripts - the real thing or a simulator
+
+Scripts import their hardware from here instead of from RPi.GPIO, smbus and
+rpi_ws281x, and take time from clock:
+
+    from hardware import GPIO, SMBus, PixelStrip, Color, clock
+
+    GPIO.setup(ECHO, GPIO.IN)
+    bus = SMBus(1)
+    clock.sleep(0.01)
+
+FT_HARDWARE picks the backend:
+
+    pi (default)   RPi.GPIO, smbus and rpi_ws281x, imported on first use
+    sim            GPIO, I2C and the LED strip simulated, replaying FT_TRACE
+
+On the Pi, FT_RECORD=trace.jsonl also writes every input level, output and
+I2C transfer the script saw to a trace. Replay it anywhere with
+
+    FT_HARDWARE=sim FT_TRACE=trace.jsonl FT_SPEED=10 python3 ultrasonic3.py
+
+FT_SPEED sets how fast the replay runs: 1 is real time, 10 ten times as
+fast. 0 is virtual time - the clock only moves when the script sleeps or
+waits, so a trace plays as fast as the CPU allows and plays the same way
+every time. Above 1, thread wake-up jitter is multiplied by the speed too,
+so time echo pulses at 0 or 1. Simulated I2C transfers take as long as
+their bytes would on the wire at FT_I2C_HZ (default 100000, as on the Pi).
+
+Trace format, one JSON object per line, t in seconds from the start:
+
+    {"t": 0.1, "gpio": 24, "level": 1}                      input pin changed
+    {"t": 0.1, "gpio": 23, "level": 0, "out": true}         script changed an output
+    {"t": 0.1, "i2c": 104, "reg": 59, "data": [3, 232]}     registers, as read
+    {"t": 0.1, "i2c": 104, "reg": 107, "data": [0], "write": true}
+    {"t": 0.1, "label": "touch"}                            annotation, skipped on replay
+
+On replay an output is a sync point: the replay holds until the script
+drives the same pin to the same level, then plays what followed with its
+recorded spacing - so an echo comes back after the script's own trigger.
+"""
+
+import errno
+import json
+import os
+import threading
+import time
+
+BACKEND = os.environ.get('FT_HARDWARE', 'pi')
+I2C_HZ = int(os.environ.get('FT_I2C_HZ', '100000'))  # Simulated bus clock - the Pi's default
+
+
+# --- clocks ---
+
+class Clock:
+    """Wall time - what the scripts always used"""
+    speed = 1.0
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout=None):
+        """threading.Event.wait, with timeout in this clock's seconds"""
+        return event.wait(timeout)
+
+
+class ScaledClock(Clock):
+    """Wall time sped up: a second on this clock is 1/speed real seconds"""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self._start = time.monotonic()
+
+    def monotonic(self):
+        return (time.monotonic() - self._start) * self.speed
+
+    def monotonic_ns(self):
+        return int(self.monotonic() * 1e9)
+
+    def sleep(self, seconds):
+        time.sleep(max(0.0, seconds) / self.speed)
+
+    def wait(self, event, timeout=None):
+        return event.wait(None if timeout is None else timeout / self.speed)
+
+
+class VirtualClock(Clock):
+    """Time only moves when someone sleeps or waits; the replay plays what falls due on the way"""
+    speed = 0
+
+    def __init__(self):
+        self._now = 0.0
+        self.replay = None
+
+    def monotonic(self):
+        return self._now
+
+    def monotonic_ns(self):
+        return int(self._now * 1e9)
+
+    def sleep(self, seconds):
+        target = self._now + max(0.0, seconds)
+        if self.replay:
+            self.replay.play_until(target)
+        self._now = max(self._now, target)
+
+    def wait(self, event, timeout=None):
+        target = float('inf') if timeout is None else self._now + timeout
+        if self.replay:
+            self.replay.play_until(target, event)
+        if event.is_set():
+            return True
+        if timeout is None:
+            return event.wait()  # Nothing left in the trace - like a sensor that never answers
+        self._now = max(self._now, target)
+        return False
+
+
+# --- trace recording ---
+
+class Recorder:
+    """Appends trace events to a JSON-lines file"""
+
+    def __init__(self, path):
+        self.file = open(path, 'w')
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def write(self, **event):
+        with self.lock:
+            event = dict(t=round(time.monotonic() - self.start, 6), **event)
+            self.file.write(json.dumps(event) + '\n')
+            self.file.flush()
+
+
+class RecordingGPIO:
+    """RPi.GPIO that also records input changes and outputs"""
+
+    def __init__(self, gpio, recorder):
+        self._gpio = gpio
+        self._recorder = recorder
+        self._levels = {}
+
+    def __getattr__(self, name):
+        return getattr(self._gpio, name)
+
+    def _saw(self, channel, level):
+        level = int(bool(level))
+        if self._levels.get(channel) != level:
+            self._levels[channel] = level
+            self._recorder.write(gpio=channel, level=level)
+
+    def setup(self, channel, direction, *args, **kwargs):
+        self._gpio.setup(channel, direction, *args, **kwargs)
+        if direction == self._gpio.IN:
+            self._saw(channel, self._gpio.input(channel))
+        else:
+            self._levels[channel] = int(bool(kwargs.get('initial')))
+
+    def input(self, channel):
+        level = self._gpio.input(channel)
+        self._saw(channel, level)
+        return level
+
+    def output(self, channel, value):
+        self._gpio.output(channel, value)
+        level = int(bool(value))
+        if self._levels.get(channel) != level:  # Only edges - the same level again changes nothing
+            self._levels[channel] = level
+            self._recorder.write(gpio=channel, level=level, out=True)
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        def recorded(ch):
+            # By the time the callback runs the pin may have moved on, so record
+            # the level the edge implies rather than reading it
+            if edge == self._gpio.RISING:
+                level = 1
+            elif edge == self._gpio.FALLING:
+                level = 0
+            else:
+                level = 1 - self._levels.get(ch, 0)
+            if self._levels.get(ch) == level:
+                self._saw(ch, 1 - level)  # The opposite edge is not watched; replay needs it to see this one
+            self._saw(ch, level)
+            if callback:
+                callback(ch)
+        kwargs = {'bouncetime': bouncetime} if bouncetime else {}
+        self._gpio.add_event_detect(channel, edge, callback=recorded, **kwargs)
+
+
+class RecordingBus:
+    """smbus.SMBus that also records every transfer"""
+
+    def __init__(self, bus, recorder):
+        self._bus = bus
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._bus, name)
+
+    def read_byte_data(self, addr, reg):
+        value = self._bus.read_byte_data(addr, reg)
+        self._recorder.write(i2c=addr, reg=reg, data=[value])
+        return value
+
+    def read_word_data(self, addr, reg):
+        value = self._bus.read_word_data(addr, reg)
+        self._recorder.write(i2c=addr, reg=reg, data=[value & 0xFF, value >> 8])  # SMBus words are little-endian
+        return value
+
+    def read_i2c_block_data(self, addr, reg, length=32):
+        data = self._bus.read_i2c_block_data(addr, reg, length)
+        self._recorder.write(i2c=addr, reg=reg, data=list(data))
+        return data
+
+    def write_byte_data(self, addr, reg, value):
+        self._bus.write_byte_data(addr, reg, value)
+        self._recorder.write(i2c=addr, reg=reg, data=[value], write=True)
+
+    def write_i2c_block_data(self, addr, reg, data):
+        self._bus.write_i2c_block_data(addr, reg, data)
+        self._recorder.write(i2c=addr, reg=reg, data=list(data), write=True)
+
+
+# --- trace replay ---
+
+def load_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class Replay:
+    """
+    Plays a trace into the simulated GPIO pins and I2C registers as clock
+    time passes: from a thread for wall-time clocks, from the script's own
+    sleeps and waits for VirtualClock.
+    """
+
+    def __init__(self, events, clock):
+        self.events = events
+        self.clock = clock
+        self.pos = 0
+        self.gpio = None  # SimGPIO, set when it is created
+        self.registers = {}  # {i2c address: bytearray(256)}
+        self.models = {}  # {i2c address: device model} - see attach()
+        self.anchor = (0.0, 0.0)  # (clock time, trace time) the next events are timed from
+        self.started = False
+        self.finished = threading.Event()
+        self._lock = threading.RLock()
+        self._moved = threading.Condition(self._lock)
+        for event in events:
+            if 'i2c' in event:
+                self.device(event['i2c'])
+        if isinstance(clock, VirtualClock):
+            clock.replay = self
+
+    def device(self, addr):
+        return self.registers.setdefault(addr, bytearray(256))
+
+    def attach(self, addr, model):
+        """
+        Answer I2C at addr from a model instead of the trace - for devices
+        whose registers aren't plain memory, like a FIFO. The model needs
+        read(reg, length) -> bytes and write(reg, data).
+        """
+        self.models[addr] = model
+
+    def start(self):
+        """Trace time 0 is when the script first touches the hardware"""
+        with self._lock:
+            if self.started:
+                return
+            self.started = True
+            self.anchor = (self.clock.monotonic(), 0.0)
+        if not isinstance(self.clock, VirtualClock):
+            threading.Thread(target=self._run, name='replay', daemon=True).start()
+
+    def _due(self, event):
+        anchored_at, trace_t = self.anchor
+        return anchored_at + event['t'] - trace_t
+
+    def _is_sync(self, event):
+        # Outputs on pins the script doesn't drive can't be waited for - skip them
+        return event.get('out') and self.gpio is not None and self.gpio.modes.get(event['gpio']) == self.gpio.OUT
+
+    def _apply(self, event):
+        if 'gpio' in event:
+            if not event.get('out') and self.gpio is not None:
+                self.gpio._drive(event['gpio'], event['level'])
+        elif 'i2c' in event and not event.get('write'):  # The script's own writes land in the registers already
+            memory = self.device(event['i2c'])
+            memory[event['reg']:event['reg'] + len(event['data'])] = bytes(event['data'])
+
+    def _step(self):
+        self._apply(self.events[self.pos])
+        self.pos += 1
+        if self.pos == len(self.events):
+            self.finished.set()
+        self._moved.notify_all()
+
+    def output(self, channel, level):
+        """The script drove an output: sync to it if the trace has it coming"""
+        with self._lock:
+            if not self.started:
+                return
+            for ahead in range(self.pos, len(self.events)):
+                event = self.events[ahead]
+                if event.get('out') and event['gpio'] == channel and event['level'] == level:
+                    break
+            else:
+                return  # Not in the rest of the trace
+            while self.pos < ahead:  # Script got there first - catch up
+                self._step()
+            self.anchor = (self.clock.monotonic(), event['t'])
+            self._step()
+
+    def play_until(self, target, event=None):
+        """VirtualClock: play everything due by target, stopping early once event is set"""
+        with self._lock:
+            while self.pos < len(self.events) and not (event is not None and event.is_set()):
+                next_event = self.events[self.pos]
+                if self._is_sync(next_event):
+                    return
+                due = self._due(next_event)
+                if due > target:
+                    return
+                self.clock._now = max(self.clock._now, due)
+                self._step()
+
+    def _run(self):
+        with self._lock:
+            while self.pos < len(self.events):
+                next_event = self.events[self.pos]
+                if self._is_sync(next_event):
+                    self._moved.wait()
+                    continue
+                delay = self._due(next_event) - self.clock.monotonic()
+                if delay > 0:
+                    self._moved.wait(delay / self.clock.speed)  # An output may move the trace on meanwhile
+                    continue
+                self._step()
+
+
+# --- simulated hardware ---
+
+class SimGPIO:
+    """The parts of RPi.GPIO the scripts use; inputs follow the trace, outputs sync it"""
+    BCM, BOARD = 11, 10
+    IN, OUT = 1, 0
+    LOW, HIGH = 0, 1
+    PUD_OFF, PUD_DOWN, PUD_UP = 20, 21, 22
+    RISING, FALLING, BOTH = 31, 32, 33
+
+    def __init__(self, replay):
+        self.replay = replay
+        replay.gpio = self
+        self.levels = {}
+        self.modes = {}
+        self.outputs = []  # (clock time, channel, level) - what the script drove
+        self._detect = {}  # {channel: (edge, [callbacks])}
+        self._detected = set()
+        self._edge_seen = {}  # {channel: (edge, threading.Event)} for wait_for_edge
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=None, initial=None):
+        self.modes[channel] = direction
+        if direction == self.OUT:
+            self.levels[channel] = int(bool(initial))
+        else:
+            self.levels.setdefault(channel, 1 if pull_up_down == self.PUD_UP else 0)
+        self.replay.start()
+
+    def input(self, channel):
+        return self.levels[channel]
+
+    def output(self, channel, value):
+        level = int(bool(value))
+        if self.levels.get(channel) == level:
+            return  # Not an edge, so not a sync point either
+        self.levels[channel] = level
+        self.outputs.append((self.replay.clock.monotonic(), channel, level))
+        self.replay.output(channel, level)
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        self._detect[channel] = (edge, [callback] if callback else [])
+
+    def add_event_callback(self, channel, callback):
+        self._detect[channel][1].append(callback)
+
+    def remove_event_detect(self, channel):
+        self._detect.pop(channel, None)
+
+    def event_detected(self, channel):
+        if channel in self._detected:
+            self._detected.discard(channel)
+            return True
+        return False
+
+    def wait_for_edge(self, channel, edge, timeout=None):
+        """timeout in ms, as RPi.GPIO; returns channel, or None on timeout"""
+        seen = threading.Event()
+        self._edge_seen[channel] = (edge, seen)
+        got = self.replay.clock.wait(seen, None if timeout is None else timeout / 1000)
+        self._edge_seen.pop(channel, None)
+        return channel if got else None
+
+    def cleanup(self, channel=None):
+        self._detect.clear()
+
+    def _drive(self, channel, level):
+        was = self.levels.get(channel, 0)
+        self.levels[channel] = level
+        if was == level:
+            return
+        edge = self.RISING if level else self.FALLING
+        waiting_for, seen = self._edge_seen.get(channel, (None, None))
+        if waiting_for in (edge, self.BOTH):
+            seen.set()
+        detect = self._detect.get(channel)
+        if detect and detect[0] in (edge, self.BOTH):
+            self._detected.add(channel)
+            for callback in detect[1]:
+                callback(channel)
+
+
+class SimBus:
+    """
+    smbus.SMBus over the replayed device registers. Each transfer takes the
+    clock time its bytes need on the wire at I2C_HZ, 9 bits a byte.
+    """
+
+    def __init__(self, replay, bus=None):
+        self.replay = replay
+        self.bus = bus
+        self.reads = 0  # Transfers, for throughput numbers
+        self.bytes_read = 0
+        replay.start()
+
+    def _registers(self, addr):
+        if addr not in self.replay.registers:
+            raise OSError(errno.EREMOTEIO, 'Remote I/O error')  # What smbus says when nothing answers
+        return self.replay.registers[addr]
+
+    def read_byte_data(self, addr, reg):
+        return self.read_i2c_block_data(addr, reg, 1)[0]
+
+    def read_word_data(self, addr, reg):
+        low, high = self.read_i2c_block_data(addr, reg, 2)
+        return low | high << 8
+
+    def _transfer(self, nbytes):
+        self.replay.clock.sleep(nbytes * 9 / I2C_HZ)
+
+    def read_i2c_block_data(self, addr, reg, length=32):
+        model = self.replay.models.get(addr)
+        memory = self._registers(addr) if model is None else None
+        self.reads += 1
+        self.bytes_read += length
+        self._transfer(3 + length)  # Address+write, register, address+read, then the data
+        if model is not None:
+            return list(model.read(reg, length))
+        return list(memory[reg:reg + length])
+
+    def write_byte_data(self, addr, reg, value):
+        self.write_i2c_block_data(addr, reg, [value])
+
+    def write_i2c_block_data(self, addr, reg, data):
+        self._transfer(2 + len(data))
+        if addr in self.replay.models:
+            self.replay.models[addr].write(reg, bytes(data))
+            return
+        memory = self.replay.device(addr)  # Writing is how a script finds its device
+        memory[reg:reg + len(data)] = bytes(data)
+
+    def close(self):
+        pass
+
+
+def SimColor(red, green, blue, white=0):
+    """Same packing as rpi_ws281x.Color"""
+    return (white << 24) | (red << 16) | (green << 8) | blue
+
+
+class SimStrip:
+    """rpi_ws281x.PixelStrip that keeps the frames it was shown"""
+    BIT_TIME_S = 1.25e-6  # 800 kHz
+    RESET_TIME_S = 50e-6
+
+    def __init__(self, replay, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255,
+                 channel=0, strip_type=None, gamma=None):
+        self.replay = replay
+        self.pixels = [0] * num
+        self.brightness = brightness
+        self.frames = []  # (clock time, pixels) per show()
+        self.show_s = num * 24 * self.BIT_TIME_S * 800000 / freq_hz + self.RESET_TIME_S
+
+    def begin(self):
+        self.replay.start()
+
+    def show(self):
+        self.frames.append((self.replay.clock.monotonic(), tuple(self.pixels)))
+        self.replay.clock.sleep(self.show_s)  # The real one blocks while the data goes out
+
+    def setPixelColor(self, n, color):
+        self.pixels[n] = color
+
+    def setPixelColorRGB(self, n, red, green, blue, white=0):
+        self.pixels[n] = SimColor(red, green, blue, white)
+
+    def getPixelColor(self, n):
+        return self.pixels[n]
+
+    def getPixels(self):
+        return self.pixels
+
+    def numPixels(self):
+        return len(self.pixels)
+
+    def setBrightness(self, brightness):
+        self.brightness = brightness
+
+    def getBrightness(self):
+        return self.brightness
+
+
+# --- backend ---
+
+if BACKEND == 'sim':
+    _speed = float(os.environ.get('FT_SPEED', '1'))
+    clock = VirtualClock() if _speed == 0 else ScaledClock(_speed)
+    replay = Replay(load_trace(os.environ['FT_TRACE']) if os.environ.get('FT_TRACE') else [], clock)
+elif BACKEND == 'pi':
+    clock = Clock()
+    replay = None
+    recorder = Recorder(os.environ['FT_RECORD']) if os.environ.get('FT_RECORD') else None
+else:
+    raise ImportError(f"FT_HARDWARE={BACKEND}: expected 'pi' or 'sim'")
+
+
+def _pi(name):
+    if name == 'GPIO':
+        import RPi.GPIO as gpio
+        return RecordingGPIO(gpio, recorder) if recorder else gpio
+    if name == 'SMBus':
+        import smbus
+
+        def open_bus(bus=None):
+            real = smbus.SMBus(bus)
+            return RecordingBus(real, recorder) if recorder else real
+        return open_bus
+    import rpi_ws281x
+    return getattr(rpi_ws281x, name)
+
+
+def _sim(name):
+    if name == 'GPIO':
+        return SimGPIO(replay)
+    if name == 'SMBus':
+        return lambda bus=None: SimBus(replay, bus)
+    if name == 'PixelStrip':
+        return lambda *args, **kwargs: SimStrip(replay, *args, **kwargs)
+    return SimColor
+
+
+def __getattr__(name):
+    # GPIO, SMBus, PixelStrip and Color are made on first import, so a script
+    # only needs the libraries for the hardware it actually uses
+    if name not in ('GPIO', 'SMBus', 'PixelStrip', 'Color'):
+        raise AttributeError(f"module 'hardware' has no attribute '{name}'")
+    try:
+        value = _sim(name) if BACKEND == 'sim' else _pi(name)
+    except ImportError as e:
+        raise ImportError(f"{e} - on a dev box run with FT_HARDWARE=sim") from e
+    globals()[name] = value
+    return value
@@ -1,8 +1,9 @@
-import smbus
+from hardware import SMBus
+from mpu_sampler import MPUSampler, MPUFifo
+from touch_detect import TouchDetector
 import time
 import json
 import argparse
-import math
 
 # MPU-6050 registers
 MPU6050_ADDR = 0x68  # Default I2C address
@@ -28,8 +29,7 @@ def read_byte(bus, address, reg):
     return bus.read_byte_data(address, reg)
 
 def read_word(bus, address, reg):
-    high = bus.read_byte_data(address, reg)
-    low = bus.read_byte_data(address, reg + 1)
+    high, low = bus.read_i2c_block_data(address, reg, 2)  # One transaction for both bytes
     value = (high << 8) | low
     return value
 
@@ -69,13 +69,10 @@ def calibrate_mpu6050(bus, address, calibration_file):
     accel_offsets = [0.0] * 3
     gyro_offsets = [0.0] * 3
 
+    sampler = MPUSampler(bus, address, wake=False)
     for _ in range(num_readings):
-        accel_x = read_word_2c(bus, address, ACCEL_XOUT_H)
-        accel_y = read_word_2c(bus, address, ACCEL_YOUT_H)
-        accel_z = read_word_2c(bus, address, ACCEL_ZOUT_H)
-        gyro_x = read_word_2c(bus, address, GYRO_XOUT_H)
-        gyro_y = read_word_2c(bus, address, GYRO_YOUT_H)
-        gyro_z = read_word_2c(bus, address, GYRO_ZOUT_H)
+        # All six axes in one burst read (see mpu_sampler.py)
+        accel_x, accel_y, accel_z, _temp, gyro_x, gyro_y, gyro_z = sampler.read()
 
         accel_offsets[0] += accel_x
         accel_offsets[1] += accel_y
@@ -120,12 +117,12 @@ def main():
     parser.add_argument("--bus", type=int, default=1, help="I2C bus number")
     parser.add_argument("--address", type=int, default=MPU6050_ADDR, help="MPU-6050 I2C address")
     parser.add_argument("--calibrate", action="store_true", help="Perform calibration")
-    parser.add_argument("--threshold", type=float, default=2.0, help="Touch threshold")
+    parser.add_argument("--threshold", type=float, default=2.0, help="Touch threshold, g away from rest")
     parser.add_argument("--calibration_file", type=str, default="calibration.json", help="Calibration file path")
     parser.add_argument("--touches", type=int, default=5, help="Number of touches before exiting")
     args = parser.parse_args()
 
-    bus = smbus.SMBus(args.bus)
+    bus = SMBus(args.bus)
 
     if not initialize_mpu6050(bus, args.address):
         exit(1)
@@ -142,52 +139,27 @@ def main():
     accel_offsets = calibration_data["accel_offsets"]
     gyro_offsets = calibration_data["gyro_offsets"]
 
+    # The chip samples at 1 kHz into its FIFO and every sample is checked -
+    # a 100 Hz poll could miss a touch shorter than 10 ms. TouchDetector wants
+    # the at-rest reading, gravity included, and a threshold in raw counts.
+    offsets = (accel_offsets[0], accel_offsets[1], accel_offsets[2] + ACCEL_SCALE)
+    detector = TouchDetector(args.threshold * ACCEL_SCALE, offsets, debounce_s=0.2)
+    fifo = MPUFifo(bus, args.address, rate_hz=1000)
     touch_count = 0
-    prev_accel_mag = 0.0  # Initialize previous magnitude
-    touch_debounce = 0.2 # Debounce time in seconds
-    last_touch_time = 0.0
 
     try:
-        while touch_count < args.touches:
-            accel_x = read_word_2c(bus, args.address, ACCEL_XOUT_H) / ACCEL_SCALE
-            accel_y = read_word_2c(bus, args.address, ACCEL_YOUT_H) / ACCEL_SCALE
-            accel_z = read_word_2c(bus, args.address, ACCEL_ZOUT_H) / ACCEL_SCALE
-
-            # Apply calibration offsets
-            accel_x -= accel_offsets[0] / ACCEL_SCALE
-            accel_y -= accel_offsets[1] / ACCEL_SCALE
-            accel_z -= accel_offsets[2] / ACCEL_SCALE
-
-            accel_mag = math.sqrt(accel_x**2 + accel_y**2 + accel_z**2)
-            delta_accel_mag = abs(accel_mag - prev_accel_mag)
-
-            current_time = time.time()
-
-            if delta_accel_mag > args.threshold and current_time - last_touch_time > touch_debounce:
-                print("Touched!")
+        for batch in fifo.batches(drain_hz=20):
+            for t_ns, magnitude in detector.feed(batch):
+                print(f"Touched! {magnitude / ACCEL_SCALE:.2f} g")
                 touch_count += 1
-		touch_detected = True
-
-                if touch_count >= 5:  # Exit after 5 touches
-                   print("5 touches detected. Exiting.")
-                   break  # Exit the loop
+            if touch_count >= args.touches:
+                break
 
-            else:
-                 touch_detected = False  # Reset debouncing
-
-	    prev_accel_mag = accel_mag
-
-            # Print calibrated readings (optional - same as before)
-            # ...
-
-            time.sleep(0.01)  # Adjust reading frequency
-
-        except KeyboardInterrupt:
-            print("Exiting...")
-            break
-        except Exception as e:
-            print(f"Error in main loop: {e}")
-            break
+        print(f"{touch_count} touches detected. Exiting.")
+    except KeyboardInterrupt:
+        print("Exiting...")
+    except Exception as e:
+        print(f"Error in main loop: {e}")
 
 if __name__ == "__main__":
     main()
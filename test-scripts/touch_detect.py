@@ -0,0 +1,238 @@
+"""
+Touch detection over MPU sample batches
+
+Runs over the FifoBatch-es MPUFifo.batches() yields (mpu_sampler.py), so
+it sees every sample at the FIFO rate, not one every poll:
+
+    detector = TouchDetector(threshold=1000, offsets=offsets)
+    for batch in fifo.batches(drain_hz=20):
+        for t_ns, magnitude in detector.feed(batch):
+            print("Touched!")
+
+TouchDetector checks one sample at a time in Python against a fixed
+threshold. WindowedTouchDetector does the same job with numpy, a window of
+samples at a time, and is pickier about what counts as a touch - see its
+docstring. It takes the same batches:
+
+    detector = WindowedTouchDetector()
+    for batch in fifo.batches(drain_hz=20):
+        for event in detector.feed(batch):            # TouchEvent
+            print(f"Touched! {event.peak:.0f}")
+"""
+
+from collections import namedtuple
+
+from mpu_sampler import ACCEL_SCALE
+
+# t_ns: where the touch crossed the threshold, interpolated between samples.
+# peak: high-passed acceleration at its highest, counts. duration_ns: time over threshold.
+TouchEvent = namedtuple('TouchEvent', 't_ns peak duration_ns')
+
+
+def _numpy():
+    """numpy is only needed for WindowedTouchDetector - import it on first use"""
+    import numpy
+    return numpy
+
+
+def _spread(values):
+    """Noise level of values (>= 0): their median, scaled as a MAD is - a touch in there hardly moves it"""
+    middle = len(values) // 2
+    return float(_numpy().partition(values, middle)[middle]) / 0.6745  # np.median without its overhead
+
+
+class TouchDetector:
+    """
+    A touch is the acceleration, offsets taken off, over threshold (raw
+    counts) - the test mpu6050.py has always used. offsets are what
+    calibrate_sensor() measures at rest, gravity included; the default is a
+    level sensor. One touch per debounce_s at most.
+    """
+
+    def __init__(self, threshold, offsets=(0.0, 0.0, ACCEL_SCALE), debounce_s=0.2):
+        self.threshold = threshold
+        self.offsets = offsets
+        self.debounce_ns = debounce_s * 1e9
+        self.last_touch_ns = None
+
+    def feed(self, batch):
+        """Touches in this batch, in order: [(t_ns, magnitude)]"""
+        touches = []
+        off_x, off_y, off_z = self.offsets
+        threshold_sq = self.threshold ** 2
+        data = batch.data
+        step = batch.channels
+        for i in range(0, len(data), step):
+            x = data[i] - off_x
+            y = data[i + 1] - off_y
+            z = data[i + 2] - off_z
+            magnitude_sq = x * x + y * y + z * z
+            if magnitude_sq <= threshold_sq:
+                continue
+            t_ns = batch.t0_ns + i // step * batch.period_ns
+            if self.last_touch_ns is None or t_ns - self.last_touch_ns > self.debounce_ns:
+                self.last_touch_ns = t_ns
+                touches.append((int(t_ns), magnitude_sq ** 0.5))
+        return touches
+
+
+class WindowedTouchDetector:
+    """
+    Touch detection over windows of samples with numpy. Per window:
+
+    - high-pass: each sample less the mean of the highpass_s before it or
+      after it, whichever is nearer, so gravity, tilt and the slow sway of
+      a cone in the wind drop out; the magnitude of what is left
+    - jerk: magnitude of the sample-to-sample change
+    - noise floor of both, a robust (median) estimate tracked across quiet
+      windows, so the threshold rises with wind-driven rattle and comes
+      back down after
+    - peaks: runs over k times the noise floor, at least min_threshold
+
+    A run is a touch if it is sharp (jerk over jerk_k times its floor), over
+    within max_duration_s and nowhere near full scale - a ball hit saturates
+    the +/-2g range and rings on. Runs less than gap_s apart are one run.
+    One touch per debounce_s, as before, and nothing for debounce_s after a
+    run that wasn't one.
+
+    Samples sit in a ring buffer until a whole window and what follows it
+    (enough to see a run end) are in; an event comes out up to a window
+    plus some 75 ms after its touch, at the defaults.
+    A gap in the sample index (FIFO overflow) restarts the buffer.
+    """
+
+    def __init__(self, window_s=0.128, highpass_s=0.032, k=6.0, min_threshold=300.0, jerk_k=4.0,
+                 max_duration_s=0.03, gap_s=0.01, saturation=32000, debounce_s=0.2, floor_alpha=0.1):
+        self.window_s = window_s
+        self.highpass_s = highpass_s
+        self.k = k
+        self.min_threshold = min_threshold
+        self.jerk_k = jerk_k
+        self.max_duration_s = max_duration_s
+        self.gap_s = gap_s
+        self.saturation = saturation
+        self.debounce_ns = debounce_s * 1e9
+        self.floor_alpha = floor_alpha
+        self.noise = None  # Noise floor of the high-passed magnitude, counts
+        self.jerk_noise = None
+        self.last_touch_ns = None
+        self.windows = 0  # Windows processed
+        self.rejected = 0  # Runs over threshold that weren't touches
+        self._buf = None  # Built on the first batch, once the sample rate is known
+        self._fill = 0
+        self._index = None  # Sample index of _buf[0]
+        self._base_ns = None  # ...and its time
+        self._period_ns = None
+
+    def _setup(self, period_ns):
+        np = _numpy()
+        rate_hz = 1e9 / period_ns
+        self.window = max(8, round(self.window_s * rate_hz))
+        self.highpass = max(2, round(self.highpass_s * rate_hz))
+        # highpass samples either side of each high-passed one; one more
+        # before so a run starting on the window's first sample has a
+        # "before", the longest touch after so the run is seen to end
+        self.context = self.highpass + 1
+        self.gap = round(self.gap_s * rate_hz)
+        self.lookahead = round(self.max_duration_s * rate_hz) + 2 + self.gap + self.highpass
+        self.span = self.context + self.window + self.lookahead
+        self._buf = np.zeros((4 * self.span, 3), dtype=np.float32)
+
+    def feed(self, batch):
+        """TouchEvents the batch completed, in order"""
+        np = _numpy()
+        if self._buf is None:
+            self._setup(batch.period_ns)
+        samples = np.frombuffer(batch.data, dtype=np.int16).reshape(-1, batch.channels)[:, :3]
+        if self._index is None or batch.first_index != self._index + self._fill:
+            self._fill = 0  # Lost samples: nothing before the gap lines up with what comes after
+            self._index = batch.first_index
+        self._period_ns = batch.period_ns
+        self._base_ns = batch.t0_ns - (batch.first_index - self._index) * batch.period_ns
+
+        events = []
+        taken = 0
+        while taken < len(samples):
+            n = min(len(samples) - taken, len(self._buf) - self._fill)
+            self._buf[self._fill:self._fill + n] = samples[taken:taken + n]
+            self._fill += n
+            taken += n
+            while self._fill >= self.span:
+                events += self._process()
+        return events
+
+    def _process(self):
+        np = _numpy()
+        n = self.span
+        x = self._buf[:n]
+        sums = np.zeros((n + 1, 3))
+        np.cumsum(x, axis=0, out=sums[1:])
+        h = self.highpass
+        # For samples h..n-h-1: how far each is from the mean of the h samples
+        # before it and from the h after, per axis and then the magnitude (a
+        # sideways touch hardly changes |g + touch|). The nearer of the two:
+        # a touch stands clear of both, a tilt or the tail of a touch has one
+        # side that matches it.
+        centre = x[h:n - h]
+        before = centre - (sums[h:n - h] - sums[:n - 2 * h]) / h
+        after = centre - (sums[2 * h + 1:] - sums[h + 1:n - h + 1]) / h
+        highpassed = np.sqrt(np.minimum(np.einsum('ij,ij->i', before, before), np.einsum('ij,ij->i', after, after)))
+        step = centre - x[h - 1:n - h - 1]
+        jerk = np.sqrt(np.einsum('ij,ij->i', step, step))
+        # highpassed[0] is sample h; the window is highpassed[1:window + 1]
+        in_window = slice(1, self.window + 1)
+
+        if self.noise is None:
+            self.noise = _spread(highpassed[in_window])
+            self.jerk_noise = _spread(jerk[in_window])
+        threshold = max(self.min_threshold, self.k * self.noise)
+        above = highpassed > threshold
+        ends = np.flatnonzero(above[:-1] & ~above[1:]) + 1
+        if len(ends):
+            # Bridge short dips: something ringing (a ball hit) is one long run, not many short ones
+            rises = np.flatnonzero(~above[:-1] & above[1:]) + 1
+            for end in ends:
+                rise = rises[np.searchsorted(rises, end):][:1]
+                if len(rise) and rise[0] - end < self.gap:
+                    above[end:rise[0]] = True
+            ends = np.flatnonzero(above[:-1] & ~above[1:]) + 1
+        starts = np.flatnonzero(~above[:self.window] & above[1:self.window + 1]) + 1
+
+        events = []
+        for start in starts:
+            before, at = highpassed[start - 1], highpassed[start]
+            crossed = h + start - 1 + (threshold - before) / (at - before)
+            t_ns = self._base_ns + crossed * self._period_ns
+            if self.last_touch_ns is not None and t_ns - self.last_touch_ns <= self.debounce_ns:
+                continue
+            # Touch or not, nothing in the next debounce_s counts: what
+            # follows a ball hit is still the ball hit
+            self.last_touch_ns = t_ns
+            end_at = np.searchsorted(ends, start)
+            if end_at == len(ends):
+                self.rejected += 1  # Still going past the lookahead - far too long for a touch
+                continue
+            end = ends[end_at]
+            raw = x[h + start - 1:h + end]
+            if (end - start) * self._period_ns > self.max_duration_s * 1e9 \
+                    or np.abs(raw).max() >= self.saturation \
+                    or jerk[start - 1:end].max() < self.jerk_k * self.jerk_noise:
+                self.rejected += 1
+                continue
+            events.append(TouchEvent(int(t_ns), float(highpassed[start:end].max()), int((end - start) * self._period_ns)))
+
+        if not above[in_window].any():
+            # Quiet window: track the floor. Not while something is happening,
+            # or a touch would raise the bar for the next one
+            a = self.floor_alpha
+            self.noise += a * (_spread(highpassed[in_window]) - self.noise)
+            self.jerk_noise += a * (_spread(jerk[in_window]) - self.jerk_noise)
+
+        # Slide on a window: keep the history and the lookahead at the front
+        keep = self._fill - self.window
+        self._buf[:keep] = self._buf[self.window:self._fill]
+        self._fill = keep
+        self._index += self.window
+        self._base_ns += self.window * self._period_ns
+        self.windows += 1
+        return events
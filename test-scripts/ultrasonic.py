@@ -1,4 +1,4 @@
-import RPi.GPIO as GPIO
+from hardware import GPIO
 import time
 
 # Set GPIO mode
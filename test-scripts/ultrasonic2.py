@@ -1,5 +1,6 @@
-import RPi.GPIO as GPIO
-import time
+from hardware import GPIO
+
+from ultrasonic_ranging import UltrasonicRanger
 
 # Set GPIO mode
 GPIO.setmode(GPIO.BCM)
@@ -8,29 +9,19 @@ GPIO.setmode(GPIO.BCM)
 TRIG = 23
 ECHO = 24
 
-# Set up the GPIO pins
-GPIO.setup(TRIG, GPIO.OUT)
-GPIO.setup(ECHO, GPIO.IN)
+# Set up the GPIO pins - edge-timed ranging, see ultrasonic_ranging.py
+ranger = UltrasonicRanger(TRIG, ECHO)
 
 def get_distance():
-    # Send a signal
-    GPIO.output(TRIG, True)
-    time.sleep(0.00001)  # 10 microseconds
-    GPIO.output(TRIG, False)
-
-    # Wait for the echo
-    pulse_start = time.time()
-    while GPIO.input(ECHO) == 0:
-        pulse_start = time.time()
+    # One edge-timed ping; None if the echo never came back
+    distance = ranger.measure()
+    return round(distance, 2) if distance is not None else None
 
-    pulse_end = time.time()
-    while GPIO.input(ECHO) == 1:
-        pulse_end = time.time()
 
-    # Calculate distance
-    pulse_duration = pulse_end - pulse_start
-    distance = pulse_duration * 17150  # Convert to cm
-    return round(distance, 2)
+def next_distance():
+    # Next sample from continuous ranging (ranger.start)
+    sample = ranger.get()
+    return round(sample.distance_cm, 2) if sample.distance_cm is not None else None
 
 def calibrate_sensor(target_distances):
     calibration_data = []
@@ -39,6 +30,9 @@ def calibrate_sensor(target_distances):
     for target_distance in target_distances:
         input("Place an object at {} cm and press Enter...".format(target_distance))
         measured_distance = get_distance()
+        while measured_distance is None:
+            input("No echo - check the sensor and press Enter to measure again...")
+            measured_distance = get_distance()
         print(f"Measured distance: {measured_distance} cm")
         error = measured_distance - target_distance
         calibration_data.append((target_distance, measured_distance, error))
@@ -64,16 +58,20 @@ def main():
         print("Calibration skipped.")
 
     print("\nStarting Distance Monitoring (Press Ctrl+C to stop)...")
+    ranger.start(rate_hz=1)
     
     try:
         while True:
-            distance = get_distance()
+            distance = next_distance()
+            if distance is None:
+                print("No echo")
+                continue
             adjusted_distance = distance - (average_error if calibrate == 'yes' else 0)  # Adjust for calibration error if calibrated
             print(f"Distance: {distance:.2f} cm, Adjusted Distance: {adjusted_distance:.2f} cm")
-            time.sleep(1)
 
     except KeyboardInterrupt:
         print("Measurement stopped by User")
+        ranger.close()
         GPIO.cleanup()
 
 if __name__ == "__main__":
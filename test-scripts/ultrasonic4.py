@@ -1,5 +1,6 @@
-import RPi.GPIO as GPIO
-import time
+from hardware import GPIO
+
+from ultrasonic_ranging import UltrasonicRanger
 
 # Set GPIO mode
 GPIO.setmode(GPIO.BCM)
@@ -9,9 +10,8 @@ TRIG = 23
 ECHO = 24
 BUZZER = 18  # Define a pin for the buzzer
 
-# Set up the GPIO pins
-GPIO.setup(TRIG, GPIO.OUT)
-GPIO.setup(ECHO, GPIO.IN)
+# Set up the GPIO pins - the ranger sets up TRIG and ECHO
+ranger = UltrasonicRanger(TRIG, ECHO)
 GPIO.setup(BUZZER, GPIO.OUT)  # Set up the buzzer pin
 
 class KalmanFilter:
@@ -34,24 +34,15 @@ class KalmanFilter:
         return self.posteri_estimate
 
 def get_distance():
-    # Send a signal
-    GPIO.output(TRIG, True)
-    time.sleep(0.00001)  # 10 microseconds
-    GPIO.output(TRIG, False)
-
-    # Wait for the echo
-    pulse_start = time.time()
-    while GPIO.input(ECHO) == 0:
-        pulse_start = time.time()
+    # One edge-timed ping; None if the echo never came back
+    distance = ranger.measure()
+    return round(distance, 2) if distance is not None else None
 
-    pulse_end = time.time()
-    while GPIO.input(ECHO) == 1:
-        pulse_end = time.time()
 
-    # Calculate distance
-    pulse_duration = pulse_end - pulse_start
-    distance = pulse_duration * 17150  # Convert to cm
-    return round(distance, 2)
+def next_distance():
+    # Next sample from continuous ranging (ranger.start)
+    sample = ranger.get()
+    return round(sample.distance_cm, 2) if sample.distance_cm is not None else None
 
 def calibrate_sensor(target_distances):
     calibration_data = []
@@ -60,6 +51,9 @@ def calibrate_sensor(target_distances):
     for target_distance in target_distances:
         input("Place an object at {} cm and press Enter...".format(target_distance))
         measured_distance = get_distance()
+        while measured_distance is None:
+            input("No echo - check the sensor and press Enter to measure again...")
+            measured_distance = get_distance()
         print(f"Measured distance: {measured_distance} cm")
         error = measured_distance - target_distance
         calibration_data.append((target_distance, measured_distance, error))
@@ -90,10 +84,14 @@ def main():
         average_error = 0  # No calibration adjustment if skipped
 
     print("\nStarting Distance Monitoring (Press Ctrl+C to stop)...")
+    ranger.start(rate_hz=1)
     
     try:
         while True:
-            distance = get_distance()
+            distance = next_distance()
+            if distance is None:
+                print("No echo")
+                continue
             adjusted_distance = distance - average_error  # Adjust for calibration error
             
             # Apply Kalman filter
@@ -105,4 +103,14 @@ def main():
             threshold_distance = 30  # Set the threshold distance (in cm)
             if filtered_distance < threshold_distance:
                 GPIO.output(BUZZER, True)  # Turn on the buzzer
-                time
+            else:
+                GPIO.output(BUZZER, False)  # Turn off the buzzer
+
+    except KeyboardInterrupt:
+        print("Measurement stopped by User")
+        ranger.close()
+        GPIO.cleanup()
+
+if __name__ == "__main__":
+    main()
+
@@ -1,5 +1,6 @@
-import RPi.GPIO as GPIO
-import time
+from hardware import GPIO
+
+from ultrasonic_ranging import UltrasonicRanger
 
 # Set GPIO mode
 GPIO.setmode(GPIO.BCM)
@@ -8,29 +9,19 @@ GPIO.setmode(GPIO.BCM)
 TRIG = 23
 ECHO = 24
 
-# Set up the GPIO pins
-GPIO.setup(TRIG, GPIO.OUT)
-GPIO.setup(ECHO, GPIO.IN)
+# Set up the GPIO pins - edge-timed ranging, see ultrasonic_ranging.py
+ranger = UltrasonicRanger(TRIG, ECHO)
 
 def get_distance():
-    # Send a signal
-    GPIO.output(TRIG, True)
-    time.sleep(0.00001)  # 10 microseconds
-    GPIO.output(TRIG, False)
-
-    # Wait for the echo
-    pulse_start = time.time()
-    while GPIO.input(ECHO) == 0:
-        pulse_start = time.time()
+    # One edge-timed ping; None if the echo never came back
+    distance = ranger.measure()
+    return round(distance, 2) if distance is not None else None
 
-    pulse_end = time.time()
-    while GPIO.input(ECHO) == 1:
-        pulse_end = time.time()
 
-    # Calculate distance
-    pulse_duration = pulse_end - pulse_start
-    distance = pulse_duration * 17150  # Convert to cm
-    return round(distance, 2)
+def next_distance():
+    # Next sample from continuous ranging (ranger.start)
+    sample = ranger.get()
+    return round(sample.distance_cm, 2) if sample.distance_cm is not None else None
 
 def calibrate_sensor():
     calibration_data = []
@@ -44,6 +35,9 @@ def calibrate_sensor():
                 break
             known_distance = float(known_distance)
             measured_distance = get_distance()
+            if measured_distance is None:
+                print("No echo - try again.")
+                continue
             print(f"Measured distance: {measured_distance} cm")
             calibration_data.append((known_distance, measured_distance))
         except ValueError:
@@ -60,11 +54,12 @@ try:
         print(f"Known: {known} cm, Measured: {measured} cm, Error: {error} cm")
 
     # You can use the calibration results to adjust your readings in the main loop
+    ranger.start(rate_hz=1)
     while True:
-        distance = get_distance()
-        print(f"Distance: {distance} cm")
-        time.sleep(1)
+        distance = next_distance()
+        print(f"Distance: {distance} cm" if distance is not None else "No echo")
 
 except KeyboardInterrupt:
     print("Measurement stopped by User")
+    ranger.close()
     GPIO.cleanup()
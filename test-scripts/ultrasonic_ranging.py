@@ -0,0 +1,160 @@
+"""
+Edge-timed ultrasonic ranging (HC-SR04 / JSN-SR04T)
+
+Times the echo pulse with GPIO edge callbacks and a monotonic clock instead
+of spinning on GPIO.input(), so ranging leaves the CPU idle, a lost echo
+times out instead of hanging, and loop jitter no longer ends up in the
+pulse width.
+
+One-shot:
+
+    ranger = UltrasonicRanger(trig=23, echo=24)
+    distance = ranger.measure()        # cm, or None if no echo came back
+
+Continuous - samples arrive on a queue at rate_hz:
+
+    ranger.start(rate_hz=10)
+    sample = ranger.get(timeout=1)     # Sample(t_ns, distance_cm, pulse_us), or None
+    ranger.stop()
+
+GPIO and time come from hardware.py, so FT_HARDWARE=sim replays a recorded
+trace through the same code. Pass gpio=/clock= to use something else.
+"""
+
+import queue
+import threading
+from collections import namedtuple
+
+import hardware
+
+SPEED_OF_SOUND_CM_S = 34300
+ECHO_TIMEOUT_S = 0.03  # ~5 m round trip; the JSN-SR04T gives up at about 38 ms
+TRIGGER_PULSE_S = 0.00001  # 10 microseconds
+MIN_CYCLE_S = 0.06  # The sensor needs ~60 ms between pings or old echoes come back
+
+Sample = namedtuple('Sample', 't_ns distance_cm pulse_us')  # distance_cm/pulse_us None on timeout
+
+
+def pulse_to_cm(pulse_ns):
+    """Echo pulse width -> distance (there and back, so half)"""
+    return pulse_ns * SPEED_OF_SOUND_CM_S / 2e9
+
+
+class UltrasonicRanger:
+    def __init__(self, trig=23, echo=24, timeout_s=ECHO_TIMEOUT_S, queue_size=64, gpio=None, clock=None):
+        if gpio is None:
+            gpio = hardware.GPIO
+        self.gpio = gpio
+        self.clock = clock or hardware.clock
+        self.trig = trig
+        self.echo = echo
+        self.timeout_s = timeout_s
+        self.samples = queue.Queue(maxsize=queue_size)
+        self.timeouts = 0
+        self.dropped = 0  # Samples nobody collected before the queue filled
+
+        self._rise_ns = None
+        self._fall_ns = None
+        self._echo_done = threading.Event()
+        self._ping_lock = threading.Lock()
+        self._thread = None
+        self._running = threading.Event()
+
+        gpio.setmode(gpio.BCM)
+        gpio.setup(trig, gpio.OUT)
+        gpio.setup(echo, gpio.IN)
+        gpio.output(trig, False)
+        gpio.add_event_detect(echo, gpio.BOTH, callback=self._on_edge)
+
+    def _on_edge(self, channel):
+        # The first edge after a trigger is the echo going high, the next is it
+        # going low. Not read back with GPIO.input(): by the time the callback
+        # runs, a short pulse may already be over.
+        now = self.clock.monotonic_ns()
+        if self._rise_ns is None:
+            self._rise_ns = now
+        elif self._fall_ns is None:
+            self._fall_ns = now
+            self._echo_done.set()
+
+    def ping(self):
+        """One trigger/echo cycle: Sample with the distance, or with None if the echo timed out"""
+        with self._ping_lock:
+            self._rise_ns = self._fall_ns = None
+            self._echo_done.clear()
+            self.gpio.output(self.trig, True)
+            self.clock.sleep(TRIGGER_PULSE_S)
+            self.gpio.output(self.trig, False)
+
+            if not self.clock.wait(self._echo_done, self.timeout_s):
+                self.timeouts += 1
+                return Sample(self.clock.monotonic_ns(), None, None)
+            pulse_ns = self._fall_ns - self._rise_ns
+            return Sample(self._fall_ns, pulse_to_cm(pulse_ns), pulse_ns / 1000)
+
+    def measure(self):
+        """Distance in cm from one ping, or None"""
+        return self.ping().distance_cm
+
+    # --- continuous ranging ---
+
+    def start(self, rate_hz=10):
+        """Range continuously in a background thread, at most rate_hz pings per second"""
+        if self._thread is not None:
+            return
+        period = max(1.0 / rate_hz, MIN_CYCLE_S)
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, args=(period,), name='ultrasonic', daemon=True)
+        self._thread.start()
+
+    def _run(self, period):
+        next_ping = self.clock.monotonic()
+        while self._running.is_set():
+            self._put(self.ping())
+            next_ping += period
+            delay = next_ping - self.clock.monotonic()
+            if delay > 0:
+                self.clock.sleep(delay)
+            else:
+                next_ping = self.clock.monotonic()  # Fell behind - don't try to catch up
+
+    def _put(self, sample):
+        if self.clock.speed == 0:
+            # Virtual time runs as fast as the CPU allows - wait for the
+            # reader rather than lapping it and dropping samples
+            while self._running.is_set():
+                try:
+                    self.samples.put(sample, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            return
+        try:
+            self.samples.put_nowait(sample)
+        except queue.Full:
+            # Keep the newest: drop the oldest sample
+            try:
+                self.samples.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self.samples.put_nowait(sample)
+
+    def get(self, timeout=None):
+        """Next sample from continuous ranging; None if none arrives within timeout (0 = don't wait)"""
+        try:
+            if timeout == 0:
+                return self.samples.get_nowait()
+            return self.samples.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self.gpio.remove_event_detect(self.echo)